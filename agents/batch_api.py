@@ -0,0 +1,533 @@
+import argparse
+import copy
+import json
+import os
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from agents.transcript_agents import CORRECTION_MODES, KPI_REFERENCE_SCRIPTS, FusedScoringFormat, ScoringFormat, TranscriptAgents
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+
+# Limits of a single Batch API input file
+MAX_REQUESTS_PER_FILE = 50000
+MAX_BYTES_PER_FILE = 200 * 1024 * 1024
+
+# custom_id layout: <audio_id>::correction::<segment indexes> and <audio_id>::kpi::<kpi name or fused>, e.g. 0-3,7 for segments 0, 1, 2, 3 and 7
+CUSTOM_ID_SEPARATOR = "::"
+
+
+def _strict_json_schema(schema: Dict) -> Dict:
+    """
+    This is a helper function that makes a pydantic JSON schema valid for strict structured outputs: every property required and no additional properties.
+
+    Parameters:
+        - schema (Dict) -> JSON schema returned by model_json_schema
+
+    Returns:
+        - schema (Dict) -> Strict JSON schema
+    """
+    schema = copy.deepcopy(schema)
+
+    def make_strict(node):
+        if isinstance(node, dict):
+            if node.get("type") == "object" and "properties" in node:
+                node["additionalProperties"] = False
+                node["required"] = list(node["properties"])
+            for value in node.values():
+                make_strict(value)
+        elif isinstance(node, list):
+            for value in node:
+                make_strict(value)
+
+    make_strict(schema)
+
+    return schema
+
+
+def to_batch_line(custom_id: str, request: Dict) -> Dict:
+    """
+    This function converts a chat completion request built by TranscriptAgents into a line of a Batch API input file.
+
+    Parameters:
+        - custom_id (str) -> Stable id of the request
+        - request (Dict) -> model, temperature, messages and optional response_format (pydantic model)
+
+    Returns:
+        - line (Dict) -> Batch API request line
+    """
+    body = {key: value for key, value in request.items() if key != "response_format"}
+
+    response_format = request.get("response_format")
+    if response_format is not None:
+        body["response_format"] = {
+            "type": "json_schema",
+            "json_schema": {
+                "name": response_format.__name__,
+                "schema": _strict_json_schema(response_format.model_json_schema()),
+                "strict": True,
+            },
+        }
+
+    return {"custom_id": custom_id, "method": "POST", "url": BATCH_ENDPOINT, "body": body}
+
+
+def write_batch_files(
+    lines: Iterable[Dict],
+    output_dir: str,
+    prefix: str,
+    max_requests: int = MAX_REQUESTS_PER_FILE,
+    max_bytes: int = MAX_BYTES_PER_FILE
+) -> List[str]:
+    """
+    This function writes Batch API request lines into JSONL files, starting a new shard whenever a file would exceed max_requests or max_bytes.
+
+    Parameters:
+        - lines (Iterable[Dict]) -> Batch API request lines
+        - output_dir (str) -> Folder the shards are written to
+        - prefix (str) -> File name prefix of the shards
+        - max_requests (int) -> Maximum requests per shard
+        - max_bytes (int) -> Maximum size of a shard in bytes
+
+    Returns:
+        - paths (List[str]) -> Paths of the written shards
+    """
+    os.makedirs(output_dir, exist_ok=True)
+
+    paths = []
+    shard = None
+    shard_requests = 0
+    shard_bytes = 0
+    try:
+        for line in lines:
+            encoded_line = (json.dumps(line, ensure_ascii=False) + "\n").encode("utf-8")
+
+            if shard is None or shard_requests >= max_requests or shard_bytes + len(encoded_line) > max_bytes:
+                if shard is not None:
+                    shard.close()
+                paths.append(os.path.join(output_dir, f"{prefix}-{len(paths):05d}.jsonl"))
+                shard = open(paths[-1], "wb")
+                shard_requests = 0
+                shard_bytes = 0
+
+            shard.write(encoded_line)
+            shard_requests += 1
+            shard_bytes += len(encoded_line)
+    finally:
+        if shard is not None:
+            shard.close()
+
+    return paths
+
+
+def make_custom_id(audio_id: str, stage: str, name: str) -> str:
+    """
+    This function builds the stable custom_id of a request.
+
+    Parameters:
+        - audio_id (str) -> Audio id of the call
+        - stage (str) -> correction or kpi
+        - name (str) -> Segment range of a correction request, KPI name (or fused) of a KPI request
+
+    Returns:
+        - custom_id (str) -> Custom id of the request
+    """
+    return CUSTOM_ID_SEPARATOR.join([audio_id, stage, name])
+
+
+def parse_custom_id(custom_id: str) -> Tuple[str, str, str]:
+    """
+    This function splits a custom_id built by make_custom_id. The audio id is allowed to contain the separator.
+
+    Parameters:
+        - custom_id (str) -> Custom id of the request
+
+    Returns:
+        - audio_id (str) -> Audio id of the call
+        - stage (str) -> correction or kpi
+        - name (str) -> Segment range or KPI name
+    """
+    audio_id, stage, name = custom_id.rsplit(CUSTOM_ID_SEPARATOR, 2)
+
+    return audio_id, stage, name
+
+
+def _segment_range_name(indexes: List[int]) -> str:
+    """
+    This is a helper function that writes the segment indexes of a correction request, with runs of consecutive indexes as first-last.
+
+    Parameters:
+        - indexes (List[int]) -> Segment indexes of the request, in order
+
+    Returns:
+        - name (str) -> Segment indexes, e.g. 0-3,7
+    """
+    runs = []
+    for index in indexes:
+        if runs and runs[-1][1] == index - 1:
+            runs[-1][1] = index
+        else:
+            runs.append([index, index])
+
+    return ','.join([str(first) if first == last else f"{first}-{last}" for first, last in runs])
+
+
+def _segment_indexes(name: str) -> List[int]:
+    """
+    This is a helper function that reads the segment indexes written by _segment_range_name.
+
+    Parameters:
+        - name (str) -> Segment indexes, e.g. 0-3,7
+
+    Returns:
+        - indexes (List[int]) -> Segment indexes of the request, in order
+    """
+    indexes = []
+    for run in name.split(","):
+        first, _, last = run.partition("-")
+        indexes.extend(range(int(first), int(last or first) + 1))
+
+    return indexes
+
+
+def plan_corrections(
+    raw_transcripts: List[str],
+    max_batch_tokens: Optional[int] = 1000,
+    mode: str = "hybrid",
+    keywords: Optional[List[str]] = None
+) -> Tuple[TranscriptAgents, List[str], List[List[int]]]:
+    """
+    This function corrects the keywords of a call locally and packs the segments that still need the LLM, the same way as transcript_correction_agent. 
+
+    It is deterministic, so the requests can be planned again when their output is ingested.
+
+    Parameters:
+        - raw_transcripts (List[str]) -> Raw segment transcripts of the call
+        - max_batch_tokens (int | None) -> Token budget of a packed request
+        - mode (str) -> One of CORRECTION_MODES, in hybrid mode only the low-confidence segments get a request
+        - keywords (List[str] | None) -> Product names of the corrections, read from data/keywords.txt if not provided
+
+    Returns:
+        - agents (TranscriptAgents) -> Agents of the call that build the requests
+        - corrected_transcripts (List[str]) -> Transcripts after the local correction
+        - batches (List[List[int]]) -> Segment indexes of every request
+    """
+    agents = TranscriptAgents(raw_transcripts, ' '.join([transcript.strip() for transcript in raw_transcripts]), keywords=keywords)
+    corrected_transcripts, llm_indexes = agents._keyword_correction(raw_transcripts, mode)
+
+    llm_segments = [corrected_transcripts[index] for index in llm_indexes]
+    batches = agents._pack_segments(llm_segments, max_batch_tokens) if llm_segments else []
+
+    return agents, corrected_transcripts, [[llm_indexes[index] for index in batch] for batch in batches]
+
+
+def iter_correction_lines(
+    calls: Iterable[Tuple[str, List[str]]],
+    max_batch_tokens: Optional[int] = 1000,
+    mode: str = "hybrid",
+    keywords: Optional[List[str]] = None
+) -> Iterator[Dict]:
+    """
+    This function builds the correction requests of every call, packed the same way as transcript_correction_agent. In hybrid mode only the segments the keyword corrector is not confident about are sent.
+
+    Parameters:
+        - calls (Iterable[Tuple[str, List[str]]]) -> (audio_id, raw segment transcripts) of every call
+        - max_batch_tokens (int | None) -> Token budget of a packed request
+        - mode (str) -> One of CORRECTION_MODES, llm sends every segment and local none
+        - keywords (List[str] | None) -> Product names of the corrections, read from data/keywords.txt if not provided
+
+    Returns:
+        - lines (Iterator[Dict]) -> Batch API request lines
+    """
+    for audio_id, raw_transcripts in calls:
+        agents, corrected_transcripts, batches = plan_corrections(raw_transcripts, max_batch_tokens, mode, keywords)
+        system_prompt = agents._correction_system_prompt()
+
+        for batch in batches:
+            request = agents._correction_request(system_prompt, [corrected_transcripts[index] for index in batch])
+            yield to_batch_line(make_custom_id(audio_id, "correction", _segment_range_name(batch)), request)
+
+
+def iter_kpi_lines(calls: Iterable[Tuple[str, str]], fused: bool = False) -> Iterator[Dict]:
+    """
+    This function builds the KPI requests of every call from its corrected transcript.
+
+    Parameters:
+        - calls (Iterable[Tuple[str, str]]) -> (audio_id, corrected transcript) of every call
+        - fused (bool) -> One fused request per call instead of one request per KPI
+
+    Returns:
+        - lines (Iterator[Dict]) -> Batch API request lines
+    """
+    for audio_id, corrected_transcript in calls:
+        agents = TranscriptAgents([], corrected_transcript)
+        agents.cleaned_corrected_transcripts = corrected_transcript
+
+        if fused:
+            yield to_batch_line(make_custom_id(audio_id, "kpi", "fused"), agents._fused_request())
+            continue
+
+        for kpi_name in agents.kpi_names:
+            yield to_batch_line(make_custom_id(audio_id, "kpi", kpi_name), agents._kpi_request(kpi_name))
+
+
+def iter_batch_output(paths: Iterable[str]) -> Iterator[Tuple[str, Optional[str], Optional[str]]]:
+    """
+    This function reads Batch API output files.
+
+    Parameters:
+        - paths (Iterable[str]) -> Paths of the output JSONL files
+
+    Returns:
+        - results (Iterator[Tuple]) -> (custom_id, content, error) of every request, content is None if it failed
+    """
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as output_file:
+            for line in output_file:
+                if not line.strip():
+                    continue
+
+                output = json.loads(line)
+                response = output.get("response") or {}
+                if output.get("error") or response.get("status_code") != 200:
+                    yield output["custom_id"], None, json.dumps(output.get("error") or response.get("body"))
+                    continue
+
+                yield output["custom_id"], response["body"]["choices"][0]["message"]["content"], None
+
+
+def ingest_corrections(
+    raw_calls: Dict[str, List[str]],
+    output_paths: Iterable[str],
+    max_batch_tokens: Optional[int] = 1000,
+    mode: str = "hybrid",
+    keywords: Optional[List[str]] = None
+) -> Tuple[Dict[str, List[str]], List[str], List[str]]:
+    """
+    This function parses correction output files back into the corrected segments of every call.
+
+    The requests are planned again with the options they were built with, so the segments without a request keep their local correction. A segment whose request failed, is missing from the output, or whose packed completion lost a marker also keeps its local correction and is reported.
+
+    Parameters:
+        - raw_calls (Dict[str, List[str]]) -> Audio id to the raw segment transcripts the requests were built from
+        - output_paths (Iterable[str]) -> Paths of the output JSONL files
+        - max_batch_tokens (int | None) -> Token budget the requests were packed with
+        - mode (str) -> Correction mode the requests were built with
+        - keywords (List[str] | None) -> Product names the requests were built with, read from data/keywords.txt if not provided
+
+    Returns:
+        - corrected_calls (Dict[str, List[str]]) -> Audio id to the corrected segment transcripts
+        - failed_custom_ids (List[str]) -> Custom ids that came back with an error or could not be split into their segments
+        - missing_custom_ids (List[str]) -> Custom ids of requests that were built but are not in the output files
+    """
+    corrected_calls = {}
+    submitted_custom_ids = []
+    for audio_id, raw_transcripts in raw_calls.items():
+        _, corrected_calls[audio_id], batches = plan_corrections(raw_transcripts, max_batch_tokens, mode, keywords)
+        submitted_custom_ids.extend([make_custom_id(audio_id, "correction", _segment_range_name(batch)) for batch in batches])
+
+    ingested_custom_ids = set()
+    failed_custom_ids = []
+    for custom_id, content, _ in iter_batch_output(output_paths):
+        audio_id, stage, segment_range = parse_custom_id(custom_id)
+        if stage != "correction" or audio_id not in corrected_calls:
+            continue
+
+        ingested_custom_ids.add(custom_id)
+        indexes = _segment_indexes(segment_range)
+        corrected_segments = None if content is None else TranscriptAgents._split_corrected_segments(content, len(indexes))
+        if corrected_segments is None:
+            failed_custom_ids.append(custom_id)
+            continue
+
+        for index, corrected_segment in zip(indexes, corrected_segments):
+            corrected_calls[audio_id][index] = corrected_segment
+
+    missing_custom_ids = [custom_id for custom_id in submitted_custom_ids if custom_id not in ingested_custom_ids]
+
+    return corrected_calls, failed_custom_ids, missing_custom_ids
+
+
+def ingest_kpis(corrected_calls: Dict[str, str], output_paths: Iterable[str], fused: bool = False) -> Tuple[Dict[str, Dict], List[str], List[str]]:
+    """
+    This function parses KPI output files back into the KPI scores of every call, stamped like the batch runner records so they can be re-scored incrementally. Fused results are split into their KPIs.
+
+    Parameters:
+        - corrected_calls (Dict[str, str]) -> Audio id to the corrected transcript the requests were built from
+        - output_paths (Iterable[str]) -> Paths of the output JSONL files
+        - fused (bool) -> The requests were built with one fused request per call
+
+    Returns:
+        - records (Dict[str, Dict]) -> Audio id to the kpi_scores, kpi_versions and kpi_options of the call
+        - failed_custom_ids (List[str]) -> Custom ids that came back with an error or could not be parsed
+        - missing_custom_ids (List[str]) -> Custom ids of requests that were built but are not in the output files
+    """
+    kpi_results: Dict[str, Dict[str, ScoringFormat]] = {}
+
+    ingested_custom_ids = set()
+    failed_custom_ids = []
+    for custom_id, content, _ in iter_batch_output(output_paths):
+        audio_id, stage, kpi_name = parse_custom_id(custom_id)
+        if stage != "kpi" or audio_id not in corrected_calls:
+            continue
+
+        ingested_custom_ids.add(custom_id)
+        try:
+            if kpi_name == "fused":
+                fused_result = FusedScoringFormat.model_validate_json(content)
+                results = {name: getattr(fused_result, name) for name in KPI_REFERENCE_SCRIPTS}
+            else:
+                results = {kpi_name: ScoringFormat.model_validate_json(content)}
+        except Exception:
+            failed_custom_ids.append(custom_id)
+            continue
+
+        kpi_results.setdefault(audio_id, {}).update(results)
+
+    records = {}
+    missing_custom_ids = []
+    for audio_id, corrected_transcript in corrected_calls.items():
+        agents = TranscriptAgents([], corrected_transcript)
+        agents.cleaned_corrected_transcripts = corrected_transcript
+        agents.kpi_options = dict(agents.kpi_options, fused=fused)
+
+        submitted_custom_ids = [make_custom_id(audio_id, "kpi", name) for name in (["fused"] if fused else agents.kpi_names)]
+        missing_custom_ids.extend([custom_id for custom_id in submitted_custom_ids if custom_id not in ingested_custom_ids])
+
+        results = kpi_results.get(audio_id)
+        if not results:
+            continue
+
+        for kpi_name in results:
+            agents.kpi_modes[kpi_name] = "fused" if fused else "agent"
+        records[audio_id] = {
+            "kpi_scores": {kpi_name: result.model_dump() for kpi_name, result in results.items()},
+            "kpi_versions": agents.kpi_stamps(list(results)),
+            "kpi_options": agents.kpi_options,
+        }
+
+    return records, failed_custom_ids, missing_custom_ids
+
+
+def run_local_batch(input_path: str, output_path: str, client) -> str:
+    """
+    This function is a local stand-in for the Batch API: it sends every request of an input file with a synchronous client and writes an output file in the Batch API format.
+
+    Parameters:
+        - input_path (str) -> Batch API input JSONL file
+        - output_path (str) -> Output JSONL file to write
+        - client (OpenAI) -> OpenAI compatible client, e.g. a local fake
+
+    Returns:
+        - output_path (str) -> Path of the written output file
+    """
+    with open(input_path, "r", encoding="utf-8") as input_file, open(output_path, "w", encoding="utf-8") as output_file:
+        for index, line in enumerate(input_file):
+            if not line.strip():
+                continue
+
+            request = json.loads(line)
+            output = {"id": f"batch_req_{index}", "custom_id": request["custom_id"], "response": None, "error": None}
+            try:
+                completion = client.chat.completions.create(**request["body"])
+                output["response"] = {
+                    "status_code": 200,
+                    "body": {"choices": [{"index": 0, "message": {"role": "assistant", "content": completion.choices[0].message.content}}]},
+                }
+            except Exception as error:
+                output["error"] = {"code": type(error).__name__, "message": str(error)}
+
+            output_file.write(json.dumps(output, ensure_ascii=False) + "\n")
+
+    return output_path
+
+
+def submit_batch(client, input_path: str, completion_window: str = "24h"):
+    """
+    This function uploads an input file and creates a Batch API job for it.
+
+    Parameters:
+        - client (OpenAI) -> OpenAI client
+        - input_path (str) -> Batch API input JSONL file
+        - completion_window (str) -> Completion window of the batch
+
+    Returns:
+        - batch (Batch) -> Created batch job
+    """
+    with open(input_path, "rb") as input_file:
+        batch_file = client.files.create(file=input_file, purpose="batch")
+
+    return client.batches.create(input_file_id=batch_file.id, endpoint=BATCH_ENDPOINT, completion_window=completion_window)
+
+
+def _read_jsonl(path: str) -> Iterator[Dict]:
+    """This is a helper function that lazily reads the records of a JSONL file."""
+    with open(path, "r", encoding="utf-8") as jsonl_file:
+        for line in jsonl_file:
+            if line.strip():
+                yield json.loads(line)
+
+
+def main() -> None:
+    """This function is the command line entry point to build and ingest Batch API files."""
+    parser = argparse.ArgumentParser(description="Build and ingest OpenAI Batch API files for transcript correction and KPI scoring.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_corrections = subparsers.add_parser("build-corrections", help="Build correction requests from the batch runner transcripts")
+    build_corrections.add_argument("transcripts", help="JSONL with audio_id and segments per call")
+    build_corrections.add_argument("--output-dir", default="batches", help="Folder of the request shards")
+    build_corrections.add_argument("--max-batch-tokens", type=int, default=1000, help="Token budget of a packed correction request")
+    build_corrections.add_argument("--correction-mode", choices=CORRECTION_MODES, default="hybrid", help="llm: every segment, hybrid: only the segments the local keyword corrector is not confident about, local: no requests")
+
+    ingest_corrections_parser = subparsers.add_parser("ingest-corrections", help="Write the corrected transcripts of every call")
+    ingest_corrections_parser.add_argument("transcripts", help="JSONL with audio_id and segments per call")
+    ingest_corrections_parser.add_argument("outputs", nargs="*", help="Batch API output files")
+    ingest_corrections_parser.add_argument("--output", default="corrected_transcripts.jsonl", help="JSONL of the corrected transcripts")
+    ingest_corrections_parser.add_argument("--max-batch-tokens", type=int, default=1000, help="Token budget the correction requests were built with")
+    ingest_corrections_parser.add_argument("--correction-mode", choices=CORRECTION_MODES, default="hybrid", help="Correction mode the requests were built with")
+
+    build_kpis = subparsers.add_parser("build-kpis", help="Build KPI requests from the corrected transcripts")
+    build_kpis.add_argument("corrected", help="JSONL with audio_id and corrected_transcript per call")
+    build_kpis.add_argument("--output-dir", default="batches", help="Folder of the request shards")
+    build_kpis.add_argument("--fused", action="store_true", help="One fused request per call")
+
+    ingest_kpis_parser = subparsers.add_parser("ingest-kpis", help="Write the KPI scores of every call")
+    ingest_kpis_parser.add_argument("corrected", help="JSONL with audio_id and corrected_transcript per call the requests were built from")
+    ingest_kpis_parser.add_argument("outputs", nargs="+", help="Batch API output files")
+    ingest_kpis_parser.add_argument("--output", default="kpi_scores.jsonl", help="JSONL of the KPI scores")
+    ingest_kpis_parser.add_argument("--fused", action="store_true", help="The requests were built with one fused request per call")
+
+    args = parser.parse_args()
+
+    if args.command == "build-corrections":
+        calls = ((record["audio_id"], record["segments"]) for record in _read_jsonl(args.transcripts))
+        paths = write_batch_files(iter_correction_lines(calls, args.max_batch_tokens, args.correction_mode), args.output_dir, "correction_requests")
+        print(json.dumps({"shards": paths}))
+
+    elif args.command == "ingest-corrections":
+        raw_calls = {record["audio_id"]: record["segments"] for record in _read_jsonl(args.transcripts)}
+        corrected_calls, failed_custom_ids, missing_custom_ids = ingest_corrections(raw_calls, args.outputs, args.max_batch_tokens, args.correction_mode)
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            for audio_id, corrected_segments in corrected_calls.items():
+                output_file.write(json.dumps({
+                    "audio_id": audio_id,
+                    "corrected_segments": corrected_segments,
+                    "corrected_transcript": ' '.join(corrected_segments),
+                }, ensure_ascii=False) + "\n")
+        print(json.dumps({"calls": len(corrected_calls), "failed": failed_custom_ids, "missing": missing_custom_ids}))
+
+    elif args.command == "build-kpis":
+        calls = ((record["audio_id"], record["corrected_transcript"]) for record in _read_jsonl(args.corrected))
+        paths = write_batch_files(iter_kpi_lines(calls, args.fused), args.output_dir, "kpi_requests")
+        print(json.dumps({"shards": paths}))
+
+    elif args.command == "ingest-kpis":
+        corrected_calls = {record["audio_id"]: record["corrected_transcript"] for record in _read_jsonl(args.corrected)}
+        records, failed_custom_ids, missing_custom_ids = ingest_kpis(corrected_calls, args.outputs, args.fused)
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            for audio_id, record in records.items():
+                output_file.write(json.dumps(dict(audio_id=audio_id, **record), ensure_ascii=False) + "\n")
+        print(json.dumps({"calls": len(records), "failed": failed_custom_ids, "missing": missing_custom_ids}))
+
+
+if __name__ == "__main__":
+    main()
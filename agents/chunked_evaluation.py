@@ -0,0 +1,161 @@
+import re
+from typing import Dict, List, Literal
+
+from pydantic import BaseModel
+
+from agents.tokens import count_tokens
+
+# System prompt of a KPI agent that only sees one window of a long transcript. Like KPI_SYSTEM_PROMPT it is shared by every KPI, the rubric of the KPI follows the window.
+WINDOW_KPI_SYSTEM_PROMPT = """You are a professional Customer Support Script Adherence Checker working for Choice Finx. You will be provided with one part of a longer transcript of a call between the customer support agent and the customer, followed by the KPI to check and its reference script. Other parts of the call are checked separately, so only judge what is in this part. Your job is to:
+
+1. Carefully read through this part of the transcript and evaluate if the agent has mentioned what the KPI asks for, as outlined in the reference script.
+2. For each numbered point in the reference script, return:
+- point: the number of the point as written in the reference script (e.g. 1, 2, 5.1).
+- status: **fully covered**, **partially covered** or **missed** in this part.
+- agent_said: if partially covered, **exactly what the agent said**, otherwise an empty string.
+- suggested_correction: if partially covered or missed, the response the agent should use next time to fully cover the point, otherwise an empty string.
+"""
+
+STATUS_RANK = {"missed": 0, "partially covered": 1, "fully covered": 2}
+
+# Point number at the start of a line of a reference script: "1.We offer", "5.1. MTF", "4. Own". Numbers inside a line ("11.30 am") are not points.
+POINT_PATTERN = re.compile(r"^\s*(\d+(?:\.\d+)*)\.?(?!\d)", re.MULTILINE)
+
+
+class PointFinding(BaseModel):
+    """This class defines the structured output format of one reference script point in one window"""
+    point: str
+    status: Literal["fully covered", "partially covered", "missed"]
+    agent_said: str
+    suggested_correction: str
+
+
+class WindowScoringFormat(BaseModel):
+    """This class defines the structured output format of a KPI agent on one window of a transcript"""
+    points: List[PointFinding]
+
+
+def split_windows(segments: List[str], max_window_tokens: int, model: str = "gpt-4o", overlap_segments: int = 1) -> List[str]:
+    """
+    This function splits a transcript on segment boundaries into windows of at most max_window_tokens tokens, counted locally.
+
+    Parameters:
+        - segments (List[str]) -> Transcript of every segment, in order
+        - max_window_tokens (int) -> Token budget of a window, a single longer segment gets a window of its own
+        - model (str) -> Model whose tokenizer should be used
+        - overlap_segments (int) -> Segments repeated at the start of the next window, so a point said across a boundary is seen whole
+
+    Returns:
+        - windows (List[str]) -> Text of every window, in order
+    """
+    segments = [segment.strip() for segment in segments if segment.strip()]
+    segment_tokens = [count_tokens(segment, model) for segment in segments]
+
+    windows = []
+    start = 0
+    while start < len(segments):
+        end = start + 1
+        window_tokens = segment_tokens[start]
+        while end < len(segments) and window_tokens + segment_tokens[end] <= max_window_tokens:
+            window_tokens += segment_tokens[end]
+            end += 1
+
+        windows.append(' '.join(segments[start:end]))
+        if end == len(segments):
+            break
+
+        # Always move forward, even if the overlap is as long as the window
+        start = max(start + 1, end - overlap_segments)
+
+    return windows
+
+
+def reference_points(reference_script: str) -> List[str]:
+    """
+    This function returns the point numbers written at the start of the lines of a reference script.
+
+    Parameters:
+        - reference_script (str) -> Reference script of a KPI
+
+    Returns:
+        - points (List[str]) -> Point numbers in order, e.g. ["1", "2", "5.1", "5.2"]. A heading with sub-points (5 above 5.1) is not a point of its own
+    """
+    points = list(dict.fromkeys(POINT_PATTERN.findall(reference_script)))
+
+    return [point for point in points if not any(other.startswith(point + ".") for other in points)]
+
+
+def reference_point_texts(reference_script: str) -> Dict[str, str]:
+    """
+    This function returns the text of every point of a reference script, the points being those of reference_points.
+
+    Parameters:
+        - reference_script (str) -> Reference script of a KPI
+
+    Returns:
+        - point_texts (Dict[str, str]) -> Point number to its text, in order. The text of a heading is prepended to each of its sub-points, the introduction before the first point is left out
+    """
+    # 1. Text of every numbered line, continuation lines included
+    texts: Dict[str, str] = {}
+    number = None
+    for line in reference_script.splitlines():
+        match = POINT_PATTERN.match(line)
+        if match:
+            number = match.group(1)
+            texts[number] = texts.get(number, "") + line[match.end():].strip()
+        elif number is not None:
+            texts[number] += "\n" + line.strip()
+
+    # 2. Keep the points, with the text of their headings
+    point_texts = {}
+    for point in reference_points(reference_script):
+        parts = point.split(".")
+        headings = ['.'.join(parts[:end]) for end in range(1, len(parts))]
+        point_texts[point] = ' '.join([texts[heading] for heading in headings if heading in texts] + [texts[point]])
+
+    return point_texts
+
+
+def reduce_window_findings(points: List[str], window_results: List[Dict]) -> Dict:
+    """
+    This function reduces the findings of every window into one ScoringFormat result. A point counts as covered if any window covered it.
+
+    Findings of points that are not in the reference script are ignored, so a point made up by the model cannot change the score.
+
+    Parameters:
+        - points (List[str]) -> Point numbers of the reference script
+        - window_results (List[Dict]) -> WindowScoringFormat result of every window
+
+    Returns:
+        - result (Dict) -> score and feedback in the format of the single request KPI agents
+    """
+    if not points:
+        raise ValueError("The reference script has no numbered points, it cannot be evaluated in windows")
+
+    # Best finding of every point across the windows, the first window wins a tie
+    best_findings: Dict[str, Dict] = {point: None for point in points}
+    for window_result in window_results:
+        for finding in window_result["points"]:
+            point = finding["point"].strip().rstrip(".")
+            if point not in best_findings:
+                continue
+            best = best_findings[point]
+            if best is None or STATUS_RANK[finding["status"]] > STATUS_RANK[best["status"]]:
+                best_findings[point] = finding
+
+    missed_points = [(point, finding) for point, finding in best_findings.items() if finding is None or finding["status"] != "fully covered"]
+    if not missed_points:
+        return {"score": True, "feedback": "The agent has covered all points as per the script."}
+
+    feedback = []
+    for point, finding in missed_points:
+        if finding is None:
+            feedback.append(f"- Point {point}: Missed\n- What the agent said: \n- Suggested correction: ")
+            continue
+        feedback.append(
+            f"- Point {point}: {finding['status'].capitalize()}\n"
+            f"- What the agent said: {finding['agent_said']}\n"
+            f"- Suggested correction: {finding['suggested_correction']}"
+        )
+
+    return {"score": False, "feedback": '\n'.join(feedback)}
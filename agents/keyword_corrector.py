@@ -0,0 +1,383 @@
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from pydantic import BaseModel
+
+# Product names that are always corrected, on top of data/keywords.txt
+DEFAULT_KEYWORDS = ["Choice Finx", "Choice Broking"]
+
+TOKEN_PATTERN = re.compile(r"[A-Za-z0-9]+")
+
+REPEATED_LETTERS = re.compile(r"(.)\1+")
+
+CANDIDATE_CACHE_SIZE = 65536
+
+# Keywords up to this many letters (Algo, Refer, SIP) are too close to ordinary words to be fuzzy matched against them
+SHORT_KEYWORD_LENGTH = 5
+
+# Frequent English words of the translated transcripts. A window made only of them is never fuzzy matched to a short keyword,
+# a match that ends on one of them is never accepted without the LLM, and an exact match of one is left as it is.
+COMMON_WORDS = frozenset("""
+a about above after again against all almost also always am an and any are around as ask at away back be because been
+before being below best better between big both bring but buy by call came can care case change check close come could
+day did do does done down each early easy else end enough even ever every fall far fast feel few file fill find fine
+first for form free from fun full funds fund gain get give go goes going gone good got great had has have he hear help
+her here high him his hold home how i if in into is it its just keep kind know last late left less let life like line
+little live long look lot low made make many may me mean mind more most much must my need never new next nice no not now
+of off offer old on once one only open or other our out over own part pay people place plan please point price put
+rate read real refer right said same save saw say see sell send set she should show side sip small so some soon start
+still such sure take talk tell than thank that the their them then there these they thing think this those time to
+today too trade try turn two under up upon us use very wait want was water way we well went were what when where which
+while who why will with without work would year yes yet you your
+""".split())
+
+# Sound-alike spellings Whisper produces for Hinglish speech, rewritten before the key is built. Order matters.
+PHONETIC_RULES = [
+    (re.compile(r"ph"), "f"),
+    (re.compile(r"ch"), "C"),
+    (re.compile(r"sh"), "S"),
+    (re.compile(r"([bdgkt])h"), r"\1"),
+    (re.compile(r"ck"), "k"),
+    (re.compile(r"c(?=[eiy])"), "s"),
+    (re.compile(r"c"), "k"),
+    (re.compile(r"q"), "k"),
+    (re.compile(r"x"), "ks"),
+    (re.compile(r"z"), "s"),
+    (re.compile(r"v"), "w"),
+    (re.compile(r"ee|ea|ie"), "i"),
+]
+
+
+@lru_cache(maxsize=65536)
+def phonetic_key(text: str) -> str:
+    """
+    This function builds a phonetic key of a word or phrase: sound-alike letters are merged, vowels after the first letter and repeated letters are dropped.
+
+    Parameters:
+        - text (str) -> Word or phrase, spaces are ignored
+
+    Returns:
+        - key (str) -> Phonetic key
+    """
+    text = re.sub(r"[^a-z0-9]", "", text.lower())
+    if not text:
+        return ""
+
+    for pattern, replacement in PHONETIC_RULES:
+        text = pattern.sub(replacement, text)
+
+    key = text[0] + re.sub(r"[aeiouyh]", "", text[1:])
+
+    return REPEATED_LETTERS.sub(r"\1", key)
+
+
+def join_keys(keys: List[str]) -> str:
+    """
+    This function builds the phonetic key of a phrase from the keys of its words, as if the words were written together.
+
+    Parameters:
+        - keys (List[str]) -> Phonetic keys of the words, in order
+
+    Returns:
+        - key (str) -> Phonetic key of the phrase
+    """
+    keys = [key for key in keys if key]
+    if not keys:
+        return ""
+
+    # Vowels are only kept as the first letter of the phrase
+    key = keys[0] + ''.join([word_key[1:] if word_key[0] in "aeiouy" else word_key for word_key in keys[1:]])
+
+    return REPEATED_LETTERS.sub(r"\1", key)
+
+
+def similarity(first: str, second: str) -> float:
+    """
+    This function returns the normalized Levenshtein similarity of two strings, ignoring case and spaces.
+
+    Parameters:
+        - first (str) -> First string
+        - second (str) -> Second string
+
+    Returns:
+        - similarity (float) -> 1.0 for identical strings, 0.0 for completely different ones
+    """
+    first = first.lower().replace(" ", "")
+    second = second.lower().replace(" ", "")
+    if not first or not second:
+        return 0.0
+
+    previous = list(range(len(second) + 1))
+    for i, first_char in enumerate(first, 1):
+        current = [i]
+        for j, second_char in enumerate(second, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (first_char != second_char)))
+        previous = current
+
+    return 1 - previous[-1] / max(len(first), len(second))
+
+
+def _deletes(key: str) -> Set[str]:
+    """This is a helper function that returns every variant of a key with one character deleted."""
+    return {key[:index] + key[index + 1:] for index in range(len(key))}
+
+
+class CorrectionResult(BaseModel):
+    """This class holds the result of correcting one segment locally."""
+    text: str
+    replacements: List[Tuple[str, str]] = []
+    uncertain_matches: List[Tuple[str, str]] = []
+
+    @property
+    def low_confidence(self) -> bool:
+        """A segment is low-confidence if it contains a likely keyword the corrector was not sure enough to replace."""
+        return bool(self.uncertain_matches)
+
+
+class KeywordCorrector:
+    """This class corrects the spelling of product names and keywords in transcripts locally, with a phonetic index compiled once from the keywords."""
+
+    def __init__(self, keywords: Iterable[str], accept_threshold: float = 0.85, review_threshold: float = 0.45, min_fuzzy_length: int = 4) -> None:
+        """
+        This function compiles the index of the keywords.
+
+        A fuzzy match is only replaced when its phonetic key is the key of the keyword and its similarity reaches accept_threshold. Anything weaker that is still a likely keyword is left to the LLM as an uncertain match.
+
+        Parameters:
+            - keywords (Iterable[str]) -> Canonical spellings of the keywords
+            - accept_threshold (float) -> Minimum similarity to replace a phonetic match with the keyword
+            - review_threshold (float) -> Minimum similarity to flag a phonetic match as low-confidence instead of ignoring it
+            - min_fuzzy_length (int) -> Keywords shorter than this (e.g. MTF, SIP) are only matched exactly, ignoring case
+        """
+        self.keywords = list(dict.fromkeys([keyword.strip() for keyword in keywords if keyword.strip()]))
+        self.accept_threshold = accept_threshold
+        self.review_threshold = review_threshold
+        self.min_fuzzy_length = min_fuzzy_length
+
+        # A transcribed keyword can be split into more tokens ("Choice Fin X") or merged into fewer ("Choicefinx")
+        self.max_window_tokens = max([len(TOKEN_PATTERN.findall(keyword)) for keyword in self.keywords], default=1) + 1
+
+        self._exact_index: Dict[str, int] = {}
+        self._phonetic_index: Dict[str, List[int]] = {}
+        self._deletes_index: Dict[str, List[int]] = {}
+        # Cheap filters: a key one edit away from a keyword key starts with one of its first two letters and differs in length by at most one
+        self._key_prefixes: Set[str] = set()
+        self._exact_prefixes: Set[str] = set()
+        self._key_lengths: Set[int] = set()
+        self._candidate_cache: Dict[str, List[int]] = {}
+        self._keyword_lengths: List[int] = []
+        self._keyword_keys: List[Set[str]] = []
+        for keyword_id, keyword in enumerate(self.keywords):
+            normalized_keyword = ''.join(TOKEN_PATTERN.findall(keyword.lower()))
+            self._exact_index[normalized_keyword] = keyword_id
+            self._exact_prefixes.add(normalized_keyword[:1])
+            self._keyword_lengths.append(len(normalized_keyword))
+            self._keyword_keys.append({phonetic_key(keyword), join_keys([phonetic_key(token) for token in TOKEN_PATTERN.findall(keyword)])})
+
+            if len(normalized_keyword) < self.min_fuzzy_length:
+                continue
+
+            for key in self._keyword_keys[keyword_id]:
+                self._phonetic_index.setdefault(key, []).append(keyword_id)
+                self._key_prefixes.update(key[:2])
+                self._key_lengths.update([len(key) - 1, len(key), len(key) + 1])
+                for deleted_key in _deletes(key) | {key}:
+                    self._deletes_index.setdefault(deleted_key, []).append(keyword_id)
+
+        self.stats = {"segments": 0, "replacements": 0, "low_confidence_segments": 0}
+
+    @classmethod
+    def from_file(cls, keywords_path: str, **kwargs) -> "KeywordCorrector":
+        """
+        This function builds a corrector from a keywords file with one keyword per line, plus the DEFAULT_KEYWORDS.
+
+        Parameters:
+            - keywords_path (str) -> Path of the keywords file
+            - kwargs -> Thresholds passed to the constructor
+
+        Returns:
+            - corrector (KeywordCorrector) -> Compiled corrector
+        """
+        return cls(DEFAULT_KEYWORDS + load_keywords(keywords_path), **kwargs)
+
+    def _candidates(self, key: str) -> List[int]:
+        """
+        This is a helper function that returns the keywords whose phonetic key equals, or is one edit away from, the key of a window.
+
+        Parameters:
+            - key (str) -> Phonetic key of the window
+
+        Returns:
+            - keyword_ids (List[int]) -> Candidate keywords
+        """
+        if len(key) not in self._key_lengths or not self._key_prefixes.intersection(key[:2]):
+            return []
+
+        candidate_ids = self._candidate_cache.get(key)
+        if candidate_ids is None:
+            candidate_ids = set(self._phonetic_index.get(key, []))
+            for deleted_key in _deletes(key) | {key}:
+                candidate_ids.update(self._deletes_index.get(deleted_key, []))
+            if len(self._candidate_cache) >= CANDIDATE_CACHE_SIZE:
+                self._candidate_cache.clear()
+            candidate_ids = self._candidate_cache[key] = list(candidate_ids)
+
+        return candidate_ids
+
+    def _best_match(self, window_tokens: List[str], window_keys: List[str]) -> Optional[Tuple[int, float]]:
+        """
+        This is a helper function that finds the most similar keyword of a window.
+
+        Parameters:
+            - window_tokens (List[str]) -> Lowercase tokens of the window
+            - window_keys (List[str]) -> Phonetic keys of the tokens
+
+        Returns:
+            - match (Tuple[int, float] | None) -> Keyword id and similarity, None if no keyword is close enough to review
+        """
+        exact_id = self._exact_index.get(''.join(window_tokens))
+        if exact_id is not None:
+            return exact_id, 1.0
+
+        if not window_keys[0] or window_keys[0][0] not in self._key_prefixes:
+            return None
+
+        # A window never starts on an ordinary word, "the algo" is matched from "algo"
+        if len(window_tokens) > 1 and window_tokens[0] in COMMON_WORDS:
+            return None
+        only_common_words = all([token in COMMON_WORDS for token in window_tokens])
+
+        best = None
+        for keyword_id in self._candidates(join_keys(window_keys)):
+            if only_common_words and self._keyword_lengths[keyword_id] <= SHORT_KEYWORD_LENGTH:
+                continue
+            score = similarity(' '.join(window_tokens), self.keywords[keyword_id])
+            if score >= self.review_threshold and (best is None or score > best[1]):
+                best = (keyword_id, score)
+
+        return best
+
+    def _accepts(self, window_tokens: List[str], window_keys: List[str], keyword_id: int, score: float) -> bool:
+        """
+        This is a helper function that decides if a fuzzy match is safe to replace without the LLM.
+
+        Parameters:
+            - window_tokens (List[str]) -> Lowercase tokens of the window
+            - window_keys (List[str]) -> Phonetic keys of the tokens
+            - keyword_id (int) -> Matched keyword
+            - score (float) -> Similarity of the match
+
+        Returns:
+            - accepted (bool) -> True if the phonetic keys agree, the similarity is high enough and the window does not end on an ordinary word
+        """
+        if score < self.accept_threshold:
+            return False
+        if len(window_tokens) > 1 and window_tokens[-1] in COMMON_WORDS:
+            return False
+
+        return join_keys(window_keys) in self._keyword_keys[keyword_id] or phonetic_key(''.join(window_tokens)) in self._keyword_keys[keyword_id]
+
+    def correct(self, text: str) -> CorrectionResult:
+        """
+        This function corrects the keywords of one segment, scanning token windows left to right and keeping the best match at each position. A window only grows over a trailing token if that improves the similarity.
+
+        Parameters:
+            - text (str) -> Transcript of the segment
+
+        Returns:
+            - result (CorrectionResult) -> Corrected text, replacements made and uncertain matches
+        """
+        tokens = list(TOKEN_PATTERN.finditer(text))
+        lowercase_tokens = [token.group().lower() for token in tokens]
+        token_keys = [phonetic_key(token) for token in lowercase_tokens]
+        result = CorrectionResult(text=text)
+
+        pieces = []
+        last_end = 0
+        index = 0
+        while index < len(tokens):
+            # Most tokens cannot start a keyword at all
+            if lowercase_tokens[index][0] not in self._exact_prefixes and token_keys[index][0] not in self._key_prefixes:
+                index += 1
+                continue
+
+            best = None
+            for window_tokens in range(1, min(self.max_window_tokens, len(tokens) - index) + 1):
+                match = self._best_match(lowercase_tokens[index:index + window_tokens], token_keys[index:index + window_tokens])
+                if match is not None and (best is None or match[1] > best[1][1]):
+                    best = (window_tokens, match)
+
+            if best is None:
+                index += 1
+                continue
+
+            window_tokens, (keyword_id, score) = best
+            start, end = tokens[index].start(), tokens[index + window_tokens - 1].end()
+            original = text[start:end]
+            keyword = self.keywords[keyword_id]
+
+            if score == 1.0 and window_tokens == 1 and lowercase_tokens[index] in COMMON_WORDS:
+                # "please sip some water": the ordinary word is kept, the casing of the keyword would only add noise
+                pass
+            elif score < 1.0 and not self._accepts(
+                lowercase_tokens[index:index + window_tokens], token_keys[index:index + window_tokens], keyword_id, score
+            ):
+                result.uncertain_matches.append((original, keyword))
+            elif original != keyword:
+                pieces.append(text[last_end:start])
+                pieces.append(keyword)
+                last_end = end
+                result.replacements.append((original, keyword))
+
+            index += window_tokens
+
+        pieces.append(text[last_end:])
+        result.text = ''.join(pieces)
+
+        self.stats["segments"] += 1
+        self.stats["replacements"] += len(result.replacements)
+        self.stats["low_confidence_segments"] += int(result.low_confidence)
+
+        return result
+
+
+def load_keywords(keywords_path: str) -> List[str]:
+    """
+    This function reads a keywords file with one keyword per line.
+
+    Parameters:
+        - keywords_path (str) -> Path of the keywords file
+
+    Returns:
+        - keywords (List[str]) -> Keywords of the file, without empty lines
+    """
+    with open(keywords_path, "r", encoding="utf-8") as keywords_file:
+        return [line.strip() for line in keywords_file if line.strip()]
+
+
+@lru_cache(maxsize=None)
+def get_keyword_corrector(keywords: Tuple[str, ...]) -> KeywordCorrector:
+    """
+    This function compiles the keyword corrector of a list of keywords, plus the DEFAULT_KEYWORDS, once per process and reuses it afterwards.
+
+    Parameters:
+        - keywords (Tuple[str, ...]) -> Keywords to correct, as a tuple so they can be the key of the cache
+
+    Returns:
+        - corrector (KeywordCorrector) -> Compiled corrector
+    """
+    return KeywordCorrector(DEFAULT_KEYWORDS + list(keywords))
+
+
+def load_keyword_corrector(keywords_path: str) -> KeywordCorrector:
+    """
+    This function compiles the keyword corrector of a keywords file once per process and reuses it afterwards.
+
+    Parameters:
+        - keywords_path (str) -> Path of the keywords file
+
+    Returns:
+        - corrector (KeywordCorrector) -> Compiled corrector
+    """
+    return get_keyword_corrector(tuple(load_keywords(keywords_path)))
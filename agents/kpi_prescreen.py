@@ -0,0 +1,209 @@
+import hashlib
+import json
+import re
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+from agents.chunked_evaluation import reference_point_texts, reference_points
+
+TERM_PATTERN = re.compile(r"[A-Za-z][A-Za-z0-9]*")
+
+# Words of the reference scripts that say nothing about which KPI a call covers
+STOPWORDS = set("""
+a about above after all also an and any are as at be by can do does for form from get has have help in into is it its
+just like more no not of on one only or other our own per same so such than that the their them then there they this
+through till to up upto use using was we were what when which will with you your
+client clients agent app choice finx company time day days rs lakh amount charge charges charged facility available
+call sir see add ask help start minimum off out self real side right case work etc offer provide based create follow
+upon depend important example account
+""".split())
+
+# Spellings of reference script terms that Whisper or the agents use instead (Hinglish, abbreviations, typos of the script)
+TERM_VARIANTS = {
+    "referal": ["referral", "refer", "reference"],
+    "broekarge": ["brokerage"],
+    "sip": ["systematic"],
+    "algo": ["algorithm", "algorithmic", "automatic", "automated"],
+    "insurance": ["bima", "policy"],
+    "mtf": ["margin"],
+    "amc": ["maintenance"],
+    "basket": ["portfolio"],
+    "fno": ["futures", "future", "options", "option"],
+    "gst": ["tax"],
+}
+
+
+def normalize_term(word: str) -> str:
+    """
+    This function lowercases a word and strips common English suffixes, so "Baskets" and "basket" are the same term.
+
+    Parameters:
+        - word (str) -> Word of a reference script or transcript
+
+    Returns:
+        - term (str) -> Normalized term
+    """
+    word = word.lower()
+    for suffix in ("ing", "es", "s"):
+        if len(word) > len(suffix) + 3 and word.endswith(suffix):
+            return word[:-len(suffix)]
+
+    return word
+
+
+def extract_terms(text: str) -> Set[str]:
+    """
+    This function returns the normalized content terms of a text.
+
+    Parameters:
+        - text (str) -> Any text
+
+    Returns:
+        - terms (Set[str]) -> Normalized terms without stopwords
+    """
+    return {
+        normalize_term(word) for word in TERM_PATTERN.findall(text)
+        if word.lower() not in STOPWORDS and (len(word) >= 3 or word.isupper())
+    }
+
+
+class KPIPrescreen:
+    """This class decides locally, from a term index of the reference scripts, which KPIs a transcript cannot pass, so their LLM requests can be skipped."""
+
+    def __init__(self, reference_scripts: Optional[Dict[str, str]] = None, recall_threshold: float = 0.25, max_kpis_per_term: int = 2) -> None:
+        """
+        This function builds the term index of every KPI once.
+
+        Every point of a reference script (see reference_points) of a reference script becomes a set of terms. A KPI can only pass if every point is covered, so a transcript that has evidence for less than recall_threshold of its points is screened out.
+
+        Parameters:
+            - reference_scripts (Dict[str, str] | None) -> KPI name to reference script, the scripts of the default rubric registry if not provided
+            - recall_threshold (float) -> Minimum fraction of the points of a KPI with at least one term in the transcript to send it to the LLM. 0 never screens out, lower values give a higher recall
+            - max_kpis_per_term (int) -> Terms found in the scripts of more KPIs than this are ignored, since they do not tell the KPIs apart
+        """
+        if reference_scripts is None:
+            from agents.kpi_rubrics import load_rubric_registry
+            reference_scripts = {rubric.name: rubric.script for rubric in load_rubric_registry()}
+
+        self.recall_threshold = recall_threshold
+
+        # 1. Split the reference scripts into points and extract their terms
+        kpi_points = {kpi_name: self._split_points(reference_script) for kpi_name, reference_script in reference_scripts.items()}
+        self.point_counts = {kpi_name: len(points) for kpi_name, points in kpi_points.items()}
+        for kpi_name, reference_script in reference_scripts.items():
+            if self.point_counts[kpi_name] != len(reference_points(reference_script)):
+                raise ValueError(f"The pre-screen split the reference script of {kpi_name} into {self.point_counts[kpi_name]} points, the KPI agents see {len(reference_points(reference_script))}")
+
+        # 2. Drop the terms shared by too many KPIs
+        term_kpis: Dict[str, Set[str]] = {}
+        for kpi_name, points in kpi_points.items():
+            for point in points:
+                for term in point:
+                    term_kpis.setdefault(term, set()).add(kpi_name)
+
+        # 3. Index of every point, with the variants of its terms
+        self.kpi_points: Dict[str, List[Set[str]]] = {}
+        for kpi_name, points in kpi_points.items():
+            self.kpi_points[kpi_name] = []
+            for point in points:
+                terms = {term for term in point if len(term_kpis[term]) <= max_kpis_per_term}
+                for term in list(terms):
+                    terms.update([normalize_term(variant) for variant in TERM_VARIANTS.get(term, [])])
+                if terms:
+                    self.kpi_points[kpi_name].append(terms)
+
+        self.stats = {"calls": 0, "kpis_checked": 0, "kpi_requests_saved": 0, "saved_per_kpi": {kpi_name: 0 for kpi_name in self.kpi_points}}
+        self._lock = threading.Lock()
+
+    @property
+    def version(self) -> str:
+        """A hash of the term index and the threshold, so the results the pre-screen synthesized go stale when either changes."""
+        index = {kpi_name: [sorted(terms) for terms in points] for kpi_name, points in self.kpi_points.items()}
+
+        return hashlib.sha256(json.dumps([self.recall_threshold, index], sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+    @staticmethod
+    def _split_points(reference_script: str) -> List[Set[str]]:
+        """
+        This is a helper function that splits a reference script on the point numbers at the start of its lines (1., 2., 5.1., ...) and extracts the terms of every point.
+
+        Parameters:
+            - reference_script (str) -> Reference script of a KPI
+
+        Returns:
+            - points (List[Set[str]]) -> Terms of every point, in the order of reference_points. A point can have no terms
+        """
+        return [extract_terms(point_text) for point_text in reference_point_texts(reference_script).values()]
+
+    def coverage(self, transcript: str) -> Dict[str, Tuple[float, List[str]]]:
+        """
+        This function measures, for every KPI, the fraction of its points with at least one term in the transcript.
+
+        Parameters:
+            - transcript (str) -> Corrected transcript of the call
+
+        Returns:
+            - coverage (Dict[str, Tuple[float, List[str]]]) -> KPI name to the covered fraction and the terms found
+        """
+        transcript_terms = {normalize_term(word) for word in TERM_PATTERN.findall(transcript)}
+
+        coverage = {}
+        for kpi_name, points in self.kpi_points.items():
+            found_terms = set()
+            covered_points = 0
+            for terms in points:
+                matched_terms = terms & transcript_terms
+                covered_points += bool(matched_terms)
+                found_terms |= matched_terms
+            coverage[kpi_name] = (covered_points / len(points) if points else 1.0, sorted(found_terms))
+
+        return coverage
+
+    def screen(self, transcript: str, kpi_names: Optional[List[str]] = None) -> Dict[str, Dict]:
+        """
+        This function screens a transcript and returns a synthesized failing result for every KPI it cannot pass.
+
+        Parameters:
+            - transcript (str) -> Corrected transcript of the call
+            - kpi_names (List[str] | None) -> KPIs to screen, every indexed KPI if not provided
+
+        Returns:
+            - screened_out (Dict[str, Dict]) -> KPI name to a ScoringFormat compatible result (score False and feedback) of the KPIs that need no LLM request
+        """
+        kpi_names = list(self.kpi_points) if kpi_names is None else kpi_names
+        coverage = self.coverage(transcript)
+
+        screened_out = {}
+        for kpi_name in kpi_names:
+            if kpi_name not in coverage:
+                continue
+
+            covered_fraction, found_terms = coverage[kpi_name]
+            if covered_fraction < self.recall_threshold:
+                screened_out[kpi_name] = {
+                    "score": False,
+                    "feedback": f"Skipped by the local pre-screen: only {covered_fraction:.0%} of the points of the reference script are mentioned in the transcript (terms found: {', '.join(found_terms) or 'none'}). The agent did not cover this KPI."
+                }
+
+        with self._lock:
+            self.stats["calls"] += 1
+            self.stats["kpis_checked"] += len(kpi_names)
+            self.stats["kpi_requests_saved"] += len(screened_out)
+            for kpi_name in screened_out:
+                self.stats["saved_per_kpi"][kpi_name] += 1
+
+        return screened_out
+
+    def report(self) -> Dict:
+        """
+        This function returns the number of calls screened and the KPI requests saved so far.
+
+        Returns:
+            - report (Dict) -> Counters of the pre-screen and the fraction of KPI requests saved
+        """
+        with self._lock:
+            report = dict(self.stats, saved_per_kpi=dict(self.stats["saved_per_kpi"]), point_counts=dict(self.point_counts))
+
+        report["saved_ratio"] = round(report["kpi_requests_saved"] / report["kpis_checked"], 4) if report["kpis_checked"] else 0.0
+
+        return report
@@ -0,0 +1,113 @@
+import hashlib
+import json
+import os
+from functools import lru_cache
+from typing import Dict, Iterator, List, Union
+
+from pydantic import BaseModel
+
+DEFAULT_RUBRICS_PATH = os.environ.get(
+    "TELELYZER_KPI_RUBRICS",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "kpi_rubrics.json")
+)
+
+KPI_MODEL = "gpt-4o"
+
+# Per-KPI part of a KPI request. It is sent after the transcript, so every request of a call starts with the same bytes.
+KPI_RUBRIC_SUFFIX = """--- KPI: {name} ---
+Evaluate if the agent has mentioned {subject} of the Choice Finx app as outlined in the reference script.
+
+--- Reference Script ---
+{reference_script}"""
+
+
+class KPIRubric(BaseModel):
+    """This class defines a KPI: what the agent has to mention and the reference script it is checked against"""
+    name: str
+    subject: str
+    reference_script: Union[str, List[str]]
+    model: str = KPI_MODEL
+
+    @property
+    def script(self) -> str:
+        """The reference script as one string, the data file can store it as a list of lines."""
+        if isinstance(self.reference_script, list):
+            return '\n'.join(self.reference_script)
+
+        return self.reference_script
+
+
+class RubricRegistry:
+    """This class holds the KPI rubrics loaded from a data file, with their prompt suffixes and versions compiled once."""
+
+    def __init__(self, rubrics: List[KPIRubric]) -> None:
+        """
+        This function compiles the prompt suffix and version of every rubric.
+
+        Parameters:
+            - rubrics (List[KPIRubric]) -> Rubrics in evaluation order, names have to be unique
+        """
+        self.rubrics: Dict[str, KPIRubric] = {}
+        for rubric in rubrics:
+            if rubric.name in self.rubrics:
+                raise ValueError(f"Duplicate KPI rubric: {rubric.name}")
+            self.rubrics[rubric.name] = rubric
+
+        self.prompt_suffixes = {
+            rubric.name: KPI_RUBRIC_SUFFIX.format(name=rubric.name, subject=rubric.subject, reference_script=rubric.script)
+            for rubric in self.rubrics.values()
+        }
+        self.versions = {
+            rubric.name: hashlib.sha256(json.dumps([rubric.subject, rubric.script]).encode("utf-8")).hexdigest()[:16]
+            for rubric in self.rubrics.values()
+        }
+
+    @classmethod
+    def from_file(cls, rubrics_path: str) -> "RubricRegistry":
+        """
+        This function loads the rubrics of a JSON data file: {"rubrics": [{"name", "subject", "reference_script"}, ...]}.
+
+        Parameters:
+            - rubrics_path (str) -> Path of the rubrics file
+
+        Returns:
+            - registry (RubricRegistry) -> Compiled registry
+        """
+        with open(rubrics_path, "r", encoding="utf-8") as rubrics_file:
+            data = json.load(rubrics_file)
+
+        return cls([KPIRubric(**rubric) for rubric in data["rubrics"]])
+
+    @property
+    def names(self) -> List[str]:
+        """The KPI names, in evaluation order."""
+        return list(self.rubrics)
+
+    def __getitem__(self, kpi_name: str) -> KPIRubric:
+        """This function returns the rubric of a KPI, raising a KeyError with the known names if it does not exist."""
+        if kpi_name not in self.rubrics:
+            raise KeyError(f"Unknown KPI {kpi_name}, expected one of {self.names}")
+
+        return self.rubrics[kpi_name]
+
+    def __iter__(self) -> Iterator[KPIRubric]:
+        """This function iterates over the rubrics in evaluation order."""
+        return iter(self.rubrics.values())
+
+    def __len__(self) -> int:
+        """This function returns the number of rubrics."""
+        return len(self.rubrics)
+
+
+@lru_cache(maxsize=None)
+def load_rubric_registry(rubrics_path: str = DEFAULT_RUBRICS_PATH) -> RubricRegistry:
+    """
+    This function loads and compiles a rubrics file once per process and reuses it afterwards.
+
+    Parameters:
+        - rubrics_path (str) -> Path of the rubrics file, agents/kpi_rubrics.json or $TELELYZER_KPI_RUBRICS by default
+
+    Returns:
+        - registry (RubricRegistry) -> Compiled registry
+    """
+    return RubricRegistry.from_file(rubrics_path)
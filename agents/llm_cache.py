@@ -0,0 +1,182 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+
+class LLMCache:
+    """This class is a content addressed on-disk cache for LLM completions, stored in SQLite with size and age based LRU eviction."""
+
+    def __init__(self, path: str = "llm_cache.sqlite3", max_size_bytes: Optional[int] = 512 * 1024 * 1024, max_age_seconds: Optional[float] = None) -> None:
+        """
+        This function initializes the cache and creates the SQLite store if it does not exist.
+
+        Parameters:
+            - path (str) -> Path of the SQLite database
+            - max_size_bytes (int | None) -> Maximum total size of the cached completions, None for no limit
+            - max_age_seconds (float | None) -> Entries older than this are evicted, None to keep them forever
+        """
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self.path = path
+        self.max_size_bytes = max_size_bytes
+        self.max_age_seconds = max_age_seconds
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS completions (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_accessed REAL NOT NULL
+            )
+            """
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS completions_last_accessed ON completions (last_accessed)")
+
+        # Total size of the completions, kept up to date by triggers so a set does not sum the whole table. Filled once for a cache created before it existed.
+        self._connection.execute("CREATE TABLE IF NOT EXISTS cache_size (id INTEGER PRIMARY KEY CHECK (id = 1), total_size INTEGER NOT NULL)")
+        self._connection.execute("INSERT OR IGNORE INTO cache_size (id, total_size) SELECT 1, COALESCE(SUM(size), 0) FROM completions")
+        self._connection.execute(
+            """
+            CREATE TRIGGER IF NOT EXISTS completions_size_insert AFTER INSERT ON completions
+            BEGIN
+                UPDATE cache_size SET total_size = total_size + NEW.size WHERE id = 1;
+            END
+            """
+        )
+        self._connection.execute(
+            """
+            CREATE TRIGGER IF NOT EXISTS completions_size_delete AFTER DELETE ON completions
+            BEGIN
+                UPDATE cache_size SET total_size = total_size - OLD.size WHERE id = 1;
+            END
+            """
+        )
+        self._connection.commit()
+
+    @staticmethod
+    def make_key(model: str, temperature: float, messages: List[Dict], response_format=None) -> str:
+        """
+        This function builds the cache key of a request from everything that changes its completion.
+
+        Parameters:
+            - model (str) -> Model name
+            - temperature (float) -> Sampling temperature
+            - messages (List[Dict]) -> Chat messages of the request
+            - response_format (BaseModel | None) -> Structured output model of the request
+
+        Returns:
+            - key (str) -> SHA-256 hex digest of the request
+        """
+        request = {
+            "model": model,
+            "temperature": temperature,
+            "messages": messages,
+            "response_format": response_format.model_json_schema() if response_format is not None else None,
+        }
+
+        return hashlib.sha256(json.dumps(request, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        This function looks up a cached completion and marks it as recently used.
+
+        Parameters:
+            - key (str) -> Cache key built with make_key
+
+        Returns:
+            - value (str | None) -> Cached completion content, None on a miss
+        """
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute("SELECT value, created_at FROM completions WHERE key = ?", (key,)).fetchone()
+
+            if row is None or (self.max_age_seconds is not None and now - row[1] > self.max_age_seconds):
+                self.misses += 1
+                return None
+
+            self._connection.execute("UPDATE completions SET last_accessed = ? WHERE key = ?", (now, key))
+            self._connection.commit()
+            self.hits += 1
+
+            return row[0]
+
+    def set(self, key: str, value: str) -> None:
+        """
+        This function stores a completion and evicts expired and least recently used entries if the cache is over its limits.
+
+        Parameters:
+            - key (str) -> Cache key built with make_key
+            - value (str) -> Completion content
+        """
+        now = time.time()
+        with self._lock:
+            # A delete and an insert rather than INSERT OR REPLACE, whose implicit delete does not fire the size trigger
+            self._connection.execute("DELETE FROM completions WHERE key = ?", (key,))
+            self._connection.execute(
+                "INSERT INTO completions (key, value, size, created_at, last_accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value.encode("utf-8")), now, now)
+            )
+            self._evict(now)
+            self._connection.commit()
+
+    def _evict(self, now: float) -> None:
+        """
+        This is a helper function that removes expired entries, then the least recently used ones until the cache fits in max_size_bytes.
+
+        Parameters:
+            - now (float) -> Current timestamp
+        """
+        if self.max_age_seconds is not None:
+            self._connection.execute("DELETE FROM completions WHERE created_at < ?", (now - self.max_age_seconds,))
+
+        if self.max_size_bytes is None:
+            return
+
+        total_size = self._connection.execute("SELECT total_size FROM cache_size WHERE id = 1").fetchone()[0]
+        if total_size <= self.max_size_bytes:
+            return
+
+        evicted_keys = []
+        for key, size in self._connection.execute("SELECT key, size FROM completions ORDER BY last_accessed ASC"):
+            if total_size <= self.max_size_bytes:
+                break
+            evicted_keys.append((key,))
+            total_size -= size
+
+        self._connection.executemany("DELETE FROM completions WHERE key = ?", evicted_keys)
+
+    def stats(self) -> Dict:
+        """
+        This function returns the hit/miss counters and the current size of the cache.
+
+        Returns:
+            - stats (Dict) -> Hits, misses, hit rate, number of entries and total size in bytes
+        """
+        with self._lock:
+            entries = self._connection.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+            size = self._connection.execute("SELECT total_size FROM cache_size WHERE id = 1").fetchone()[0]
+
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "entries": entries,
+            "size_bytes": size,
+        }
+
+    def close(self) -> None:
+        """This function closes the SQLite connection."""
+        with self._lock:
+            self._connection.close()
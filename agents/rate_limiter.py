@@ -0,0 +1,78 @@
+import threading
+import time
+from typing import Optional
+
+
+class TokenBucketRateLimiter:
+    """This class limits the requests per minute and tokens per minute sent to the LLM provider using two token buckets."""
+
+    def __init__(self, requests_per_minute: Optional[int] = None, tokens_per_minute: Optional[int] = None) -> None:
+        """
+        This function initializes the rate limiter. Both buckets start full so the first requests are not delayed.
+
+        Parameters:
+            - requests_per_minute (int | None) -> Maximum requests per minute, None for no limit
+            - tokens_per_minute (int | None) -> Maximum tokens per minute, None for no limit
+        """
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+
+        self._available_requests = float(requests_per_minute or 0)
+        self._available_tokens = float(tokens_per_minute or 0)
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        """This is a helper function that adds the capacity accumulated since the last refill to both buckets."""
+        now = time.monotonic()
+        elapsed_minutes = (now - self._last_refill) / 60
+        self._last_refill = now
+
+        if self.requests_per_minute:
+            self._available_requests = min(
+                float(self.requests_per_minute),
+                self._available_requests + elapsed_minutes * self.requests_per_minute
+            )
+        if self.tokens_per_minute:
+            self._available_tokens = min(
+                float(self.tokens_per_minute),
+                self._available_tokens + elapsed_minutes * self.tokens_per_minute
+            )
+
+    def acquire(self, tokens: int = 0) -> float:
+        """
+        This function blocks until one request with the given number of tokens can be sent.
+
+        Requests larger than tokens_per_minute are capped to the bucket size so they can still go through once the bucket is full.
+
+        Parameters:
+            - tokens (int) -> Estimated tokens (prompt + completion) of the request
+
+        Returns:
+            - waited (float) -> Seconds spent waiting for capacity
+        """
+        if self.tokens_per_minute:
+            tokens = min(tokens, self.tokens_per_minute)
+
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+
+                missing_requests = max(0.0, 1 - self._available_requests) if self.requests_per_minute else 0.0
+                missing_tokens = max(0.0, tokens - self._available_tokens) if self.tokens_per_minute else 0.0
+
+                if missing_requests == 0 and missing_tokens == 0:
+                    if self.requests_per_minute:
+                        self._available_requests -= 1
+                    if self.tokens_per_minute:
+                        self._available_tokens -= tokens
+                    return waited
+
+                wait_seconds = max(
+                    missing_requests * 60 / self.requests_per_minute if missing_requests else 0.0,
+                    missing_tokens * 60 / self.tokens_per_minute if missing_tokens else 0.0,
+                )
+
+            time.sleep(wait_seconds)
+            waited += wait_seconds
@@ -0,0 +1,52 @@
+from functools import lru_cache
+
+# Rough characters-per-token ratio for English text, used when tiktoken is not installed.
+CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=None)
+def _get_encoding(model: str):
+    """
+    This is a helper function that loads the tiktoken encoding for a model once per process.
+
+    Parameters:
+        - model (str) -> Model name, e.g. gpt-4o
+
+    Returns:
+        - encoding (tiktoken.Encoding | None) -> Encoding for the model, None if tiktoken is not installed or its encoding cannot be loaded.
+    """
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        # The encoding files are downloaded on first use, which fails offline
+        return None
+
+
+def count_tokens(text: str, model: str = "gpt-4o") -> int:
+    """
+    This function counts the tokens in a text locally, without an API call.
+
+    tiktoken is used when it is installed, otherwise the count is approximated from the number of characters.
+
+    Parameters:
+        - text (str) -> Text you want to count the tokens of
+        - model (str) -> Model whose tokenizer should be used
+
+    Returns:
+        - token_count (int) -> Number of tokens in the text
+    """
+    if not text:
+        return 0
+
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return max(1, -(-len(text) // CHARS_PER_TOKEN))
+
+    return len(encoding.encode(text))
@@ -1,506 +1,785 @@
-from typing import List
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import hashlib
 import json
-from pydantic import BaseModel
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pydantic import BaseModel, create_model
+
+from agents.chunked_evaluation import WINDOW_KPI_SYSTEM_PROMPT, WindowScoringFormat, reduce_window_findings, reference_points, split_windows
+from agents.keyword_corrector import get_keyword_corrector, load_keywords
+from agents.kpi_rubrics import KPI_MODEL, RubricRegistry, load_rubric_registry
+from agents.llm_cache import LLMCache
+from agents.rate_limiter import TokenBucketRateLimiter
+from agents.tokens import count_tokens
+from pipeline.telemetry import TELEMETRY
+
+CORRECTION_MODEL = "gpt-3.5-turbo"
+# Product names the corrections have to spell right, one per line. Resolved from the repository, not the working directory.
+DEFAULT_KEYWORDS_PATH = os.environ.get(
+    "TELELYZER_KEYWORDS",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "keywords.txt")
+)
+
+# llm: every segment goes to CORRECTION_MODEL, local: keyword corrector only, hybrid: the LLM only sees low-confidence segments
+CORRECTION_MODES = ("llm", "local", "hybrid")
+
+# Appended to the correction prompt when several segments are packed into one request.
+SEGMENT_MARKER_INSTRUCTIONS = """
+The text contains several transcribed segments, each one starting with a marker such as [[0]], [[1]], ... Correct every segment separately and return all of them in the same order, each one starting with its original marker. Do not merge, drop or add segments.
+"""
+
+# Shared system prompt of the KPI agents. It is byte-identical for every KPI and call: the transcript follows it, and the rubric of the KPI (RubricRegistry.prompt_suffixes) comes last, so the provider can cache the prefix.
+KPI_SYSTEM_PROMPT = """You are a professional Customer Support Script Adherence Checker working for Choice Finx. You will be provided with a transcript of a call between the customer support agent and the customer, followed by the KPI to check and its reference script. Your job is to:
+
+1. Carefully read through the entire transcript and evaluate if the agent has mentioned what the KPI asks for, as outlined in the reference script.
+2. For each point in the reference script, determine:
+- If the point was **fully covered**, **partially covered**, or **missed entirely**.
+- If partially covered or missed, provide **exactly what the agent said** and explain how it differs from the expected script.
+- Provide a suggested response that the agent should use next time to fully cover the point.
+
+3. At the end, return the following:
+- A **boolean value (True/False)** indicating whether all points were fully covered.
+- A list of all points that were partially covered or missed, along with the agent’s errors and suggested corrections.
+
+Your output should strictly follow this format:
+
+1. Boolean Result: [True/False]
+2. Missed or Partially Covered Points:
+- Point [Number]: [Summary of the error]
+- What the agent said: [Agent’s words]
+- Suggested correction: [What the agent should have said]
+
+If all points are fully covered, return:
+1. Boolean Result: True
+2. Message: "The agent has covered all points as per the script."
+"""
+
+# System prompt of the fused mode, which checks the reference scripts of every KPI in a single request.
+FUSED_KPI_SYSTEM_PROMPT = """You are a professional Customer Support Script Adherence Checker working for Choice Finx. You will be provided with a transcript of a call between the customer support agent and the customer. Below are several reference scripts, each one under its KPI name. Your job is to do the following for **each KPI separately**:
+
+1. Carefully read through the entire transcript and evaluate if the agent has mentioned what is outlined in the reference script of that KPI.
+2. For each point in the reference script, determine:
+- If the point was **fully covered**, **partially covered**, or **missed entirely**.
+- If partially covered or missed, provide **exactly what the agent said** and explain how it differs from the expected script.
+- Provide a suggested response that the agent should use next time to fully cover the point.
+
+3. Return one result per KPI name with:
+- score: a **boolean value (True/False)** indicating whether all points of that KPI were fully covered.
+- feedback: the points that were partially covered or missed, along with the agent’s errors and suggested corrections, following the format below.
+
+Feedback format:
+
+- Point [Number]: [Summary of the error]
+- What the agent said: [Agent’s words]
+- Suggested correction: [What the agent should have said]
+
+If all points of a KPI are fully covered, its feedback should be: "The agent has covered all points as per the script."
+
+{reference_scripts}
+"""
+
+# KPI name -> (subject the agent has to mention, reference script) of the default rubrics in agents/kpi_rubrics.json
+KPI_REFERENCE_SCRIPTS = {rubric.name: (rubric.subject, rubric.script) for rubric in load_rubric_registry()}
 
 class ScoringFormat(BaseModel):
     """This class defines the structured output format for KPIs"""
     score: bool
     feedback: str
+
+@lru_cache(maxsize=None)
+def fused_scoring_format(kpi_names: Tuple[str, ...]):
+    """
+    This function returns the structured output format of a fused request, one ScoringFormat per KPI name.
+
+    Parameters:
+        - kpi_names (Tuple[str, ...]) -> KPI names of the request
+
+    Returns:
+        - scoring_format (BaseModel) -> Structured output model of the request
+    """
+    return create_model("FusedScoringFormat", **{kpi_name: (ScoringFormat, ...) for kpi_name in kpi_names})
+
+
+# agent: one request per KPI, window: one request per (KPI, window) reduced per KPI, fused: one request for every KPI, prescreen: failed locally without a request
+KPI_EVALUATION_MODES = ("agent", "window", "fused", "prescreen")
+
+
+def text_hash(text: str) -> str:
+    """
+    This function returns a short, stable hash of a text, used to version rubrics, prompts and transcripts.
+
+    Parameters:
+        - text (str) -> Any text
+
+    Returns:
+        - hash (str) -> First 16 hex characters of the SHA-256 of the text
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def kpi_stamp(
+    rubrics: RubricRegistry,
+    kpi_name: str,
+    transcript: str,
+    mode: str = "agent",
+    max_window_tokens: Optional[int] = None,
+    prescreen=None
+) -> Dict[str, str]:
+    """
+    This function returns the versions a KPI result depends on. A stored result whose stamp differs from the current one is stale.
+
+    Parameters:
+        - rubrics (RubricRegistry) -> Rubric registry the KPI is evaluated with
+        - kpi_name (str) -> Name of the KPI
+        - transcript (str) -> Corrected transcript the KPI is evaluated on
+        - mode (str) -> One of KPI_EVALUATION_MODES, how the result was produced
+        - max_window_tokens (int | None) -> Token budget of a window in the window mode
+        - prescreen (KPIPrescreen | None) -> Pre-screen that synthesized the result in the prescreen mode
+
+    Returns:
+        - stamp (Dict[str, str]) -> The mode, and hashes of the rubric, of the model with the system prompt of that mode (the pre-screen index in the prescreen mode), and of the transcript
+    """
+    if mode == "prescreen":
+        model_version = prescreen.version if prescreen is not None else ""
+    elif mode == "fused":
+        model_version = KPI_MODEL + "\n" + FUSED_KPI_SYSTEM_PROMPT
+    elif mode == "window":
+        model_version = rubrics[kpi_name].model + "\n" + WINDOW_KPI_SYSTEM_PROMPT + f"\n{max_window_tokens}"
+    else:
+        model_version = rubrics[kpi_name].model + "\n" + KPI_SYSTEM_PROMPT
+
+    return {
+        "mode": mode,
+        "rubric": rubrics.versions[kpi_name],
+        "model": text_hash(model_version),
+        "transcript": text_hash(transcript or ""),
+    }
+
+
+# Structured output format of the fused mode with the default rubrics.
+FusedScoringFormat = fused_scoring_format(tuple(KPI_REFERENCE_SCRIPTS))
     
 class TranscriptAgents:
     """This class consists of all the agents that take care of the transcripts."""
 
-    def __init__(self, raw_transcripts: List, cleaned_transcripts: str) -> None:
+    def __init__(
+        self, 
+        raw_transcripts: List, 
+        cleaned_transcripts: str, 
+        client=None, 
+        cache: Optional[LLMCache] = None, 
+        prescreen=None, 
+        rubrics: Optional[RubricRegistry] = None,
+        keywords: Optional[List[str]] = None
+    ) -> None:
         """
         This function initializes the Transcripts Agents Class
 
         Parameters:
             - raw_transcripts (List) -> Raw transcripts in Lists
             - cleaned_transcripts (str) -> Cleaned Transcripts. 
+            - client (OpenAI) -> OpenAI compatible client. A default OpenAI() client is created on first use if not provided.
+            - cache (LLMCache | None) -> On-disk cache of the LLM completions, every request goes to the client if not provided.
+            - prescreen (KPIPrescreen | None) -> Local pre-screen that fails the KPIs a transcript cannot pass without a request, every KPI is sent to the LLM if not provided.
+            - rubrics (RubricRegistry | None) -> KPIs to evaluate, the default rubrics of agents/kpi_rubrics.json if not provided.
+            - keywords (List[str] | None) -> Product names the corrections have to spell right, read from data/keywords.txt ($TELELYZER_KEYWORDS) when the transcript is first corrected if not provided.
         """
+        self._client = client
+        self.cache = cache
+        self.prescreen = prescreen
+        self.rubrics = rubrics if rubrics is not None else load_rubric_registry()
         self.raw_transcripts = raw_transcripts
         self.cleaned_transcripts = cleaned_transcripts
-        self.keywords = ', '.join(open("../data/keywords.txt", "r").readlines())
-
-    def transcript_correction_agent(self, raw_transcripts: List) -> str:
+        # Mode every KPI result was produced with, and the options of the last evaluation, stamped next to the results
+        self.kpi_modes: Dict[str, str] = {}
+        self.kpi_options = {"fused": False, "max_window_tokens": None, "prescreen_threshold": prescreen.recall_threshold if prescreen is not None else None}
+        self._keywords = list(keywords) if keywords is not None else None
+
+    @property
+    def kpi_names(self) -> List[str]:
+        """This property returns the names of the KPIs to evaluate. The result of a KPI is stored in the attribute of the same name."""
+        return self.rubrics.names
+
+    @property
+    def keywords(self) -> List[str]:
+        """This property returns the product names of the corrections, reading the keywords file the first time they are needed if none were provided."""
+        if self._keywords is None:
+            self._keywords = load_keywords(DEFAULT_KEYWORDS_PATH)
+
+        return self._keywords
+
+    @property
+    def client(self):
+        """This property returns the OpenAI compatible client, creating a default OpenAI() client the first time it is needed."""
+        if self._client is None:
+            from openai import OpenAI
+            self._client = OpenAI()
+
+        return self._client
+
+    def _complete(
+        self,
+        model: str,
+        temperature: float,
+        messages: List[Dict],
+        response_format=None,
+        stage: str = "llm",
+        rate_limiter: Optional[TokenBucketRateLimiter] = None,
+        estimated_tokens: int = 0
+    ) -> str:
         """
-        This function corrects the raw_transcripts provided using keywords. 
+        This is a helper function that sends a chat completion request through the cache and returns the content of the completion.
 
         Parameters:
-            - raw_transcripts (List) -> Raw transcripts
+            - model (str) -> Model name
+            - temperature (float) -> Sampling temperature
+            - messages (List[Dict]) -> Chat messages of the request
+            - response_format (BaseModel | None) -> Structured output model of the request
+            - stage (str) -> Stage the request is recorded under in the telemetry, e.g. correction or kpi
+            - rate_limiter (TokenBucketRateLimiter | None) -> Rate limiter to acquire capacity from, only on a cache miss
+            - estimated_tokens (int) -> Tokens to acquire from the rate limiter for the request and its completion
 
         Returns:
-            - corrected_transcripts (str) -> Concatenated corrected transcripts
+            - content (str) -> Content of the completion message
         """
+        if self.cache is not None:
+            cache_key = LLMCache.make_key(model, temperature, messages, response_format)
+            cached_content = self.cache.get(cache_key)
+            if cached_content is not None:
+                TELEMETRY.record_cache_hit(stage, model)
+                return cached_content
 
-        system_prompt = f"""You are a helpful assistant for the company Choice Finx. Your task is to correct any spelling discrepancies in the transcribed text. Make sure that the names of the following products are spelled correctly: Choice Finx, Choice Broking, {self.keywords}. Only add necessary punctuation such as periods, commas, and capitalization, and use only the context provided.
-        """
-        corrected_transcripts = []
-
-        for transcript in self.transcript:
-            completion = self.client.beta.chat.completions.parse(
-                model="gpt-3.5-turbo",
-                temperature=0,
-                messages=[
-                    {"role": "developer", "content": system_prompt},
-                    {
-                        "role": "user",
-                        "content": transcript
-                    }
-                ]
-            )
-            translated_transcript = completion.choices[0].message.content
-            corrected_transcripts.append(translated_transcript)
-        
-        self.corrected_transcripts = corrected_transcripts
-        self.cleaned_corrected_transcripts = ' '.join([t for t in corrected_transcripts])
+        request = {"model": model, "temperature": temperature, "messages": messages}
+        if response_format is not None:
+            request["response_format"] = response_format
 
-        return self.cleaned_corrected_transcripts
-    
-    def benefits_agent(self) -> ScoringFormat:
-        """
-        This agent checks if the customer support agent has covered the benefits of the choice App. This is the first part of the script that the agent has to follow. 
-        """
+        if rate_limiter is not None:
+            TELEMETRY.record_queue_wait("rate_limiter", rate_limiter.acquire(estimated_tokens))
 
-        system_prompt = f"""
-        You are a professional Customer Support Script Adherence Checker working for Choice Finx. You will be provided with a transcript of a call between the customer support agent and the customer. Your job is to:
+        with TELEMETRY.stage(stage, model=model):
+            completion = self.client.beta.chat.completions.parse(**request)
+        TELEMETRY.record_usage(stage, model, getattr(completion, "usage", None))
+        content = completion.choices[0].message.content
 
-        1. Carefully read through the entire transcript and evaluate if the agent has mentioned **all the benefits** of the Choice Finx app as outlined in the reference script.
-        2. For each point in the reference script, determine:
-        - If the point was **fully covered**, **partially covered**, or **missed entirely**.
-        - If partially covered or missed, provide **exactly what the agent said** and explain how it differs from the expected script.
-        - Provide a suggested response that the agent should use next time to fully cover the point.
+        if self.cache is not None and content is not None:
+            self.cache.set(cache_key, content)
 
-        3. At the end, return the following:
-        - A **boolean value (True/False)** indicating whether all points were fully covered.
-        - A list of all points that were partially covered or missed, along with the agent’s errors and suggested corrections.
+        return content
 
-        --- Reference Script ---
-        1. All-in-one App: Trade and invest in all segments (like equity, commodity, currency) and invest in insurance, MF, Basket.  
-        2. Recommended calls from Mr. Sumit Bagadia (research head) with call accuracy in the recommendation option.                                                               
-        3. Chat with experts through the app (recommendation chat option available on the right side of recommendations).                                                   
-        4. Brokerage transparency: Clients can see brokerage and other charges at the time of placing an order.                                                      
-        5. Advanced Buy/Sell orders through GTC, GTD, and Bracket Orders.                                                                                                           
-        6. Clients can contact support and back office directly through the app.                                                                                                       
-        7. Clients can add funds through UPI (not chargeable) and Net Banking (chargeable). Guide clients to add funds through UPI.             
-        8. Fund addition pitching to clients is important.
+    def _fused_system_prompt(self, kpi_names: Optional[List[str]] = None) -> str:
+        """
+        This is a helper function that builds the system prompt of the fused mode with the reference scripts of every KPI.
 
-        Your output should strictly follow this format:
+        Parameters:
+            - kpi_names (List[str] | None) -> KPIs to check, every KPI if not provided
 
-        1. Boolean Result: [True/False]
-        2. Missed or Partially Covered Points:
-        - Point [Number]: [Summary of the error]
-        - What the agent said: [Agent’s words]
-        - Suggested correction: [What the agent should have said]
+        Returns:
+            - system_prompt (str) -> System prompt of the fused agent
+        """
+        reference_scripts = '\n\n'.join([
+            f"--- Reference Script: {rubric.name} ---\n{rubric.script}"
+            for rubric in self.rubrics
+            if kpi_names is None or rubric.name in kpi_names
+        ])
 
-        If all points are fully covered, return:
-        1. Boolean Result: True
-        2. Message: "The agent has covered all points as per the script."
+        return FUSED_KPI_SYSTEM_PROMPT.format(reference_scripts=reference_scripts)
 
+    def _kpi_request(self, kpi_name: str) -> Dict:
         """
+        This is a helper function that builds the chat completion request of a single KPI agent.
+
+        The messages are the shared system prompt, the transcript and then the rubric of the KPI, so the requests of every KPI of a call share the same prefix.
 
+        Parameters:
+            - kpi_name (str) -> Name of the KPI in the rubric registry
 
-        completion = self.client.beta.chat.completions.parse(
-            model="gpt-4o",
-            temperature=0,
-            messages=[
-                {"role": "developer", "content": system_prompt.strip()},
+        Returns:
+            - request (Dict) -> model, temperature, messages and response_format of the request
+        """
+        return {
+            "model": self.rubrics[kpi_name].model,
+            "temperature": 0,
+            "messages": [
+                {"role": "developer", "content": KPI_SYSTEM_PROMPT.strip()},
                 {
                     "role": "user",
                     "content": self.cleaned_corrected_transcripts
-                }
-            ], 
-            response_format=ScoringFormat
-        )
+                },
+                {"role": "developer", "content": self.rubrics.prompt_suffixes[kpi_name]}
+            ],
+            "response_format": ScoringFormat
+        }
 
-        result = completion.choices[0].message.content 
-        self.benefits = json.loads(result)
+    def _window_request(self, kpi_name: str, window: str) -> Dict:
+        """
+        This is a helper function that builds the chat completion request of a KPI agent on one window of a long transcript.
 
-        return self.benefits
-    
-    def brokerage_amc_charges_agent(self) -> ScoringFormat:
+        Parameters:
+            - kpi_name (str) -> Name of the KPI in the rubric registry
+            - window (str) -> Text of the window
+
+        Returns:
+            - request (Dict) -> model, temperature, messages and response_format of the request
         """
-        This function checks if the customer support agent has talked about the brokerage and AMC charges to the customers.
+        return {
+            "model": self.rubrics[kpi_name].model,
+            "temperature": 0,
+            "messages": [
+                {"role": "developer", "content": WINDOW_KPI_SYSTEM_PROMPT.strip()},
+                {
+                    "role": "user",
+                    "content": window
+                },
+                {"role": "developer", "content": self.rubrics.prompt_suffixes[kpi_name]}
+            ],
+            "response_format": WindowScoringFormat
+        }
+
+    def _evaluate_window(self, kpi_name: str, window: str) -> Dict:
         """
+        This is a helper function that runs a KPI agent on one window.
 
-        system_prompt = f"""
-        You are a professional Customer Support Script Adherence Checker working for Choice Finx. You will be provided with a transcript of a call between the customer support agent and the customer. Your job is to:
+        Parameters:
+            - kpi_name (str) -> Name of the KPI
+            - window (str) -> Text of the window
 
-        1. Carefully read through the entire transcript and evaluate if the agent has mentioned about the **brokerage and AMC charges on the platform** of the Choice Finx app as outlined in the reference script.
-        2. For each point in the reference script, determine:
-        - If the point was **fully covered**, **partially covered**, or **missed entirely**.
-        - If partially covered or missed, provide **exactly what the agent said** and explain how it differs from the expected script.
-        - Provide a suggested response that the agent should use next time to fully cover the point.
+        Returns:
+            - result (Dict) -> WindowScoringFormat result of the window
+        """
+        return json.loads(self._complete(**self._window_request(kpi_name, window), stage="kpi_window"))
 
-        3. At the end, return the following:
-        - A **boolean value (True/False)** indicating whether all points were fully covered.
-        - A list of all points that were partially covered or missed, along with the agent’s errors and suggested corrections.
+    def transcript_windows(self, max_window_tokens: int) -> List[str]:
+        """
+        This function splits the corrected transcript on segment boundaries into windows of at most max_window_tokens tokens.
 
-        --- Reference Script ---
-        1. AMC is free for 1st year & from 2nd year is (200+18%gst=Rs. 236).                                                                                                       
-        2. DP transaction charges Rs 10 + gst.
-        3. We have customised brokerage plan in our company. Brokerage are as follow: Delivery - 0.20% (20 paisa) Intraday - 0.02%(2 paisa), Future -0.02%(2 paisa), Option - Rs 25 per lot.                                                                                                                                                                     
+        Parameters:
+            - max_window_tokens (int) -> Token budget of a window, counted locally
 
-        Your output should strictly follow this format:
+        Returns:
+            - windows (List[str]) -> Text of every window, a single window if the transcript fits
+        """
+        segments = getattr(self, "corrected_transcripts", None) or self.raw_transcripts
 
-        1. Boolean Result: [True/False]
-        2. Missed or Partially Covered Points:
-        - Point [Number]: [Summary of the error]
-        - What the agent said: [Agent’s words]
-        - Suggested correction: [What the agent should have said]
+        return split_windows(segments, max_window_tokens)
 
-        If all points are fully covered, return:
-        1. Boolean Result: True
-        2. Message: "The agent has covered all points as per the script."
+    def _fused_request(self, kpi_names: Optional[List[str]] = None) -> Dict:
         """
+        This is a helper function that builds the chat completion request of the fused mode.
 
-        completion = self.client.beta.chat.completions.parse(
-            model="gpt-4o",
-            temperature=0,
-            messages=[
-                {"role": "developer", "content": system_prompt.strip()},
-                {
-                    "role": "user",
-                    "content": self.cleaned_corrected_transcripts
-                }
-            ], 
-            response_format=ScoringFormat
-        )
-
-        result = completion.choices[0].message.content 
-        self.brokerage_amc_charges = json.loads(result)
+        Parameters:
+            - kpi_names (List[str] | None) -> KPIs to check, every KPI if not provided
 
-        return self.brokerage_amc_charges
-    
-    def usps_of_choice_agent(self) -> ScoringFormat:
-        """
-        This function checks if the customer support agent has covered all the USPs of Choice. 
-        """
-
-        system_prompt = f"""
-        You are a professional Customer Support Script Adherence Checker working for Choice Finx. You will be provided with a transcript of a call between the customer support agent and the customer. Your job is to:
-
-        1. Carefully read through the entire transcript and evaluate if the agent has mentioned about the **USPs of Choice** of the Choice Finx app as outlined in the reference script.
-        2. For each point in the reference script, determine:
-        - If the point was **fully covered**, **partially covered**, or **missed entirely**.
-        - If partially covered or missed, provide **exactly what the agent said** and explain how it differs from the expected script.
-        - Provide a suggested response that the agent should use next time to fully cover the point.
-
-        3. At the end, return the following:
-        - A **boolean value (True/False)** indicating whether all points were fully covered.
-        - A list of all points that were partially covered or missed, along with the agent’s errors and suggested corrections.
-
-        --- Reference Script ---
-        1.We provide you daily Research calls & market News update/ notification in app
-        2.We have Same day pay-out facility, No charges for Auto square off  & No charges for call & trade facility.
-        3. Sumeet sir live session Monday & Thursday 11.30 am on YouTube channel. subscribe the channel. Live session notification will get in choice finx app
-        4.Client can see Real-Time Research Advisory from 9.15 am to 3.15pm in app.                                                                                            
-        5. MARGIN TRADING FUNDING (MTF)                                                                                                                                                       
-        5.1. MTF facility available in Cash segment only .Leverage upto 4x (depend upon shares).                                                                           
-        5.2. MTF can be hold upto 90 days (after 90 days MTF stocks will be squared off by the broker).
-        5.3. Interest charge will be 0.58% (per day will be charged on the funded amount till you hold the stocks) for example: on 1 lakh funding through MTF then interest will (1lakh * 0.058%)= 58rs/ perday.                                                                                                   
-        5.4.Pledge/unpledge will cost Rs.10+GST/stock                                                                                                                                                  
-        5.5. To use the MTF facility  client have to activate the DDPI(POA) & MTF through app it self.                                                 "
-
-        Your output should strictly follow this format:
-
-        1. Boolean Result: [True/False]
-        2. Missed or Partially Covered Points:
-        - Point [Number]: [Summary of the error]
-        - What the agent said: [Agent’s words]
-        - Suggested correction: [What the agent should have said]
-
-        If all points are fully covered, return:
-        1. Boolean Result: True
-        2. Message: "The agent has covered all points as per the script."
-        """
-
-        completion = self.client.beta.chat.completions.parse(
-            model="gpt-4o",
-            temperature=0,
-            messages=[
-                {"role": "developer", "content": system_prompt.strip()},
+        Returns:
+            - request (Dict) -> model, temperature, messages and response_format of the request
+        """
+        return {
+            "model": KPI_MODEL,
+            "temperature": 0,
+            "messages": [
+                {"role": "developer", "content": self._fused_system_prompt(kpi_names).strip()},
                 {
                     "role": "user",
                     "content": self.cleaned_corrected_transcripts
                 }
-            ], 
-            response_format=ScoringFormat
-        )
+            ],
+            "response_format": fused_scoring_format(tuple(self.kpi_names if kpi_names is None else kpi_names))
+        }
 
-        result = completion.choices[0].message.content 
-        self.usps_of_choice = json.loads(result)
+    def _screen_kpis(self, kpi_names: Optional[List[str]] = None) -> Dict[str, Dict]:
+        """
+        This is a helper function that runs the local pre-screen and stores the synthesized results of the KPIs it fails.
 
-        return self.usps_of_choice
+        Parameters:
+            - kpi_names (List[str] | None) -> KPIs to screen, every KPI if not provided
 
-    def basket_agent(self) -> ScoringFormat:
+        Returns:
+            - screened_out (Dict[str, Dict]) -> KPI name to the synthesized result, empty without a pre-screen
         """
-        This function checks if the customer support agent has talked about the baskets
+        if self.prescreen is None:
+            return {}
+
+        screened_out = self.prescreen.screen(self.cleaned_corrected_transcripts, list(kpi_names or self.kpi_names))
+        for kpi_name, result in screened_out.items():
+            setattr(self, kpi_name, result)
+            self.kpi_modes[kpi_name] = "prescreen"
+
+        return screened_out
+
+    def fused_kpi_agent(self, kpi_names: Optional[List[str]] = None) -> Dict:
         """
+        This agent checks all the KPIs in a single structured output request instead of one request per KPI, so the transcript is only sent once. 
 
-        system_prompt = f"""
-        You are a professional Customer Support Script Adherence Checker working for Choice Finx. You will be provided with a transcript of a call between the customer support agent and the customer. Your job is to:
+        The results are also stored in the same attributes as the individual KPI agents (self.benefits, self.algo, ...). KPIs failed by the pre-screen are left out of the request, which is skipped if none remain.
 
-        1. Carefully read through the entire transcript and evaluate if the agent has mentioned about the **Baskets** of the Choice Finx app as outlined in the reference script.
-        2. For each point in the reference script, determine:
-        - If the point was **fully covered**, **partially covered**, or **missed entirely**.
-        - If partially covered or missed, provide **exactly what the agent said** and explain how it differs from the expected script.
-        - Provide a suggested response that the agent should use next time to fully cover the point.
+        Parameters:
+            - kpi_names (List[str] | None) -> KPIs to check, only their reference scripts are in the request. Every KPI if not provided
 
-        3. At the end, return the following:
-        - A **boolean value (True/False)** indicating whether all points were fully covered.
-        - A list of all points that were partially covered or missed, along with the agent’s errors and suggested corrections.
+        Returns:
+            - results (Dict) -> KPI name to its ScoringFormat result
+        """
+        requested_names = list(kpi_names or self.kpi_names)
+        screened_out = self._screen_kpis(requested_names)
+        kpi_names = [kpi_name for kpi_name in requested_names if kpi_name not in screened_out]
 
-        --- Reference Script ---
-        1. Basket offer diversified portfolio for long-term investment. Client can invest in various stocks through 1 basket.
-        2. No lock in period (any time withdraw).               
-        3. No maintenance charges .(only brokerage charge).                                                         
-        4. Minimum investment starting Rs. 8k
+        result = {}
+        if kpi_names:
+            result = json.loads(self._complete(**self._fused_request(None if kpi_names == self.kpi_names else kpi_names), stage="kpi_fused"))
+            for kpi_name in kpi_names:
+                setattr(self, kpi_name, result[kpi_name])
+                self.kpi_modes[kpi_name] = "fused"
 
-        Your output should strictly follow this format:
+        result.update(screened_out)
+        self.fused_results = {kpi_name: result[kpi_name] for kpi_name in requested_names}
 
-        1. Boolean Result: [True/False]
-        2. Missed or Partially Covered Points:
-        - Point [Number]: [Summary of the error]
-        - What the agent said: [Agent’s words]
-        - Suggested correction: [What the agent should have said]
+        return self.fused_results
 
-        If all points are fully covered, return:
-        1. Boolean Result: True
-        2. Message: "The agent has covered all points as per the script."
+    def fused_token_savings(self, model: str = "gpt-4o") -> Dict:
         """
+        This function estimates the input tokens saved by the fused mode compared with running every KPI agent separately. 
 
-        completion = self.client.beta.chat.completions.parse(
-            model="gpt-4o",
-            temperature=0,
-            messages=[
-                {"role": "developer", "content": system_prompt.strip()},
-                {
-                    "role": "user",
-                    "content": self.cleaned_corrected_transcripts
-                }
-            ], 
-            response_format=ScoringFormat
-        )
+        Tokens are counted locally, so this can be used to pick a mode per deployment before making any request.
 
-        result = completion.choices[0].message.content 
-        self.baskets = json.loads(result)
+        Parameters:
+            - model (str) -> Model whose tokenizer should be used
 
-        return self.baskets
-    
-    def algo_agent(self) -> ScoringFormat:
+        Returns:
+            - savings (Dict) -> Input tokens of both modes, tokens saved and the saved fraction
         """
-        This function checks if the customer support agent has talked about the algo feature to the customer. 
+        transcript_tokens = count_tokens(self.cleaned_corrected_transcripts, model)
+
+        per_agent_tokens = sum([
+            count_tokens(KPI_SYSTEM_PROMPT.strip(), model) + count_tokens(self.rubrics.prompt_suffixes[kpi_name], model) + transcript_tokens
+            for kpi_name in self.kpi_names
+        ])
+        fused_tokens = count_tokens(self._fused_system_prompt().strip(), model) + transcript_tokens
+
+        return {
+            "per_agent_input_tokens": per_agent_tokens,
+            "fused_input_tokens": fused_tokens,
+            "saved_tokens": per_agent_tokens - fused_tokens,
+            "saved_ratio": round((per_agent_tokens - fused_tokens) / per_agent_tokens, 4) if per_agent_tokens else 0.0,
+        }
+
+    def kpi_stamps(self, kpi_names: Optional[List[str]] = None) -> Dict[str, Dict[str, str]]:
         """
+        This function returns the stamps of the KPI results of this transcript, to be stored next to them for incremental re-scoring.
 
-        system_prompt = f"""
-        You are a professional Customer Support Script Adherence Checker working for Choice Finx. You will be provided with a transcript of a call between the customer support agent and the customer. Your job is to:
+        Parameters:
+            - kpi_names (List[str] | None) -> KPIs to stamp, every KPI if not provided
 
-        1. Carefully read through the entire transcript and evaluate if the agent has mentioned about the **Algo** of the Choice Finx app as outlined in the reference script.
-        2. For each point in the reference script, determine:
-        - If the point was **fully covered**, **partially covered**, or **missed entirely**.
-        - If partially covered or missed, provide **exactly what the agent said** and explain how it differs from the expected script.
-        - Provide a suggested response that the agent should use next time to fully cover the point.
+        Returns:
+            - stamps (Dict[str, Dict[str, str]]) -> KPI name to its evaluation mode and the hashes of its rubric, prompt and transcript
+        """
+        return {
+            kpi_name: kpi_stamp(
+                self.rubrics,
+                kpi_name,
+                self.cleaned_corrected_transcripts,
+                self.kpi_modes.get(kpi_name, "agent"),
+                self.kpi_options["max_window_tokens"],
+                self.prescreen
+            )
+            for kpi_name in (kpi_names or self.kpi_names)
+        }
 
-        3. At the end, return the following:
-        - A **boolean value (True/False)** indicating whether all points were fully covered.
-        - A list of all points that were partially covered or missed, along with the agent’s errors and suggested corrections.
+    async def evaluate_all_async(self, max_concurrency: int = 8, max_window_tokens: Optional[int] = None, kpi_names: Optional[List[str]] = None) -> Dict:
+        """
+        This function runs all the KPI agents concurrently instead of one after another. 
 
-        --- Reference Script ---
-        Algo trading is automatic strategy based trading were client can work on system based  strategy of can create own strategy.
-        1. Client can trade in Cash / Intraday / FNO.
-        2. Emotions free trading                                                                                      
-        3. In case client is busy and do not have the time to track the market, then algo  will trade on behalf of client as per the strategy.  4 Client can also analyse & understand  the strategy with the help of demo facility.
+        Every agent is a blocking call on the same cleaned_corrected_transcripts, so each one is sent to a worker thread pool of max_concurrency threads, which bounds the number of requests in flight. KPIs failed by the pre-screen get their synthesized result without a request.
 
-        Your output should strictly follow this format:
+        If the transcript is longer than max_window_tokens, it is split into windows and every (KPI, window) pair is evaluated concurrently (map), then the findings of the windows are reduced into one result per KPI, where a point is covered if any window covered it (reduce).
 
-        1. Boolean Result: [True/False]
-        2. Missed or Partially Covered Points:
-        - Point [Number]: [Summary of the error]
-        - What the agent said: [Agent’s words]
-        - Suggested correction: [What the agent should have said]
+        Parameters:
+            - max_concurrency (int) -> Maximum number of KPI requests in flight at once
+            - max_window_tokens (int | None) -> Token budget of a window, the whole transcript is sent in one request if not provided
+            - kpi_names (List[str] | None) -> KPIs to evaluate, every KPI if not provided
 
-        If all points are fully covered, return:
-        1. Boolean Result: True
-        2. Message: "The agent has covered all points as per the script."
+        Returns:
+            - results (Dict) -> KPI name to the result returned by that KPI agent
         """
+        loop = asyncio.get_running_loop()
+        self.kpi_options = dict(self.kpi_options, fused=False, max_window_tokens=max_window_tokens)
+        requested_names = list(kpi_names or self.kpi_names)
+        screened_out = self._screen_kpis(requested_names)
+        kpi_names = [kpi_name for kpi_name in requested_names if kpi_name not in screened_out]
+        windows = self.transcript_windows(max_window_tokens) if max_window_tokens else []
+
+        with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as executor:
+            if len(windows) <= 1:
+                results = await asyncio.gather(*[
+                    loop.run_in_executor(executor, TELEMETRY.wrap(self.evaluate, queue="kpi_pool"), kpi_name)
+                    for kpi_name in kpi_names
+                ])
+            else:
+                window_results = await asyncio.gather(*[
+                    loop.run_in_executor(executor, TELEMETRY.wrap(self._evaluate_window, queue="kpi_pool"), kpi_name, window)
+                    for kpi_name in kpi_names
+                    for window in windows
+                ])
+
+                results = []
+                for kpi_index, kpi_name in enumerate(kpi_names):
+                    result = reduce_window_findings(
+                        reference_points(self.rubrics[kpi_name].script),
+                        window_results[kpi_index * len(windows):(kpi_index + 1) * len(windows)]
+                    )
+                    setattr(self, kpi_name, result)
+                    self.kpi_modes[kpi_name] = "window"
+                    results.append(result)
+
+        results = dict(zip(kpi_names, results), **screened_out)
+
+        return {kpi_name: results[kpi_name] for kpi_name in requested_names}
+
+    def evaluate_all(self, max_concurrency: int = 8, fused: bool = False, max_window_tokens: Optional[int] = None, kpi_names: Optional[List[str]] = None) -> Dict:
+        """
+        This function is the synchronous wrapper around evaluate_all_async. 
 
-        completion = self.client.beta.chat.completions.parse(
-            model="gpt-4o",
-            temperature=0,
-            messages=[
-                {"role": "developer", "content": system_prompt.strip()},
-                {
-                    "role": "user",
-                    "content": self.cleaned_corrected_transcripts
-                }
-            ], 
-            response_format=ScoringFormat
-        )
-
-        result = completion.choices[0].message.content 
-        self.algo = json.loads(result)
+        Inside a running event loop (e.g. a Jupyter notebook) the coroutine is run on a separate thread, otherwise asyncio.run is used directly.
 
-        return self.algo
+        Parameters:
+            - max_concurrency (int) -> Maximum number of KPI requests in flight at once, not used in fused mode which sends a single request
+            - fused (bool) -> Check the KPIs in a single request with fused_kpi_agent instead
+            - max_window_tokens (int | None) -> Split transcripts longer than this into windows evaluated separately (map-reduce), not used in fused mode
+            - kpi_names (List[str] | None) -> KPIs to evaluate, every KPI if not provided
 
-    def mutual_funds_agent(self) -> ScoringFormat:
-        """
-        This function checks if the customer support agent checks if the customer support agent has talked about the mutual funds to the customer.
+        Returns:
+            - results (Dict) -> KPI name to the result returned by that KPI agent
         """
+        if fused:
+            self.kpi_options = dict(self.kpi_options, fused=True, max_window_tokens=None)
+            return self.fused_kpi_agent(kpi_names)
 
-        system_prompt = f"""
-        You are a professional Customer Support Script Adherence Checker working for Choice Finx. You will be provided with a transcript of a call between the customer support agent and the customer. Your job is to:
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self.evaluate_all_async(max_concurrency, max_window_tokens, kpi_names))
 
-        1. Carefully read through the entire transcript and evaluate if the agent has mentioned about the **Mutual Funds** of the Choice Finx app as outlined in the reference script.
-        2. For each point in the reference script, determine:
-        - If the point was **fully covered**, **partially covered**, or **missed entirely**.
-        - If partially covered or missed, provide **exactly what the agent said** and explain how it differs from the expected script.
-        - Provide a suggested response that the agent should use next time to fully cover the point.
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(asyncio.run, self.evaluate_all_async(max_concurrency, max_window_tokens, kpi_names)).result()
 
-        3. At the end, return the following:
-        - A **boolean value (True/False)** indicating whether all points were fully covered.
-        - A list of all points that were partially covered or missed, along with the agent’s errors and suggested corrections.
+    def _correction_system_prompt(self) -> str:
+        """
+        This is a helper function that builds the system prompt of the transcript correction agent.
 
-        --- Reference Script ---
-        Mutual fund is long term secure investment plan. Which helps in diversifications of funds. managed by professional.   
-        1. Client can invest through sip for long term and short term. 
-        2. Minimum locking period for 3yrs in tax saving mutual funds. 
-        3. Client can start minimum sip from Rs,1000.
+        Returns:
+            - system_prompt (str) -> System prompt of the correction agent
+        """
+        return f"""You are a helpful assistant for the company Choice Finx. Your task is to correct any spelling discrepancies in the transcribed text. Make sure that the names of the following products are spelled correctly: Choice Finx, Choice Broking, {', '.join(self.keywords)}. Only add necessary punctuation such as periods, commas, and capitalization, and use only the context provided.
+        """
 
-        Your output should strictly follow this format:
+    def _pack_segments(self, raw_transcripts: List, max_batch_tokens: int) -> List[List[int]]:
+        """
+        This is a helper function that greedily packs consecutive segments into batches of at most max_batch_tokens tokens, so short segments share one request.
 
-        1. Boolean Result: [True/False]
-        2. Missed or Partially Covered Points:
-        - Point [Number]: [Summary of the error]
-        - What the agent said: [Agent’s words]
-        - Suggested correction: [What the agent should have said]
+        Parameters:
+            - raw_transcripts (List) -> Raw transcripts
+            - max_batch_tokens (int) -> Token budget of a batch, segments are not packed if it is 0 or None
 
-        If all points are fully covered, return:
-        1. Boolean Result: True
-        2. Message: "The agent has covered all points as per the script."
+        Returns:
+            - batches (List[List[int]]) -> Indexes of the segments in each batch, in segment order
         """
+        if not max_batch_tokens:
+            return [[index] for index in range(len(raw_transcripts))]
 
-        completion = self.client.beta.chat.completions.parse(
-            model="gpt-4o",
-            temperature=0,
-            messages=[
-                {"role": "developer", "content": system_prompt.strip()},
-                {
-                    "role": "user",
-                    "content": self.cleaned_corrected_transcripts
-                }
-            ], 
-            response_format=ScoringFormat
-        )
+        batches = []
+        batch_tokens = 0
+        for index, transcript in enumerate(raw_transcripts):
+            segment_tokens = count_tokens(transcript, CORRECTION_MODEL)
 
-        result = completion.choices[0].message.content 
-        self.mutual_funds = json.loads(result)
+            if batches and batch_tokens + segment_tokens <= max_batch_tokens:
+                batches[-1].append(index)
+                batch_tokens += segment_tokens
+            else:
+                batches.append([index])
+                batch_tokens = segment_tokens
 
-        return self.mutual_funds     
+        return batches
 
-    def insurance_agent(self) -> ScoringFormat:
-        """
-        This function checks if the customer support agent has talked about the insurance to the agent. 
+    def _correct_segments(self, system_prompt: str, segments: List, rate_limiter: Optional[TokenBucketRateLimiter]) -> List:
         """
+        This is a helper function that corrects one batch of segments in a single request. 
 
-        system_prompt = f"""
-        You are a professional Customer Support Script Adherence Checker working for Choice Finx. You will be provided with a transcript of a call between the customer support agent and the customer. Your job is to:
+        Packed segments are sent with numbered markers and split on those markers again. If the model does not return every marker, each segment of the batch is corrected on its own instead.
 
-        1. Carefully read through the entire transcript and evaluate if the agent has mentioned about the **Insurance** of the Choice Finx app as outlined in the reference script.
-        2. For each point in the reference script, determine:
-        - If the point was **fully covered**, **partially covered**, or **missed entirely**.
-        - If partially covered or missed, provide **exactly what the agent said** and explain how it differs from the expected script.
-        - Provide a suggested response that the agent should use next time to fully cover the point.
+        Parameters:
+            - system_prompt (str) -> System prompt of the correction agent
+            - segments (List) -> Raw transcripts of the batch
+            - rate_limiter (TokenBucketRateLimiter | None) -> Rate limiter to acquire capacity from before a request that is not cached
 
-        3. At the end, return the following:
-        - A **boolean value (True/False)** indicating whether all points were fully covered.
-        - A list of all points that were partially covered or missed, along with the agent’s errors and suggested corrections.
+        Returns:
+            - corrected_segments (List) -> Corrected transcripts of the batch, in segment order
+        """
+        request = self._correction_request(system_prompt, segments)
 
-        --- Reference Script ---
-        1.We offer Life & General insurance like (Health , motor etc). 
-        2.We offer guaranteed return plan 
-        3.Life cover + Tax  saving plan    
-        4. Own and family protection.
+        estimated_tokens = 0
+        if rate_limiter is not None:
+            # Completion is roughly as long as the transcript, so it is counted twice.
+            estimated_tokens = count_tokens(request["messages"][0]["content"], CORRECTION_MODEL) + 2 * count_tokens(request["messages"][1]["content"], CORRECTION_MODEL)
 
-        Your output should strictly follow this format:
+        corrected_segments = self._split_corrected_segments(
+            self._complete(**request, stage="correction", rate_limiter=rate_limiter, estimated_tokens=estimated_tokens), len(segments)
+        )
+        if corrected_segments is None:
+            TELEMETRY.record_retry("correction", "missing_segment_markers")
+            return [
+                self._correct_segments(system_prompt, [segment], rate_limiter)[0]
+                for segment in segments
+            ]
 
-        1. Boolean Result: [True/False]
-        2. Missed or Partially Covered Points:
-        - Point [Number]: [Summary of the error]
-        - What the agent said: [Agent’s words]
-        - Suggested correction: [What the agent should have said]
+        return corrected_segments
 
-        If all points are fully covered, return:
-        1. Boolean Result: True
-        2. Message: "The agent has covered all points as per the script."
+    def _correction_request(self, system_prompt: str, segments: List) -> Dict:
         """
+        This is a helper function that builds the chat completion request correcting one batch of segments.
 
-        completion = self.client.beta.chat.completions.parse(
-            model="gpt-4o",
-            temperature=0,
-            messages=[
-                {"role": "developer", "content": system_prompt.strip()},
+        Parameters:
+            - system_prompt (str) -> System prompt of the correction agent
+            - segments (List) -> Raw transcripts of the batch
+
+        Returns:
+            - request (Dict) -> model, temperature and messages of the request
+        """
+        if len(segments) == 1:
+            user_content = segments[0]
+            prompt = system_prompt
+        else:
+            user_content = '\n'.join([f"[[{index}]] {segment}" for index, segment in enumerate(segments)])
+            prompt = system_prompt + SEGMENT_MARKER_INSTRUCTIONS
+
+        return {
+            "model": CORRECTION_MODEL,
+            "temperature": 0,
+            "messages": [
+                {"role": "developer", "content": prompt},
                 {
                     "role": "user",
-                    "content": self.cleaned_corrected_transcripts
+                    "content": user_content
                 }
-            ], 
-            response_format=ScoringFormat
-        )
-
-        result = completion.choices[0].message.content 
-        self.insurance = json.loads(result)
+            ]
+        }
 
-        return self.insurance     
-    
-    def referral_accounts(self) -> ScoringFormat:
+    @staticmethod
+    def _split_corrected_segments(corrected_content: str, segment_count: int) -> Optional[List]:
         """
-        This function checks if the customer support agent has talked about the referral accounts to the customer. 
+        This is a helper function that splits the completion of a correction request back into its segments.
+
+        Parameters:
+            - corrected_content (str) -> Content of the completion
+            - segment_count (int) -> Number of segments in the request
+
+        Returns:
+            - corrected_segments (List | None) -> Corrected transcripts in segment order, None if a segment marker is missing
         """
+        if segment_count == 1:
+            return [corrected_content]
 
-        system_prompt = f"""
-        You are a professional Customer Support Script Adherence Checker working for Choice Finx. You will be provided with a transcript of a call between the customer support agent and the customer. Your job is to:
+        parts = re.split(r"\[\[(\d+)\]\]", corrected_content)
+        corrected_segments = {int(number): text.strip() for number, text in zip(parts[1::2], parts[2::2])}
+        if sorted(corrected_segments) != list(range(segment_count)):
+            return None
 
-        1. Carefully read through the entire transcript and evaluate if the agent has mentioned about the **Referral Accounts** of the Choice Finx app as outlined in the reference script.
-        2. For each point in the reference script, determine:
-        - If the point was **fully covered**, **partially covered**, or **missed entirely**.
-        - If partially covered or missed, provide **exactly what the agent said** and explain how it differs from the expected script.
-        - Provide a suggested response that the agent should use next time to fully cover the point.
+        return [corrected_segments[index] for index in range(segment_count)]
+
+    def _keyword_correction(self, raw_transcripts: List, mode: str = "hybrid") -> Tuple[List, List[int]]:
+        """
+        This is a helper function that corrects the keywords of every segment locally and picks the segments that still need the LLM.
 
-        3. At the end, return the following:
-        - A **boolean value (True/False)** indicating whether all points were fully covered.
-        - A list of all points that were partially covered or missed, along with the agent’s errors and suggested corrections.
+        Parameters:
+            - raw_transcripts (List) -> Raw transcripts
+            - mode (str) -> One of CORRECTION_MODES: "llm", "local" or "hybrid"
 
-        --- Reference Script ---
-        1. Ask for the referal account from the client. They will get benefit of Rs 500 in a form  of broekarge reversal.
+        Returns:
+            - corrected_transcripts (List) -> Transcripts after the local correction, the raw transcripts in llm mode
+            - llm_indexes (List[int]) -> Indexes of the segments to correct with the LLM, in segment order
+        """
+        if mode not in CORRECTION_MODES:
+            raise ValueError(f"Unknown correction mode {mode}, expected one of {CORRECTION_MODES}")
+
+        if mode == "llm":
+            return list(raw_transcripts), list(range(len(raw_transcripts)))
+
+        corrector = get_keyword_corrector(tuple(self.keywords))
+        with TELEMETRY.stage("keyword_correction", segments=len(raw_transcripts)):
+            local_results = [corrector.correct(transcript) for transcript in raw_transcripts]
+        llm_indexes = [] if mode == "local" else [index for index, result in enumerate(local_results) if result.low_confidence]
+
+        return [result.text for result in local_results], llm_indexes
+
+    def transcript_correction_agent(
+        self, 
+        raw_transcripts: List, 
+        max_concurrency: int = 8, 
+        max_batch_tokens: Optional[int] = 1000, 
+        rate_limiter: Optional[TokenBucketRateLimiter] = None,
+        mode: str = "hybrid"
+    ) -> str:
+        """
+        This function corrects the raw_transcripts provided using keywords. 
 
-        Your output should strictly follow this format:
+        The keywords are first corrected locally by the KeywordCorrector. Depending on the mode, the segments that still need the LLM are packed into batches of at most max_batch_tokens tokens and corrected concurrently, while the output keeps the segment order.
 
-        1. Boolean Result: [True/False]
-        2. Missed or Partially Covered Points:
-        - Point [Number]: [Summary of the error]
-        - What the agent said: [Agent’s words]
-        - Suggested correction: [What the agent should have said]
+        Parameters:
+            - raw_transcripts (List) -> Raw transcripts
+            - max_concurrency (int) -> Maximum number of correction requests in flight at once
+            - max_batch_tokens (int | None) -> Token budget of a packed request, None or 0 sends one request per segment
+            - rate_limiter (TokenBucketRateLimiter | None) -> Requests/min and tokens/min limiter shared by the requests
+            - mode (str) -> One of CORRECTION_MODES: "llm", "local" or "hybrid"
 
-        If all points are fully covered, return:
-        1. Boolean Result: True
-        2. Message: "The agent has covered all points as per the script."
+        Returns:
+            - corrected_transcripts (str) -> Concatenated corrected transcripts
         """
+        # 1. Local keyword correction
+        corrected_transcripts, llm_indexes = self._keyword_correction(raw_transcripts, mode)
+
+        # 2. LLM correction of the remaining segments
+        llm_segments = [corrected_transcripts[index] for index in llm_indexes]
+        system_prompt = self._correction_system_prompt()
+        batches = self._pack_segments(llm_segments, max_batch_tokens) if llm_segments else []
+
+        with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as executor:
+            futures = [
+                executor.submit(
+                    TELEMETRY.wrap(self._correct_segments, queue="correction_pool"),
+                    system_prompt, [llm_segments[index] for index in batch], rate_limiter
+                )
+                for batch in batches
+            ]
+            corrected_batches = [future.result() for future in futures]
+
+        for batch, corrected_batch in zip(batches, corrected_batches):
+            for index, corrected_segment in zip(batch, corrected_batch):
+                corrected_transcripts[llm_indexes[index]] = corrected_segment
+
+        self.correction_stats = {
+            "segments": len(raw_transcripts),
+            "llm_segments": len(llm_segments),
+            "llm_requests": len(batches),
+        }
+        
+        self.corrected_transcripts = corrected_transcripts
+        self.cleaned_corrected_transcripts = ' '.join([t for t in corrected_transcripts])
 
-        completion = self.client.beta.chat.completions.parse(
-            model="gpt-4o",
-            temperature=0,
-            messages=[
-                {"role": "developer", "content": system_prompt.strip()},
-                {
-                    "role": "user",
-                    "content": self.cleaned_corrected_transcripts
-                }
-            ], 
-            response_format=ScoringFormat
-        )
+        return self.cleaned_corrected_transcripts
+    
+    def evaluate(self, kpi_name: str) -> ScoringFormat:
+        """
+        This agent checks if the customer support agent has covered the reference script of a KPI. The result is also stored in the attribute of the same name (self.benefits, self.algo, ...).
+
+        Parameters:
+            - kpi_name (str) -> Name of the KPI in the rubric registry
+
+        Returns:
+            - result (ScoringFormat) -> score and feedback of the KPI
+        """
+        result = self._complete(**self._kpi_request(kpi_name), stage="kpi")
 
-        result = completion.choices[0].message.content 
-        self.referral = json.loads(result)
+        result = json.loads(result)
+        setattr(self, kpi_name, result)
+        self.kpi_modes[kpi_name] = "agent"
 
-        return self.referral
\ No newline at end of file
+        return result
@@ -0,0 +1,147 @@
+"""
+Benchmark of the decode-once audio path against the previous one, where every recording was decoded by librosa, silero
+read_audio and pydub, and every segment was exported to WAV, decoded again and resampled on its own.
+
+Each path runs in its own process so the peak RSS of one does not leak into the other. Whisper is replaced with a
+no-op pipe by default, so only decoding, VAD and segmenting are measured.
+
+Usage:
+    python experiments/benchmark_audio_decoding.py ../data/call_recordings --limit 20
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+from io import BytesIO
+from typing import List
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+
+def fake_pipe(waveform, generate_kwargs=None):
+    """This function stands in for the Whisper pipeline so only the audio path is measured."""
+    return {"text": ""}
+
+
+def legacy_single_file_testing(file_path: str, pipe, vad_model) -> List:
+    """
+    This function is the previous audio path: three decodes of the recording plus a WAV round trip and a resample per segment.
+
+    Parameters:
+        - file_path (str) -> Path of the recording
+        - pipe (Pipeline) -> Whisper automatic speech recognition pipeline
+        - vad_model (silero-vad) -> Voice Activity Detection model
+
+    Returns:
+        - raw_transcripts (List) -> Transcript of every segment, in order
+    """
+    import librosa
+    import numpy as np
+    from pydub import AudioSegment
+    from silero_vad import read_audio, get_speech_timestamps
+
+    from transcription.audio_processing import GENERATE_KWARGS
+    from transcription.segment_packer import pack_segments
+
+    audio = BytesIO(open(file_path, "rb").read())
+    _, sampling_rate = librosa.load(file_path, sr=None)
+
+    wav = read_audio(BytesIO(audio.getvalue()), sampling_rate=sampling_rate)
+    speech_timestamps = get_speech_timestamps(wav, vad_model, sampling_rate=sampling_rate, return_seconds=True)
+
+    audio_segments = []
+    audio = AudioSegment.from_file(audio)
+    for window in pack_segments(speech_timestamps):
+        buffer = BytesIO()
+        audio[window['start'] * 1000:window['end'] * 1000].export(buffer, format="wav")
+        buffer.seek(0)
+        audio_segments.append(buffer)
+
+    raw_transcripts = []
+    for segment in audio_segments:
+        audio_segment = AudioSegment.from_file(segment)
+        samples = np.array(audio_segment.get_array_of_samples(), dtype=np.float32)
+        samples /= np.iinfo(audio_segment.array_type).max
+        waveform = librosa.resample(samples, orig_sr=audio_segment.frame_rate, target_sr=16000)
+        raw_transcripts.append(pipe(waveform, generate_kwargs=GENERATE_KWARGS)["text"])
+
+    return raw_transcripts
+
+
+def run_path(path_name: str, file_paths: List[str], whisper: bool) -> dict:
+    """
+    This function runs one audio path over the recordings in the current process and measures it.
+
+    Parameters:
+        - path_name (str) -> legacy or decode_once
+        - file_paths (List[str]) -> Recordings to process
+        - whisper (bool) -> Use the real Whisper pipeline instead of the no-op pipe
+
+    Returns:
+        - result (dict) -> Wall time, peak RSS and number of segments
+    """
+    from silero_vad import load_silero_vad
+
+    from transcription.audio_processing import load_models, single_file_testing
+
+    if whisper:
+        pipe, vad_model = load_models()
+    else:
+        pipe, vad_model = fake_pipe, load_silero_vad()
+
+    path = legacy_single_file_testing if path_name == "legacy" else single_file_testing
+
+    start_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start_time = time.perf_counter()
+    segments = sum([len(path(file_path, pipe, vad_model)) for file_path in file_paths])
+    wall_seconds = time.perf_counter() - start_time
+
+    return {
+        "path": path_name,
+        "files": len(file_paths),
+        "segments": segments,
+        "wall_seconds": round(wall_seconds, 3),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "peak_rss_mb_before_run": round(start_rss_kb / 1024, 1),
+    }
+
+
+def main() -> None:
+    """This function runs both paths in separate processes and prints the comparison as JSON."""
+    parser = argparse.ArgumentParser(description="Compare the decode-once audio path with the previous one.")
+    parser.add_argument("input_dir", help="Folder with call recordings")
+    parser.add_argument("--limit", type=int, default=10, help="Number of recordings to use")
+    parser.add_argument("--whisper", action="store_true", help="Include Whisper inference in the measurement")
+    parser.add_argument("--child", choices=["legacy", "decode_once"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    from pipeline.batch_runner import iter_audio_files
+
+    file_paths = [file_path for _, file_path in zip(range(args.limit), iter_audio_files(args.input_dir))]
+
+    if args.child:
+        print(json.dumps(run_path(args.child, file_paths, args.whisper)))
+        return
+
+    results = []
+    for path_name in ("legacy", "decode_once"):
+        command = [sys.executable, os.path.abspath(__file__), args.input_dir, "--limit", str(args.limit), "--child", path_name]
+        if args.whisper:
+            command.append("--whisper")
+        output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    legacy, decode_once = results
+    print(json.dumps({
+        "legacy": legacy,
+        "decode_once": decode_once,
+        "speedup": round(legacy["wall_seconds"] / decode_once["wall_seconds"], 2) if decode_once["wall_seconds"] else None,
+        "peak_rss_saved_mb": round(legacy["peak_rss_mb"] - decode_once["peak_rss_mb"], 1),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Microbenchmark of the local KeywordCorrector on synthetic transcript segments with misspelled product names.
+
+Every segment is filler speech with a chance of containing a keyword, spelled the way Whisper tends to mishear it.
+The benchmark reports the correction throughput, how many injected misspellings were fixed, and how many LLM
+correction requests the hybrid mode avoids compared with sending every segment to the LLM.
+
+Usage:
+    python experiments/benchmark_keyword_corrector.py --segments 10000 --keywords data/keywords.txt
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from typing import Dict, List, Tuple
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from agents.keyword_corrector import DEFAULT_KEYWORDS, KeywordCorrector
+from agents.tokens import count_tokens
+
+FILLER_WORDS = (
+    "sir ma'am haan ji account demat trading app open kar dijiye aap ka charges zero hai please "
+    "market order stock investment return kal call back karta hoon ok thank you details share"
+).split()
+
+# Keyword spellings as they show up in raw Whisper transcripts
+MISSPELLINGS = {
+    "Choice Finx": ["choice fincs", "Choice Phinks", "choicefinx", "choice fin x", "Choice Finks"],
+    "Choice Broking": ["choice brocking", "Choice Broking", "choys broking", "choice brokin"],
+    "Sumeet Bagadia": ["Sumit Bagdia", "sumeet bagadiya", "Sumit Bagadia"],
+    "MTF": ["mtf", "MTF"],
+}
+
+# Short keywords that sound like ordinary English, checked by the regression cases
+REGRESSION_KEYWORDS = ["Algo", "Referral", "SIP", "Mutual Funds"]
+
+# Ordinary sentences the corrector must never rewrite, and misspellings it must still fix on its own
+REGRESSION_CASES = [
+    ("also go there", "also go there"),
+    ("we can refer all", "we can refer all"),
+    ("please sip some water", "please sip some water"),
+    ("mutual fun is good", "mutual fun is good"),
+    ("use the algo for trading", "use the Algo for trading"),
+    ("open choice fin x account", "open Choice Finx account"),
+    ("choice brocking demat", "Choice Broking demat"),
+    ("mtf charges", "MTF charges"),
+]
+
+
+def synthetic_segments(count: int, keyword_rate: float = 0.3, seed: int = 0) -> Tuple[List[str], int]:
+    """
+    This function generates transcript segments where some contain a misspelled keyword.
+
+    Parameters:
+        - count (int) -> Number of segments
+        - keyword_rate (float) -> Probability that a segment contains a keyword
+        - seed (int) -> Random seed
+
+    Returns:
+        - segments (List[str]) -> Synthetic segments
+        - injected (int) -> Number of keywords injected
+    """
+    generator = random.Random(seed)
+
+    segments = []
+    injected = 0
+    for _ in range(count):
+        words = [generator.choice(FILLER_WORDS) for _ in range(generator.randint(8, 40))]
+        if generator.random() < keyword_rate:
+            keyword = generator.choice(list(MISSPELLINGS))
+            words.insert(generator.randrange(len(words)), generator.choice(MISSPELLINGS[keyword]))
+            injected += 1
+        segments.append(' '.join(words))
+
+    return segments, injected
+
+
+def regression_failures(keywords: List[str]) -> List[Dict]:
+    """
+    This function runs the regression cases through a corrector with the given keywords and the regression keywords.
+
+    Parameters:
+        - keywords (List[str]) -> Keywords of the benchmarked corrector
+
+    Returns:
+        - failures (List[Dict]) -> Input, expected and corrected text of every case that is not corrected as expected
+    """
+    corrector = KeywordCorrector(keywords + REGRESSION_KEYWORDS)
+
+    failures = []
+    for text, expected in REGRESSION_CASES:
+        corrected = corrector.correct(text).text
+        if corrected != expected:
+            failures.append({"text": text, "expected": expected, "corrected": corrected})
+
+    return failures
+
+
+def packed_requests(segments: List[str], max_batch_tokens: int) -> int:
+    """This function returns the number of correction requests after packing the segments like transcript_correction_agent."""
+    requests = 0
+    batch_tokens = 0
+    for segment in segments:
+        segment_tokens = count_tokens(segment, "gpt-3.5-turbo")
+        if requests and batch_tokens + segment_tokens <= max_batch_tokens:
+            batch_tokens += segment_tokens
+        else:
+            requests += 1
+            batch_tokens = segment_tokens
+
+    return requests
+
+
+def main() -> None:
+    """This function runs the benchmark and prints the results as JSON."""
+    parser = argparse.ArgumentParser(description="Benchmark the local keyword corrector.")
+    parser.add_argument("--segments", type=int, default=10000, help="Number of synthetic segments")
+    parser.add_argument("--keywords", default=None, help="Keywords file, the misspelled keywords of the benchmark are used if not provided")
+    parser.add_argument("--max-batch-tokens", type=int, default=1000, help="Token budget of a packed LLM correction request")
+    args = parser.parse_args()
+
+    if args.keywords:
+        corrector = KeywordCorrector.from_file(args.keywords)
+    else:
+        corrector = KeywordCorrector(DEFAULT_KEYWORDS + list(MISSPELLINGS))
+    failures = regression_failures(corrector.keywords)
+
+    segments, injected = synthetic_segments(args.segments)
+
+    start_time = time.perf_counter()
+    results = [corrector.correct(segment) for segment in segments]
+    wall_seconds = time.perf_counter() - start_time
+
+    low_confidence_segments = [result.text for result in results if result.low_confidence]
+    llm_requests = packed_requests(segments, args.max_batch_tokens)
+    hybrid_requests = packed_requests(low_confidence_segments, args.max_batch_tokens)
+
+    print(json.dumps({
+        "segments": len(segments),
+        "keywords_injected": injected,
+        "replacements": sum([len(result.replacements) for result in results]),
+        "low_confidence_segments": len(low_confidence_segments),
+        "microseconds_per_segment": round(wall_seconds / len(segments) * 1e6, 1),
+        "segments_per_second": round(len(segments) / wall_seconds),
+        "llm_segments_avoided": len(segments) - len(low_confidence_segments),
+        "llm_requests": llm_requests,
+        "hybrid_llm_requests": hybrid_requests,
+        "llm_requests_avoided": llm_requests - hybrid_requests,
+        "regression_cases": len(REGRESSION_CASES),
+        "regression_failures": failures,
+    }, indent=2))
+
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
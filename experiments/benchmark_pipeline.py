@@ -0,0 +1,479 @@
+"""
+Reproducible offline benchmark of the whole pipeline: VAD splitting, transcription and KPI scoring at several scales.
+
+Nothing leaves the machine. The calls are synthetic audio: harmonic tones with a syllable-rate envelope in speech-like
+on/off regions, over a noise floor with the occasional non-speech noise burst. Whisper is replaced with a deterministic
+fake that returns Hinglish filler with misspelled keywords and lines of the reference scripts, and the OpenAI client
+of TranscriptAgents with a local fake that answers every request after an injected latency. Only silero VAD is real,
+since _split_audio is what the split stage measures.
+
+Every (stage, scale) pair runs in its own process so the peak RSS of one does not leak into the next. The results are
+written to a JSON baseline with the commit they were measured on, and --compare reports the regressions against a
+previous baseline (exit status 1 if there are any).
+
+Usage:
+    python experiments/benchmark_pipeline.py --scales 1 100 10000 --output benchmark_baseline.json
+    python experiments/benchmark_pipeline.py --stages score --compare benchmark_baseline.json
+"""
+import argparse
+import hashlib
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from agents.keyword_corrector import DEFAULT_KEYWORDS
+from experiments.benchmark_keyword_corrector import FILLER_WORDS, MISSPELLINGS
+
+STAGES = ("split", "transcribe", "score")
+
+SAMPLING_RATE = 16000
+
+# Metrics compared between baselines, and whether a higher value is better
+COMPARED_METRICS = {
+    "calls_per_second": True,
+    "p50_ms": False,
+    "p95_ms": False,
+    "peak_rss_mb": False,
+}
+
+
+def synthetic_call_audio(seconds: float, seed: int = 0, sampling_rate: int = SAMPLING_RATE) -> Tuple[np.ndarray, List[Dict]]:
+    """
+    This function generates a call recording with speech-like regions separated by pauses.
+
+    Speech is a few harmonics of a wandering pitch, amplitude modulated at syllable rate. Pauses hold a noise floor and,
+    now and then, a burst of broadband noise that VAD should not take for speech.
+
+    Parameters:
+        - seconds (float) -> Duration of the call
+        - seed (int) -> Random seed, the same seed gives the same samples
+        - sampling_rate (int) -> Sampling rate of the waveform
+
+    Returns:
+        - waveform (np.ndarray) -> Mono float32 samples in [-1, 1]
+        - speech_timestamps (List[Dict]) -> Speech regions in seconds with start and end keys, in order
+    """
+    generator = np.random.default_rng(seed)
+
+    total_samples = int(seconds * sampling_rate)
+    waveform = (generator.standard_normal(total_samples) * 0.003).astype(np.float32)
+
+    speech_timestamps = []
+    position = generator.uniform(0.2, 1.0)
+    while position < seconds:
+        # 1. A pause, sometimes with a noise burst in it
+        pause = generator.uniform(0.3, 2.5)
+        if pause > 1.0 and generator.random() < 0.3:
+            burst_start = int((position + 0.2) * sampling_rate)
+            burst = generator.standard_normal(min(int(0.3 * sampling_rate), max(0, total_samples - burst_start)))
+            waveform[burst_start:burst_start + len(burst)] += (burst * 0.05).astype(np.float32)
+        position += pause
+
+        # 2. An utterance
+        duration = min(generator.uniform(1.0, 8.0), seconds - position)
+        if duration < 0.5:
+            break
+
+        start, end = int(position * sampling_rate), int((position + duration) * sampling_rate)
+        time_axis = np.arange(end - start) / sampling_rate
+        pitch = generator.uniform(90, 250) * (1 + 0.05 * np.sin(2 * np.pi * 0.7 * time_axis))
+        phase = 2 * np.pi * np.cumsum(pitch) / sampling_rate
+        voice = sum([np.sin(harmonic * phase) / harmonic for harmonic in range(1, 6)])
+        syllables = np.sin(np.pi * generator.uniform(3.0, 5.0) * time_axis + generator.uniform(0, np.pi)) ** 2
+        waveform[start:end] += (0.25 * voice * syllables).astype(np.float32)
+
+        speech_timestamps.append({"start": round(position, 3), "end": round(position + duration, 3)})
+        position += duration
+
+    np.clip(waveform, -1.0, 1.0, out=waveform)
+
+    return waveform, speech_timestamps
+
+
+class FakeWhisperPipeline:
+    """This class stands in for the Whisper pipeline: it returns a deterministic transcript for every segment, and can sleep to simulate inference."""
+
+    def __init__(self, seconds_per_audio_second: float = 0.0, sampling_rate: int = SAMPLING_RATE) -> None:
+        """
+        This function initializes the fake pipeline.
+
+        Parameters:
+            - seconds_per_audio_second (float) -> Simulated inference time per second of audio, 0 only measures the code around Whisper
+            - sampling_rate (int) -> Sampling rate of the segments
+        """
+        from agents.kpi_rubrics import load_rubric_registry
+
+        self.seconds_per_audio_second = seconds_per_audio_second
+        self.sampling_rate = sampling_rate
+        self.script_lines = [line.strip() for rubric in load_rubric_registry() for line in rubric.script.splitlines() if len(line.split()) > 3]
+
+    def transcribe(self, segment: np.ndarray) -> str:
+        """
+        This function returns the transcript of a segment, about 2.5 words per second, seeded by the samples.
+
+        Parameters:
+            - segment (np.ndarray) -> Samples of the segment
+
+        Returns:
+            - transcript (str) -> Fake transcript
+        """
+        seed = int.from_bytes(hashlib.blake2b(segment[:4096].tobytes() + len(segment).to_bytes(8, "little"), digest_size=8).digest(), "little")
+        generator = random.Random(seed)
+
+        words = [generator.choice(FILLER_WORDS) for _ in range(max(1, int(len(segment) / self.sampling_rate * 2.5)))]
+        if generator.random() < 0.3:
+            words.insert(generator.randrange(len(words)), generator.choice(MISSPELLINGS[generator.choice(list(MISSPELLINGS))]))
+        if generator.random() < 0.4:
+            words.insert(generator.randrange(len(words)), generator.choice(self.script_lines))
+
+        return ' '.join(words)
+
+    def __call__(self, inputs, batch_size=None, generate_kwargs=None):
+        """This function mirrors the call of the Hugging Face pipeline: a segment gives a result, a list of segments a list of results."""
+        segments = inputs if isinstance(inputs, list) else [inputs]
+        if self.seconds_per_audio_second:
+            time.sleep(sum([len(segment) for segment in segments]) / self.sampling_rate * self.seconds_per_audio_second)
+
+        results = [{"text": self.transcribe(segment)} for segment in segments]
+
+        return results if isinstance(inputs, list) else results[0]
+
+
+class FakeOpenAIClient:
+    """This class stands in for the OpenAI client of TranscriptAgents: every request is answered locally after a deterministic, log-normally jittered latency."""
+
+    def __init__(self, latency: float = 0.05, jitter: float = 0.3, pass_rate: float = 0.5) -> None:
+        """
+        This function initializes the fake client.
+
+        Parameters:
+            - latency (float) -> Median latency of a request in seconds
+            - jitter (float) -> Sigma of the log-normal latency, 0 gives a constant latency
+            - pass_rate (float) -> Probability that a KPI is scored as passed
+        """
+        from agents.tokens import count_tokens
+
+        self.latency = latency
+        self.jitter = jitter
+        self.pass_rate = pass_rate
+        self.count_tokens = count_tokens
+        self.beta = types.SimpleNamespace(chat=types.SimpleNamespace(completions=types.SimpleNamespace(parse=self.parse)))
+        self.chat = self.beta.chat
+
+    def _answer(self, response_format, messages: List[Dict], generator: random.Random) -> str:
+        """
+        This is a helper function that builds a valid answer for the structured output format of a request.
+
+        Parameters:
+            - response_format (BaseModel | None) -> Structured output model, None for a correction request
+            - messages (List[Dict]) -> Chat messages of the request
+            - generator (random.Random) -> Generator seeded by the request
+
+        Returns:
+            - content (str) -> Content of the completion message
+        """
+        # Corrections echo the segments with their markers
+        if response_format is None:
+            return messages[-1]["content"] if messages[-1]["role"] == "user" else messages[1]["content"]
+
+        fields = response_format.model_fields
+        if "points" in fields:
+            return json.dumps({"points": []})
+
+        def scoring():
+            passed = generator.random() < self.pass_rate
+            return {"score": passed, "feedback": "The agent has covered all points as per the script." if passed else "- Point 1: Missed"}
+
+        if "score" in fields:
+            return json.dumps(scoring())
+
+        return json.dumps({kpi_name: scoring() for kpi_name in fields})
+
+    def parse(self, model: str, temperature: float, messages: List[Dict], response_format=None, **kwargs):
+        """This function answers a chat completion request like client.beta.chat.completions.parse."""
+        request_bytes = json.dumps([model, messages], sort_keys=True).encode("utf-8")
+        generator = random.Random(hashlib.blake2b(request_bytes, digest_size=8).digest())
+
+        time.sleep(self.latency * (generator.lognormvariate(0, self.jitter) if self.jitter else 1.0))
+
+        content = self._answer(response_format, messages, generator)
+        prompt_tokens = sum([self.count_tokens(message["content"], model) for message in messages])
+        completion_tokens = self.count_tokens(content, model)
+
+        return types.SimpleNamespace(
+            choices=[types.SimpleNamespace(message=types.SimpleNamespace(content=content))],
+            usage=types.SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, total_tokens=prompt_tokens + completion_tokens),
+        )
+
+
+def speech_segments(waveform: np.ndarray, speech_timestamps: List[Dict], sampling_rate: int = SAMPLING_RATE) -> List[np.ndarray]:
+    """
+    This function slices a synthetic call into Whisper windows from its known speech regions, like _split_audio does from the VAD regions.
+
+    Parameters:
+        - waveform (np.ndarray) -> Samples of the call
+        - speech_timestamps (List[Dict]) -> Speech regions in seconds
+        - sampling_rate (int) -> Sampling rate of the waveform
+
+    Returns:
+        - audio_segments (List[np.ndarray]) -> Segments of the call, as views of the waveform
+    """
+    from transcription.segment_packer import pack_segments
+
+    return [waveform[window['start'] * sampling_rate:window['end'] * sampling_rate] for window in pack_segments(speech_timestamps)]
+
+
+def summarize_latencies(latencies: List[float], wall_seconds: float) -> Dict:
+    """
+    This function summarizes the per-call latencies of a stage.
+
+    Parameters:
+        - latencies (List[float]) -> Latency of every call in seconds
+        - wall_seconds (float) -> Wall time of the whole stage
+
+    Returns:
+        - summary (Dict) -> Throughput and p50/p95/max latency in milliseconds
+    """
+    return {
+        "calls": len(latencies),
+        "wall_seconds": round(wall_seconds, 3),
+        "calls_per_second": round(len(latencies) / wall_seconds, 2) if wall_seconds else None,
+        "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 3),
+        "p95_ms": round(float(np.percentile(latencies, 95)) * 1000, 3),
+        "max_ms": round(max(latencies) * 1000, 3),
+    }
+
+
+def run_stage(stage: str, calls: int, args: argparse.Namespace) -> Dict:
+    """
+    This function runs one stage over a number of synthetic calls in the current process and measures it.
+
+    Parameters:
+        - stage (str) -> split, transcribe or score
+        - calls (int) -> Number of calls
+        - args (argparse.Namespace) -> Settings of the benchmark
+
+    Returns:
+        - result (Dict) -> Throughput, latencies and peak RSS of the stage
+    """
+    # 1. Generate the distinct calls up front, the calls of a larger scale cycle through them
+    audio = [synthetic_call_audio(args.call_seconds, seed=seed) for seed in range(min(calls, args.distinct_calls))]
+    audio_seconds = sum([len(audio[index % len(audio)][0]) for index in range(calls)]) / SAMPLING_RATE
+    pipe = FakeWhisperPipeline(args.asr_seconds_per_audio_second)
+
+    result = {}
+    latencies = []
+
+    # 2. Run the stage
+    if stage == "split":
+        from silero_vad import load_silero_vad
+
+        from transcription.audio_processing import _split_audio
+
+        vad_model = load_silero_vad()
+        start_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        start_time = time.perf_counter()
+        segments = 0
+        for index in range(calls):
+            call_start = time.perf_counter()
+            segments += len(_split_audio(audio[index % len(audio)][0], vad_model))
+            latencies.append(time.perf_counter() - call_start)
+        result["segments"] = segments
+
+    elif stage == "transcribe":
+        from transcription.batched_transcription import BatchedTranscriber
+
+        call_segments = [speech_segments(waveform, speech_timestamps) for waveform, speech_timestamps in audio]
+        transcriber = BatchedTranscriber(pipe, batch_size=args.asr_batch_size)
+
+        start_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        start_time = time.perf_counter()
+        for group_start in range(0, calls, args.recordings_per_batch):
+            group = range(group_start, min(calls, group_start + args.recordings_per_batch))
+            group_time = time.perf_counter()
+            for index in group:
+                transcriber.add(index, call_segments[index % len(audio)])
+            transcriber.run()
+            # Every recording of a group waits for the whole group
+            latencies.extend([time.perf_counter() - group_time] * len(group))
+        result["segments"] = sum([len(call_segments[index % len(audio)]) for index in range(calls)])
+
+    else:
+        from agents.transcript_agents import TranscriptAgents
+        from pipeline.telemetry import TELEMETRY
+
+        call_transcripts = [[pipe.transcribe(segment) for segment in speech_segments(waveform, speech_timestamps)] for waveform, speech_timestamps in audio]
+        client = FakeOpenAIClient(args.llm_latency, args.llm_jitter)
+        # The benchmark brings its own keywords, it does not depend on data/keywords.txt or the working directory
+        keywords = DEFAULT_KEYWORDS + list(MISSPELLINGS)
+
+        def score_call(index):
+            call_start = time.perf_counter()
+            raw_transcripts = call_transcripts[index % len(audio)]
+            agents = TranscriptAgents(raw_transcripts, ' '.join(raw_transcripts), client=client, keywords=keywords)
+            agents.transcript_correction_agent(raw_transcripts, mode=args.correction_mode)
+            agents.evaluate_all(fused=args.fused, max_window_tokens=args.max_window_tokens)
+            return time.perf_counter() - call_start
+
+        start_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        start_time = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.call_concurrency) as executor:
+            latencies = list(executor.map(score_call, range(calls)))
+
+        metrics = TELEMETRY.to_dict(include_traces=False)
+        result["llm_requests"] = sum([usage["requests"] for models in metrics["llm"].values() for usage in models.values()])
+        result["llm_cost_usd"] = metrics["total_cost_usd"]
+        result["stage_p95_ms"] = {name: round(histogram["p95"] * 1000, 3) for name, histogram in metrics["stage_seconds"].items()}
+
+    wall_seconds = time.perf_counter() - start_time
+
+    # 3. Summarize
+    return {
+        "stage": stage,
+        **summarize_latencies(latencies, wall_seconds),
+        "audio_seconds_per_wall_second": round(audio_seconds / wall_seconds, 2) if stage != "score" and wall_seconds else None,
+        **result,
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "peak_rss_mb_before_run": round(start_rss_kb / 1024, 1),
+    }
+
+
+def compare_baselines(baseline: Dict, current: Dict, tolerance: float) -> List[Dict]:
+    """
+    This function compares the results of two benchmark runs and returns the metrics that got worse by more than the tolerance.
+
+    Parameters:
+        - baseline (Dict) -> Previous benchmark output
+        - current (Dict) -> Current benchmark output
+        - tolerance (float) -> Relative change that is still considered noise, e.g. 0.1 for 10%
+
+    Returns:
+        - regressions (List[Dict]) -> stage, calls, metric, baseline and current value and relative change of every regression
+    """
+    regressions = []
+    for stage, scales in current["results"].items():
+        for calls, result in scales.items():
+            previous = baseline.get("results", {}).get(stage, {}).get(calls)
+            if previous is None:
+                continue
+
+            for metric, higher_is_better in COMPARED_METRICS.items():
+                if not previous.get(metric) or result.get(metric) is None:
+                    continue
+                change = (result[metric] - previous[metric]) / previous[metric]
+                if (-change if higher_is_better else change) > tolerance:
+                    regressions.append({
+                        "stage": stage,
+                        "calls": int(calls),
+                        "metric": metric,
+                        "baseline": previous[metric],
+                        "current": result[metric],
+                        "change": round(change, 4),
+                    })
+
+    return regressions
+
+
+def current_commit() -> str:
+    """This function returns the commit of the working tree, or unknown outside a git checkout."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)), check=True, capture_output=True, text=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main() -> None:
+    """This function runs every (stage, scale) pair in a separate process, writes the JSON baseline and compares it with a previous one."""
+    parser = argparse.ArgumentParser(description="Offline benchmark of VAD splitting, transcription and KPI scoring.")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES), help="Stages to benchmark")
+    parser.add_argument("--scales", nargs="+", type=int, default=[1, 100, 10000], help="Numbers of calls to run every stage on")
+    parser.add_argument("--call-seconds", type=float, default=60.0, help="Duration of a synthetic call")
+    parser.add_argument("--distinct-calls", type=int, default=16, help="Distinct synthetic calls, larger scales cycle through them")
+    parser.add_argument("--asr-seconds-per-audio-second", type=float, default=0.0, help="Simulated Whisper inference time per second of audio")
+    parser.add_argument("--asr-batch-size", type=int, default=8, help="Segments per fake Whisper forward pass")
+    parser.add_argument("--recordings-per-batch", type=int, default=1, help="Recordings transcribed together")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Median latency of a fake LLM request in seconds")
+    parser.add_argument("--llm-jitter", type=float, default=0.3, help="Sigma of the log-normal LLM latency")
+    parser.add_argument("--call-concurrency", type=int, default=16, help="Calls scored at once")
+    parser.add_argument("--correction-mode", choices=["llm", "local", "hybrid"], default="hybrid", help="Keyword correction mode of the score stage")
+    parser.add_argument("--fused", action="store_true", help="Evaluate all the KPIs in a single request")
+    parser.add_argument("--max-window-tokens", type=int, default=None, help="Evaluate longer transcripts in windows of this many tokens")
+    parser.add_argument("--output", default="benchmark_baseline.json", help="JSON file to write the results to")
+    parser.add_argument("--compare", default=None, help="Previous results to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Relative change of a metric that is not reported as a regression")
+    parser.add_argument("--child", nargs=2, metavar=("STAGE", "CALLS"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_stage(args.child[0], int(args.child[1]), args)))
+        return
+
+    # Settings forwarded to the child processes, the ones that change what is measured are stored with the results
+    settings = {
+        "call_seconds": args.call_seconds,
+        "distinct_calls": args.distinct_calls,
+        "asr_seconds_per_audio_second": args.asr_seconds_per_audio_second,
+        "asr_batch_size": args.asr_batch_size,
+        "recordings_per_batch": args.recordings_per_batch,
+        "llm_latency": args.llm_latency,
+        "llm_jitter": args.llm_jitter,
+        "call_concurrency": args.call_concurrency,
+        "correction_mode": args.correction_mode,
+        "max_window_tokens": args.max_window_tokens,
+    }
+    forwarded = [argument for name, value in settings.items() if value is not None for argument in (f"--{name.replace('_', '-')}", str(value))]
+    if args.fused:
+        forwarded.append("--fused")
+
+    results = {}
+    for stage in args.stages:
+        for calls in args.scales:
+            command = [sys.executable, os.path.abspath(__file__), "--child", stage, str(calls)] + forwarded
+            output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+            results.setdefault(stage, {})[str(calls)] = json.loads(output.strip().splitlines()[-1])
+            print(f"{stage} x {calls}: {json.dumps(results[stage][str(calls)])}", file=sys.stderr)
+
+    benchmark = {
+        "commit": current_commit(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": f"{platform.system()} {platform.machine()} ({os.cpu_count()} CPUs)",
+        "settings": dict(settings, fused=args.fused),
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as output_file:
+        json.dump(benchmark, output_file, indent=2)
+
+    if args.compare is None:
+        print(json.dumps(benchmark, indent=2))
+        return
+
+    with open(args.compare, "r", encoding="utf-8") as baseline_file:
+        baseline = json.load(baseline_file)
+
+    if baseline.get("settings") != benchmark["settings"]:
+        print(f"Warning: the settings differ from the baseline of {baseline.get('commit')}, the comparison may not be meaningful", file=sys.stderr)
+
+    regressions = compare_baselines(baseline, benchmark, args.tolerance)
+    print(json.dumps({"baseline_commit": baseline.get("commit"), "commit": benchmark["commit"], "regressions": regressions}, indent=2))
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
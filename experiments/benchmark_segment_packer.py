@@ -0,0 +1,157 @@
+"""
+Microbenchmark of pack_segments against the previous recursive split_timestamps on synthetic VAD timestamp lists.
+
+For every size the windows of both implementations are compared, and the region groups of pack_regions are checked
+for the invariants: every region in exactly one window, windows in order and disjoint, and no window longer than the
+maximum unless it is a group that cannot be split. tests/test_segment_packer.py checks the same on many random inputs.
+
+Usage:
+    python experiments/benchmark_segment_packer.py --sizes 100 1000 10000 100000
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+from typing import Dict, List, Tuple
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from transcription.segment_packer import MAX_WINDOW_SECONDS, pack_regions, pack_segments
+
+
+def synthetic_timestamps(regions: int, seed: int = 0) -> List[Dict]:
+    """
+    This function generates speech regions that look like VAD output: short utterances separated by pauses.
+
+    Parameters:
+        - regions (int) -> Number of speech regions
+        - seed (int) -> Random seed
+
+    Returns:
+        - speech_timestamps (List[Dict]) -> Speech regions in seconds
+    """
+    generator = random.Random(seed)
+
+    timestamps = []
+    position = 0.0
+    for _ in range(regions):
+        start = position + generator.choice([0.1, 0.3, 0.5, 1.0, 2.5])
+        end = start + generator.uniform(0.3, 12.0)
+        timestamps.append({"start": round(start, 3), "end": round(end, 3)})
+        position = end
+
+    return timestamps
+
+
+def legacy_pack_segments(timestamps: List[Dict], max_window: float = MAX_WINDOW_SECONDS) -> List[Dict]:
+    """This function is the previous recursive split_timestamps followed by the floor/ceil rounding, kept as the reference."""
+    result = []
+
+    def find_largest_gap(chunk):
+        max_gap = 0
+        split_index = None
+
+        for i in range(1, len(chunk)):
+            gap = chunk[i]['start'] - chunk[i - 1]['end']
+            if gap > max_gap:
+                max_gap = gap
+                split_index = i
+
+        return max_gap, split_index
+
+    def process_chunk(chunk):
+        if len(chunk) <= 1:
+            result.append(chunk)
+            return
+
+        if chunk[-1]['end'] - chunk[0]['start'] <= max_window:
+            result.append(chunk)
+            return
+
+        max_gap, split_index = find_largest_gap(chunk)
+        if max_gap <= 0 or split_index is None:
+            result.append(chunk)
+            return
+
+        process_chunk(chunk[:split_index])
+        process_chunk(chunk[split_index:])
+
+    process_chunk(timestamps)
+
+    return [
+        {"start": math.floor(float(chunk[0]['start'])), "end": math.ceil(float(chunk[-1]['end']))}
+        for chunk in result
+    ]
+
+
+def check_invariants(timestamps: List[Dict], window_bounds: List[Tuple[int, int]], max_window: float) -> None:
+    """
+    This function asserts the properties every packing has to satisfy.
+
+    Parameters:
+        - timestamps (List[Dict]) -> Speech regions that were packed
+        - window_bounds (List[Tuple[int, int]]) -> First and last region of every window, returned by pack_regions
+        - max_window (float) -> Maximum duration of a window in seconds
+    """
+    # 1. Every region is in exactly one window, and the windows are in order and disjoint
+    expected_low = 0
+    for low, high in window_bounds:
+        assert low == expected_low and low <= high
+        expected_low = high + 1
+    assert expected_low == len(timestamps)
+
+    # 2. A window longer than the maximum is a single region, or a group without a positive gap to split at
+    for low, high in window_bounds:
+        if timestamps[high]["end"] - timestamps[low]["start"] > max_window:
+            assert all(timestamps[index + 1]["start"] - timestamps[index]["end"] <= 0 for index in range(low, high))
+
+
+def measure(function, timestamps: List[Dict], repeats: int) -> float:
+    """This function returns the best wall time of a packing function in seconds."""
+    best = float("inf")
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        function(timestamps)
+        best = min(best, time.perf_counter() - start_time)
+
+    return best
+
+
+def main() -> None:
+    """This function runs the benchmark and prints the results as JSON."""
+    parser = argparse.ArgumentParser(description="Benchmark pack_segments against the recursive split_timestamps.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000, 100000], help="Numbers of speech regions")
+    parser.add_argument("--repeats", type=int, default=3, help="Runs per measurement, the best one is reported")
+    parser.add_argument("--max-window", type=float, default=MAX_WINDOW_SECONDS, help="Maximum window in seconds")
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes:
+        timestamps = synthetic_timestamps(size)
+        windows = pack_segments(timestamps, args.max_window)
+        check_invariants(timestamps, pack_regions(timestamps, args.max_window), args.max_window)
+
+        result = {
+            "regions": size,
+            "windows": len(windows),
+            "pack_segments_seconds": round(measure(lambda ts: pack_segments(ts, args.max_window), timestamps, args.repeats), 5),
+        }
+
+        try:
+            legacy_windows = legacy_pack_segments(timestamps, args.max_window)
+            result["legacy_seconds"] = round(measure(lambda ts: legacy_pack_segments(ts, args.max_window), timestamps, args.repeats), 5)
+            result["speedup"] = round(result["legacy_seconds"] / result["pack_segments_seconds"], 1)
+            result["same_windows"] = legacy_windows == windows
+        except RecursionError:
+            result["legacy_seconds"] = "RecursionError"
+
+        results.append(result)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,568 @@
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+import traceback
+from typing import Dict, Iterator, List, Optional, Set
+
+AUDIO_EXTENSIONS = ('.mp3', '.wav', '.flac', '.aac')
+
+
+def iter_audio_files(input_dir: str) -> Iterator[str]:
+    """
+    This function lazily walks a folder and yields the audio files in it in a stable order.
+
+    Parameters:
+        - input_dir (str) -> Folder with the call recordings
+
+    Returns:
+        - audio_file_paths (Iterator[str]) -> Paths of the audio files
+    """
+    for root, dirs, files in os.walk(input_dir):
+        dirs.sort()
+        for file in sorted(files):
+            if file.lower().endswith(AUDIO_EXTENSIONS):
+                yield os.path.join(root, file)
+
+
+def get_audio_id(audio_file_path: str, input_dir: Optional[str] = None) -> str:
+    """
+    This function returns the audio id of a recording: its path relative to the input folder, extension included, so "a/call1.mp3", "b/call1.mp3" and "call1.wav" get different ids.
+
+    Parameters:
+        - audio_file_path (str) -> Path of the recording
+        - input_dir (str | None) -> Folder the recordings are read from, the file name is the id if not provided
+
+    Returns:
+        - audio_id (str) -> Audio id of the recording, with / as the folder separator
+    """
+    if input_dir is None:
+        return os.path.basename(audio_file_path)
+
+    return os.path.relpath(audio_file_path, input_dir).replace(os.sep, "/")
+
+
+def legacy_audio_id(audio_file_path: str) -> str:
+    """
+    This function returns the audio id earlier versions used, the file name without the extension, to resume from their checkpoints.
+
+    Parameters:
+        - audio_file_path (str) -> Path of the recording
+
+    Returns:
+        - audio_id (str) -> File name of the recording without the extension
+    """
+    return os.path.splitext(os.path.basename(audio_file_path))[0]
+
+
+class Checkpoint:
+    """This class is an append-only list of the audio ids that have been written to the sink, so a rerun can skip them."""
+
+    def __init__(self, path: str) -> None:
+        """
+        This function loads the completed audio ids from the checkpoint file.
+
+        Parameters:
+            - path (str) -> Path of the checkpoint file
+        """
+        self.path = path
+        self.completed: Set[str] = set()
+
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as checkpoint_file:
+                self.completed = {line.strip() for line in checkpoint_file if line.strip()}
+
+        self._file = open(path, "a", encoding="utf-8")
+
+    def __contains__(self, audio_id: str) -> bool:
+        """This function checks if an audio id has already been completed."""
+        return audio_id in self.completed
+
+    def mark_completed(self, audio_ids: List[str]) -> None:
+        """
+        This function durably records that the audio ids have been written to the sink.
+
+        Parameters:
+            - audio_ids (List[str]) -> Audio ids to record
+        """
+        for audio_id in audio_ids:
+            self._file.write(audio_id + "\n")
+            self.completed.add(audio_id)
+
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        """This function closes the checkpoint file."""
+        self._file.close()
+
+
+class JsonlSink:
+    """This class appends one JSON record per call to a JSONL file and flushes it to disk as soon as it is written."""
+
+    def __init__(self, path: str) -> None:
+        """
+        This function opens the JSONL file for appending.
+
+        Parameters:
+            - path (str) -> Path of the JSONL file
+        """
+        self.path = path
+
+        # A crash in the middle of a write can leave a partial last line, start the next record on a new line.
+        needs_newline = False
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, "rb") as existing_file:
+                existing_file.seek(-1, os.SEEK_END)
+                needs_newline = existing_file.read(1) != b"\n"
+
+        self._file = open(path, "a", encoding="utf-8")
+        if needs_newline:
+            self._file.write("\n")
+
+    def committed_audio_ids(self) -> List[str]:
+        """
+        This function returns the audio ids of the records already in the JSONL file. A partial line left by a crash is not committed.
+
+        Returns:
+            - committed_audio_ids (List[str]) -> Audio ids stored in the file
+        """
+        committed_audio_ids = []
+        with open(self.path, "r", encoding="utf-8") as records_file:
+            for line in records_file:
+                try:
+                    committed_audio_ids.append(json.loads(line)["audio_id"])
+                except (json.JSONDecodeError, KeyError, TypeError):
+                    continue
+
+        return committed_audio_ids
+
+    def write(self, record: Dict) -> List[str]:
+        """
+        This function writes a record to disk.
+
+        Parameters:
+            - record (Dict) -> Result of one call
+
+        Returns:
+            - committed_audio_ids (List[str]) -> Audio ids that are now durably stored
+        """
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+        return [record["audio_id"]]
+
+    def close(self) -> List[str]:
+        """This function closes the JSONL file. Every record is already on disk, so nothing is committed here."""
+        self._file.close()
+        return []
+
+
+class ParquetSink:
+    """This class buffers records and writes them as numbered Parquet part files, so memory stays bounded by rows_per_part."""
+
+    def __init__(self, path: str, rows_per_part: int = 100) -> None:
+        """
+        This function prepares the folder the Parquet part files are written to.
+
+        Parameters:
+            - path (str) -> Folder of the Parquet part files
+            - rows_per_part (int) -> Number of calls per part file
+        """
+        import pyarrow  # noqa: F401 -- fail early if the optional dependency is missing
+
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.rows_per_part = rows_per_part
+        self._rows: List[Dict] = []
+        self._part_index = len([file for file in os.listdir(path) if file.endswith(".parquet")])
+
+    def committed_audio_ids(self) -> List[str]:
+        """
+        This function returns the audio ids of the records already in the part files. Part files are renamed into place, so every one of them is complete.
+
+        Returns:
+            - committed_audio_ids (List[str]) -> Audio ids stored in the part files
+        """
+        import pyarrow.parquet as pq
+
+        committed_audio_ids = []
+        for file in sorted(os.listdir(self.path)):
+            if file.endswith(".parquet"):
+                committed_audio_ids.extend(pq.read_table(os.path.join(self.path, file), columns=["audio_id"]).column("audio_id").to_pylist())
+
+        return committed_audio_ids
+
+    def write(self, record: Dict) -> List[str]:
+        """
+        This function buffers a record and writes a part file once rows_per_part records are buffered.
+
+        Parameters:
+            - record (Dict) -> Result of one call
+
+        Returns:
+            - committed_audio_ids (List[str]) -> Audio ids that are now durably stored
+        """
+        self._rows.append(record)
+        if len(self._rows) < self.rows_per_part:
+            return []
+
+        return self._flush()
+
+    def _flush(self) -> List[str]:
+        """This is a helper function that writes the buffered records to the next part file."""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if not self._rows:
+            return []
+
+        rows = [
+            {key: json.dumps(value, ensure_ascii=False) if isinstance(value, dict) else value for key, value in row.items()}
+            for row in self._rows
+        ]
+        part_path = os.path.join(self.path, f"part-{self._part_index:05d}.parquet")
+        pq.write_table(pa.Table.from_pylist(rows), part_path + ".tmp")
+        os.replace(part_path + ".tmp", part_path)
+
+        committed_audio_ids = [row["audio_id"] for row in self._rows]
+        self._part_index += 1
+        self._rows = []
+
+        return committed_audio_ids
+
+    def close(self) -> List[str]:
+        """This function writes the remaining buffered records and returns their audio ids."""
+        return self._flush()
+
+
+def process_call(
+    audio_file_path: str, 
+    pipe, 
+    vad_model, 
+    score: bool = False, 
+    fused: bool = False, 
+    cache=None, 
+    client=None, 
+    raw_transcripts: Optional[List[str]] = None,
+    correction_mode: str = "hybrid",
+    prescreen=None,
+    max_window_tokens: Optional[int] = None,
+    audio_id: Optional[str] = None
+) -> Dict:
+    """
+    This function transcribes one recording and optionally scores it with the KPI agents.
+
+    Parameters:
+        - audio_file_path (str) -> Path of the recording
+        - pipe (Pipeline) -> Whisper automatic speech recognition pipeline
+        - vad_model (silero-vad) -> Voice Activity Detection model
+        - score (bool) -> Correct the transcript and evaluate the KPIs
+        - fused (bool) -> Evaluate all the KPIs in a single request
+        - cache (LLMCache | None) -> On-disk cache of the LLM completions
+        - client (OpenAI | None) -> OpenAI compatible client
+        - raw_transcripts (List[str] | None) -> Segment transcripts if the recording was already transcribed in a batch
+        - correction_mode (str) -> llm, local or hybrid keyword correction of the transcript
+        - prescreen (KPIPrescreen | None) -> Local pre-screen that fails the KPIs the call cannot pass without a request
+        - max_window_tokens (int | None) -> Evaluate transcripts longer than this in windows (map-reduce)
+        - audio_id (str | None) -> Id of the recording, see get_audio_id, its file name if not provided
+
+    Returns:
+        - record (Dict) -> audio_id, segments, transcript and KPI scores of the call, with the versions and options the scores were computed with
+    """
+    if raw_transcripts is None:
+        from transcription.audio_processing import single_file_testing
+        raw_transcripts = single_file_testing(audio_file_path, pipe, vad_model)
+
+    cleaned_transcripts = ' '.join([transcript.strip() for transcript in raw_transcripts])
+
+    record = {
+        "audio_id": audio_id or get_audio_id(audio_file_path),
+        "segments": raw_transcripts,
+        "transcript": cleaned_transcripts,
+        "kpi_scores": None,
+    }
+
+    if score:
+        from agents.transcript_agents import TranscriptAgents
+
+        agents = TranscriptAgents(raw_transcripts, cleaned_transcripts, client=client, cache=cache, prescreen=prescreen)
+        record["corrected_transcript"] = agents.transcript_correction_agent(raw_transcripts, mode=correction_mode)
+        record["kpi_scores"] = agents.evaluate_all(fused=fused, max_window_tokens=max_window_tokens)
+        record["kpi_versions"] = agents.kpi_stamps()
+        # The options are reused by the re-scoring, which also needs the corrected segments to split the same windows
+        record["kpi_options"] = agents.kpi_options
+        if max_window_tokens and not fused:
+            record["corrected_segments"] = agents.corrected_transcripts
+
+    return record
+
+
+def run_batch(
+    input_dir: str,
+    output_path: str,
+    output_format: str = "jsonl",
+    score: bool = False,
+    fused: bool = False,
+    cache_path: Optional[str] = None,
+    limit: Optional[int] = None,
+    recordings_per_batch: int = 1,
+    asr_batch_size: int = 8,
+    preprocess_workers: int = 0,
+    model_server: Optional[str] = None,
+    correction_mode: str = "hybrid",
+    prescreen_threshold: Optional[float] = None,
+    max_window_tokens: Optional[int] = None,
+    metrics_path: Optional[str] = None,
+    skip_duplicates: bool = False,
+    pipe=None,
+    vad_model=None
+) -> Dict:
+    """
+    This function transcribes (and optionally scores) every recording of a folder and streams the results to a sink as each call finishes.
+
+    Completed audio ids are recorded in <output_path>.checkpoint, so a rerun skips them. A call that fails is reported and not checkpointed, so it is retried on the next run.
+
+    Parameters:
+        - input_dir (str) -> Folder with the call recordings
+        - output_path (str) -> JSONL file, or folder of Parquet part files
+        - output_format (str) -> jsonl or parquet
+        - score (bool) -> Correct the transcripts and evaluate the KPIs
+        - fused (bool) -> Evaluate all the KPIs in a single request
+        - cache_path (str | None) -> Path of the SQLite LLM cache
+        - limit (int | None) -> Maximum number of new calls to process
+        - recordings_per_batch (int) -> Recordings whose segments are transcribed together in length-bucketed batches, 1 batches the segments of each call on its own
+        - asr_batch_size (int) -> Segments per Whisper forward pass
+        - preprocess_workers (int) -> Worker processes that decode, run VAD on and segment the recordings while this process runs Whisper, 0 does everything in this process
+        - model_server (str | None) -> host:port of a running model server to transcribe with instead of loading the models here
+        - correction_mode (str) -> llm, local or hybrid keyword correction of the transcripts
+        - prescreen_threshold (float | None) -> Recall threshold of the local KPI pre-screen, None sends every KPI to the LLM
+        - max_window_tokens (int | None) -> Evaluate transcripts longer than this many tokens in windows (map-reduce), None sends every transcript whole
+        - metrics_path (str | None) -> JSON file to write the per-stage latency, token and cost metrics to, with a Prometheus .prom copy next to it
+        - skip_duplicates (bool) -> Skip the recordings whose bytes are identical to another recording of the folder, e.g. "call (1).mp3"
+        - pipe (Pipeline | None) -> Whisper pipeline, loaded if not provided
+        - vad_model (silero-vad | None) -> VAD model, loaded if not provided
+
+    Returns:
+        - summary (Dict) -> Number of processed, skipped, duplicate and failed calls, the report of the pre-screen if enabled and the LLM cost
+    """
+    from pipeline.telemetry import TELEMETRY
+
+    server_client = None
+    if model_server:
+        from transcription.model_server import ModelServerClient
+        host, port = model_server.rsplit(":", 1)
+        server_client = ModelServerClient((host, int(port)))
+        server_client.wait_until_ready()
+    elif pipe is None or vad_model is None:
+        from transcription.audio_processing import load_models
+        pipe, vad_model = load_models()
+
+    cache = None
+    if cache_path:
+        from agents.llm_cache import LLMCache
+        cache = LLMCache(cache_path)
+
+    prescreen = None
+    if score and prescreen_threshold is not None:
+        from agents.kpi_prescreen import KPIPrescreen
+        prescreen = KPIPrescreen(recall_threshold=prescreen_threshold)
+
+    sink = ParquetSink(output_path) if output_format == "parquet" else JsonlSink(output_path)
+    checkpoint = Checkpoint(output_path.rstrip("/\\") + ".checkpoint")
+
+    # A crash between a sink write and its checkpoint line leaves calls in the sink that the checkpoint does not know, they would be written again
+    uncheckpointed_audio_ids = [audio_id for audio_id in dict.fromkeys(sink.committed_audio_ids()) if audio_id not in checkpoint]
+    if uncheckpointed_audio_ids:
+        print(f"Recovering {len(uncheckpointed_audio_ids)} calls written to {output_path} but missing from its checkpoint")
+        checkpoint.mark_completed(uncheckpointed_audio_ids)
+
+    summary = {"processed": 0, "skipped": 0, "duplicates": 0, "failed": 0}
+
+    duplicates = {}
+    if skip_duplicates:
+        from pipeline.inventory import find_duplicates
+        duplicates = find_duplicates(iter_audio_files(input_dir))
+
+    # Checkpoints of earlier versions hold file names without the extension. Such an id still marks its recording as done when no other recording has the same name.
+    legacy_counts: Dict[str, int] = {}
+    if checkpoint.completed:
+        for audio_file_path in iter_audio_files(input_dir):
+            legacy_counts[legacy_audio_id(audio_file_path)] = legacy_counts.get(legacy_audio_id(audio_file_path), 0) + 1
+
+    def iter_pending_files():
+        for audio_file_path in iter_audio_files(input_dir):
+            if audio_file_path in duplicates:
+                summary["duplicates"] += 1
+                print(f"Skipping {audio_file_path}, a copy of {duplicates[audio_file_path]}")
+                continue
+            legacy_id = legacy_audio_id(audio_file_path)
+            if get_audio_id(audio_file_path, input_dir) in checkpoint or (legacy_id in checkpoint and legacy_counts.get(legacy_id) == 1):
+                summary["skipped"] += 1
+                continue
+            if legacy_id in checkpoint:
+                print(f"Processing {audio_file_path} again, the checkpoint id {legacy_id} is shared by several recordings", file=sys.stderr)
+            yield audio_file_path
+
+    def iter_grouped_transcripts(file_paths):
+        while True:
+            group = list(itertools.islice(file_paths, max(1, recordings_per_batch)))
+            if not group:
+                return
+
+            try:
+                raw_transcripts_by_path, asr_stats = transcribe_recordings(group, pipe, vad_model, batch_size=asr_batch_size)
+            except Exception:
+                error = traceback.format_exc()
+                for audio_file_path in group:
+                    yield audio_file_path, None, error
+                continue
+
+            print(f"Transcribed {len(group)} recordings: {asr_stats['audio_seconds_per_wall_second']} audio-seconds per wall-second")
+            for audio_file_path in group:
+                yield audio_file_path, raw_transcripts_by_path[audio_file_path], None
+
+    def iter_served_transcripts(file_paths):
+        while True:
+            group = list(itertools.islice(file_paths, max(1, recordings_per_batch)))
+            if not group:
+                return
+
+            try:
+                request_start = time.perf_counter()
+                raw_transcripts = server_client.transcribe_many(group)
+                # Decode, VAD and ASR run on the server, only the round trip of the group is known here
+                for audio_file_path in group:
+                    TELEMETRY.add_pending_span(audio_file_path, "model_server", request_start, time.perf_counter(), recordings=len(group))
+            except Exception:
+                error = traceback.format_exc()
+                for audio_file_path in group:
+                    yield audio_file_path, None, error
+                continue
+
+            yield from [(audio_file_path, transcripts, None) for audio_file_path, transcripts in zip(group, raw_transcripts)]
+
+    pending_files = itertools.islice(iter_pending_files(), limit)
+
+    # (audio_file_path, raw_transcripts, error), raw_transcripts is None when the transcription of the call failed
+    if server_client is not None:
+        transcribed = iter_served_transcripts(pending_files)
+    elif preprocess_workers > 0:
+        from transcription.preprocessing_workers import iter_transcribed
+        transcribed = iter_transcribed(
+            pending_files, 
+            pipe, 
+            num_workers=preprocess_workers, 
+            recordings_per_batch=recordings_per_batch, 
+            asr_batch_size=asr_batch_size
+        )
+    else:
+        # With one recording per batch the segments of each call are still transcribed asr_batch_size at a time
+        from transcription.batched_transcription import transcribe_recordings
+        transcribed = iter_grouped_transcripts(pending_files)
+
+    # Traces of calls preprocessed in worker processes or transcribed by the model server miss the stages that ran there
+    partial_traces = server_client is not None or preprocess_workers > 0
+
+    try:
+        for audio_file_path, raw_transcripts, error in transcribed:
+            audio_id = get_audio_id(audio_file_path, input_dir)
+            # Spans of the batched transcription, recorded before the trace of the call
+            transcription_spans = TELEMETRY.pop_pending_spans(audio_file_path)
+
+            start_time = time.perf_counter()
+            try:
+                if error is not None:
+                    raise RuntimeError(error)
+
+                with TELEMETRY.trace(audio_id, spans=transcription_spans, partial=partial_traces):
+                    record = process_call(
+                        audio_file_path, 
+                        pipe, 
+                        vad_model, 
+                        score=score, 
+                        fused=fused, 
+                        cache=cache, 
+                        raw_transcripts=raw_transcripts,
+                        correction_mode=correction_mode,
+                        prescreen=prescreen,
+                        max_window_tokens=max_window_tokens,
+                        audio_id=audio_id
+                    )
+            except Exception:
+                TELEMETRY.record_retry("recording", "failed")
+                summary["failed"] += 1
+                print(f"Failed {audio_id}:\n{traceback.format_exc()}", file=sys.stderr)
+                continue
+
+            checkpoint.mark_completed(sink.write(record))
+            summary["processed"] += 1
+
+            print(f"{summary['processed']} processed, {summary['skipped']} skipped - {audio_id} ({time.perf_counter() - start_time:.1f}s)")
+    finally:
+        checkpoint.mark_completed(sink.close())
+        checkpoint.close()
+        if metrics_path:
+            TELEMETRY.export(metrics_path)
+
+    if prescreen is not None:
+        summary["prescreen"] = prescreen.report()
+
+    summary["llm_cost_usd"] = TELEMETRY.to_dict(include_traces=False)["total_cost_usd"]
+
+    return summary
+
+
+def main() -> None:
+    """This function is the command line entry point of the batch runner."""
+    parser = argparse.ArgumentParser(description="Transcribe and score a folder of sales call recordings.")
+    parser.add_argument("input_dir", help="Folder with the call recordings")
+    parser.add_argument("--output", default="sales_call_transcripts.jsonl", help="JSONL file, or folder of Parquet part files")
+    parser.add_argument("--format", choices=["jsonl", "parquet"], default="jsonl", help="Output format")
+    parser.add_argument("--score", action="store_true", help="Correct the transcripts and evaluate the KPIs")
+    parser.add_argument("--fused", action="store_true", help="Evaluate all the KPIs in a single request")
+    parser.add_argument("--cache", default=None, help="Path of the SQLite LLM cache")
+    parser.add_argument("--limit", type=int, default=None, help="Maximum number of new calls to process")
+    parser.add_argument("--recordings-per-batch", type=int, default=1, help="Recordings whose segments are transcribed together in batches")
+    parser.add_argument("--asr-batch-size", type=int, default=8, help="Segments per Whisper forward pass")
+    parser.add_argument("--preprocess-workers", type=int, default=0, help="Worker processes for decoding, VAD and segmenting")
+    parser.add_argument("--model-server", default=None, help="host:port of a running model server (python -m transcription.model_server)")
+    parser.add_argument("--correction-mode", choices=["llm", "local", "hybrid"], default="hybrid", help="Keyword correction: LLM only, local corrector only, or LLM for low-confidence segments")
+    parser.add_argument("--prescreen-threshold", type=float, default=None, help="Skip the LLM request of KPIs with less than this fraction of their reference points mentioned (e.g. 0.25)")
+    parser.add_argument("--max-window-tokens", type=int, default=None, help="Evaluate longer transcripts in windows of this many tokens (map-reduce)")
+    parser.add_argument("--skip-duplicates", action="store_true", help="Skip recordings that are byte-identical copies of another recording")
+    parser.add_argument("--pcm-cache", default=None, help="Folder of the decoded PCM cache, reused across runs ($TELELYZER_PCM_CACHE)")
+    parser.add_argument("--metrics", default=None, help="JSON file to write the per-stage latency, token and cost metrics to (a .prom file is written next to it)")
+    args = parser.parse_args()
+
+    if args.pcm_cache:
+        from transcription.pcm_cache import PCM_CACHE_ENV
+        # Set in the environment so the preprocessing workers use it too
+        os.environ[PCM_CACHE_ENV] = args.pcm_cache
+
+    summary = run_batch(
+        args.input_dir,
+        args.output,
+        output_format=args.format,
+        score=args.score,
+        fused=args.fused,
+        cache_path=args.cache,
+        limit=args.limit,
+        recordings_per_batch=args.recordings_per_batch,
+        asr_batch_size=args.asr_batch_size,
+        preprocess_workers=args.preprocess_workers,
+        model_server=args.model_server,
+        correction_mode=args.correction_mode,
+        prescreen_threshold=args.prescreen_threshold,
+        max_window_tokens=args.max_window_tokens,
+        metrics_path=args.metrics,
+        skip_duplicates=args.skip_duplicates
+    )
+    print(json.dumps(summary))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Suffixes the file managers and download tools add to a copy: "call (1).mp3", "call - Copy.mp3", "call copy 2.mp3"
+COPY_SUFFIX = re.compile(r"(\s*\(\d+\)|\s*-\s*copy(\s*\(\d+\))?|\s+copy(\s+\d+)?)$", re.IGNORECASE)
+
+
+def probe_audio(file_path: str) -> Dict:
+    """
+    This function reads the duration, sample rate, channels and codec of a recording from its container headers with ffprobe, without decoding the audio.
+
+    Parameters:
+        - file_path (str) -> Path of the recording
+
+    Returns:
+        - entry (Dict) -> path, size_bytes, duration_seconds, sample_rate, channels, codec and bit_rate, or path, size_bytes and error if it cannot be read
+    """
+    entry = {"path": file_path, "size_bytes": os.path.getsize(file_path)}
+
+    command = [
+        "ffprobe", "-v", "error",
+        "-select_streams", "a:0",
+        "-show_entries", "format=duration,bit_rate:stream=sample_rate,channels,codec_name",
+        "-of", "json",
+        file_path
+    ]
+    process = subprocess.run(command, capture_output=True, text=True)
+    if process.returncode != 0:
+        entry["error"] = process.stderr.strip() or f"ffprobe exited with code {process.returncode}"
+        return entry
+
+    probe = json.loads(process.stdout)
+    if not probe.get("streams"):
+        entry["error"] = "No audio stream"
+        return entry
+
+    stream = probe["streams"][0]
+    container = probe.get("format", {})
+    entry.update({
+        "duration_seconds": round(float(container.get("duration", 0.0)), 3),
+        "sample_rate": int(stream.get("sample_rate", 0)),
+        "channels": int(stream.get("channels", 0)),
+        "codec": stream.get("codec_name"),
+        "bit_rate": int(container["bit_rate"]) if container.get("bit_rate") else None,
+    })
+
+    return entry
+
+
+def canonical_order(file_path: str) -> Tuple:
+    """
+    This function is the sort key that picks the original of a group of identical recordings: a name without a copy suffix first, then the shortest name, then the path.
+
+    Parameters:
+        - file_path (str) -> Path of a recording
+
+    Returns:
+        - key (Tuple) -> Sort key
+    """
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+
+    return (bool(COPY_SUFFIX.search(stem)), len(stem), file_path)
+
+
+def find_duplicates(file_paths: Iterable[str], workers: Optional[int] = None) -> Dict[str, str]:
+    """
+    This function finds the recordings whose bytes are identical to another one, e.g. "call (1).mp3" next to "call.mp3".
+
+    Only files that share their size with another file are hashed, so a corpus without duplicates is checked with a stat per file.
+
+    Parameters:
+        - file_paths (Iterable[str]) -> Paths of the recordings
+        - workers (int | None) -> Threads hashing the candidates in parallel
+
+    Returns:
+        - duplicates (Dict[str, str]) -> Path of every duplicate to the path of the original it copies
+    """
+    from transcription.pcm_cache import content_hash
+
+    # 1. Group by size
+    paths_by_size: Dict[int, List[str]] = {}
+    for file_path in file_paths:
+        paths_by_size.setdefault(os.path.getsize(file_path), []).append(file_path)
+    candidates = [file_path for paths in paths_by_size.values() if len(paths) > 1 for file_path in paths]
+
+    # 2. Hash the files that share a size
+    with ThreadPoolExecutor(max_workers=workers or min(32, (os.cpu_count() or 1) * 2)) as executor:
+        digests = dict(zip(candidates, executor.map(content_hash, candidates)))
+
+    paths_by_digest: Dict[str, List[str]] = {}
+    for file_path, digest in digests.items():
+        paths_by_digest.setdefault(digest, []).append(file_path)
+
+    # 3. Keep the original of every group of identical files
+    duplicates = {}
+    for paths in paths_by_digest.values():
+        original, *copies = sorted(paths, key=canonical_order)
+        for file_path in copies:
+            duplicates[file_path] = original
+
+    return duplicates
+
+
+def scan_inventory(file_paths: Iterable[str], workers: Optional[int] = None) -> Tuple[List[Dict], Dict]:
+    """
+    This function probes every recording in parallel and summarizes the corpus: total duration, sample rates, channels and duplicates.
+
+    Parameters:
+        - file_paths (Iterable[str]) -> Paths of the recordings
+        - workers (int | None) -> ffprobe processes run in parallel
+
+    Returns:
+        - entries (List[Dict]) -> probe_audio entry of every recording, with duplicate_of set on the copies
+        - summary (Dict) -> Counts and durations of the corpus
+    """
+    file_paths = list(file_paths)
+    workers = workers or min(32, (os.cpu_count() or 1) * 2)
+
+    # 1. Read the headers, ffprobe runs in its own process so threads are enough
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        entries = list(executor.map(probe_audio, file_paths))
+
+    # 2. Mark the duplicates
+    duplicates = find_duplicates(file_paths, workers)
+    for entry in entries:
+        entry["duplicate_of"] = duplicates.get(entry["path"])
+
+    # 3. Summarize
+    readable_entries = [entry for entry in entries if "error" not in entry]
+    total_seconds = sum([entry["duration_seconds"] for entry in readable_entries])
+    duplicate_seconds = sum([entry["duration_seconds"] for entry in readable_entries if entry["duplicate_of"]])
+
+    summary = {
+        "files": len(entries),
+        "unreadable": len(entries) - len(readable_entries),
+        "total_seconds": round(total_seconds, 3),
+        "total_hours": round(total_seconds / 3600, 3),
+        "total_duration": f"{int(total_seconds // 3600)}h {int(total_seconds % 3600 // 60)}m {int(total_seconds % 60)}s",
+        "duplicates": len(duplicates),
+        "duplicate_hours": round(duplicate_seconds / 3600, 3),
+        "size_gb": round(sum([entry["size_bytes"] for entry in entries]) / 1e9, 3),
+        "sample_rates": {},
+        "channels": {},
+        "codecs": {},
+    }
+    for entry in readable_entries:
+        for key, field in (("sample_rates", "sample_rate"), ("channels", "channels"), ("codecs", "codec")):
+            summary[key][str(entry[field])] = summary[key].get(str(entry[field]), 0) + 1
+
+    return entries, summary
+
+
+def main() -> None:
+    """This function is the command line entry point of the corpus inventory."""
+    from pipeline.batch_runner import iter_audio_files
+
+    parser = argparse.ArgumentParser(description="Inventory a folder of call recordings from their headers and find duplicate recordings.")
+    parser.add_argument("input_dir", help="Folder with the call recordings")
+    parser.add_argument("--output", default=None, help="JSONL file to write the entry of every recording to")
+    parser.add_argument("--workers", type=int, default=None, help="ffprobe processes run in parallel")
+    args = parser.parse_args()
+
+    entries, summary = scan_inventory(iter_audio_files(args.input_dir), workers=args.workers)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            for entry in entries:
+                output_file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    for entry in entries:
+        if "error" in entry:
+            print(f"Cannot read {entry['path']}: {entry['error']}", file=sys.stderr)
+
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,369 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+import traceback
+from typing import Dict, Iterator, Optional, Set
+
+STALE_REASONS = ("missing", "rubric", "mode", "model", "transcript")
+
+# Options of records written before they were stored: every KPI evaluated whole by its own agent
+DEFAULT_KPI_OPTIONS = {"fused": False, "max_window_tokens": None, "prescreen_threshold": None}
+
+
+# Record fields the Parquet sink of the batch runner stores as JSON strings, since they are dictionaries
+PARQUET_JSON_FIELDS = ("kpi_scores", "kpi_versions", "kpi_options")
+
+
+def is_parquet(path: str) -> bool:
+    """This function tells if a path is Parquet output of the batch runner (a folder of part files, or a single .parquet file) rather than a JSONL file."""
+    return os.path.isdir(path) or path.endswith(".parquet")
+
+
+def _iter_parquet_records(path: str) -> Iterator[Dict]:
+    """
+    This is a helper function that lazily reads the records of the Parquet part files written by the batch runner, one row group at a time.
+
+    Parameters:
+        - path (str) -> Folder of the Parquet part files, or a single .parquet file
+
+    Returns:
+        - records (Iterator[Dict]) -> Record of every call
+    """
+    import pyarrow.parquet as pq
+
+    if os.path.isdir(path):
+        part_paths = [os.path.join(path, file) for file in sorted(os.listdir(path)) if file.endswith(".parquet")]
+    else:
+        part_paths = [path]
+
+    for part_path in part_paths:
+        for batch in pq.ParquetFile(part_path).iter_batches():
+            for row in batch.to_pylist():
+                for field in PARQUET_JSON_FIELDS:
+                    if isinstance(row.get(field), str):
+                        row[field] = json.loads(row[field])
+                yield row
+
+
+def iter_records(path: str) -> Iterator[Dict]:
+    """
+    This function lazily reads the records written by the batch runner: a JSONL file, skipping a partial last line, or Parquet part files (requires pyarrow).
+
+    Parameters:
+        - path (str) -> Path of the JSONL file, or folder of the Parquet part files
+
+    Returns:
+        - records (Iterator[Dict]) -> Record of every call
+    """
+    if is_parquet(path):
+        yield from _iter_parquet_records(path)
+        return
+
+    with open(path, "r", encoding="utf-8") as records_file:
+        for line in records_file:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                print(f"Skipping a malformed line of {path}", file=sys.stderr)
+
+
+def record_options(record: Dict, overrides: Optional[Dict] = None) -> Dict:
+    """
+    This function returns the KPI evaluation options of a call: the ones stored in its record, replaced by the overrides that are set.
+
+    Parameters:
+        - record (Dict) -> Record of a scored call
+        - overrides (Dict | None) -> fused, max_window_tokens and prescreen_threshold to use instead, None values keep the stored option
+
+    Returns:
+        - options (Dict) -> fused, max_window_tokens and prescreen_threshold
+    """
+    options = dict(DEFAULT_KPI_OPTIONS, **(record.get("kpi_options") or {}))
+    options.update({key: value for key, value in (overrides or {}).items() if value is not None})
+
+    return options
+
+
+def allowed_modes(options: Dict) -> Set[str]:
+    """
+    This function returns the evaluation modes a KPI result can have when it is evaluated with the given options.
+
+    Parameters:
+        - options (Dict) -> fused, max_window_tokens and prescreen_threshold
+
+    Returns:
+        - modes (Set[str]) -> Modes of KPI_EVALUATION_MODES. Without the fused option a short transcript is evaluated whole even with max_window_tokens
+    """
+    modes = {"fused"} if options["fused"] else {"agent", "window"} if options["max_window_tokens"] else {"agent"}
+    if options["prescreen_threshold"]:
+        modes.add("prescreen")
+
+    return modes
+
+
+def stale_kpis(record: Dict, rubrics, options: Optional[Dict] = None, prescreen=None) -> Dict[str, str]:
+    """
+    This function compares the stamps stored with the KPI scores of a call against the current rubrics, evaluation mode, prompts and transcript.
+
+    Parameters:
+        - record (Dict) -> Record of a scored call
+        - rubrics (RubricRegistry) -> Current rubric registry
+        - options (Dict | None) -> Options the call would be evaluated with now, the options stored in the record if not provided
+        - prescreen (KPIPrescreen | None) -> Pre-screen of the prescreen_threshold option
+
+    Returns:
+        - stale (Dict[str, str]) -> KPI name to the first reason it is stale (missing, rubric, mode, model or transcript), empty if every score is current
+    """
+    from agents.transcript_agents import kpi_stamp
+
+    options = options or record_options(record)
+    modes = allowed_modes(options)
+    kpi_scores = record.get("kpi_scores") or {}
+    kpi_versions = record.get("kpi_versions") or {}
+
+    stale = {}
+    for kpi_name in rubrics.names:
+        stored_stamp = kpi_versions.get(kpi_name)
+        if kpi_name not in kpi_scores or stored_stamp is None:
+            stale[kpi_name] = "missing"
+            continue
+
+        # Stamps written before the mode was stored come from the per-KPI agents
+        stored_mode = stored_stamp.get("mode", "agent")
+        if stored_mode not in modes:
+            stale[kpi_name] = "mode"
+            continue
+
+        current_stamp = kpi_stamp(rubrics, kpi_name, record.get("corrected_transcript", ""), stored_mode, options["max_window_tokens"], prescreen)
+        for reason in ("rubric", "model", "transcript"):
+            if stored_stamp.get(reason) != current_stamp[reason]:
+                stale[kpi_name] = reason
+                break
+
+    return stale
+
+
+def rescore(
+    input_path: str,
+    output_path: Optional[str] = None,
+    rubrics_path: Optional[str] = None,
+    dry_run: bool = False,
+    max_concurrency: int = 8,
+    cache_path: Optional[str] = None,
+    client=None,
+    fused: Optional[bool] = None,
+    max_window_tokens: Optional[int] = None,
+    prescreen_threshold: Optional[float] = None
+) -> Dict:
+    """
+    This function re-evaluates only the (call, KPI) pairs whose stored score is stale, and rewrites the records with the new scores and stamps.
+
+    Calls that were never scored (no corrected transcript) are left as they are. A call whose re-evaluation fails keeps its old scores and is picked up again by the next run.
+
+    Every call is evaluated with the options stored in its record (fused, max_window_tokens, prescreen_threshold), unless an option is given here. A score produced in a mode these options no longer allow is stale, e.g. a pre-screen result once the pre-screen is disabled with prescreen_threshold=0.
+
+    Parameters:
+        - input_path (str) -> JSONL file, or folder of Parquet part files, written by the batch runner
+        - output_path (str | None) -> JSONL file (folder of Parquet part files for a Parquet input) to write, the input is replaced if not provided
+        - rubrics_path (str | None) -> Rubrics file, the default registry if not provided
+        - dry_run (bool) -> Only count the stale pairs, without any request or write
+        - max_concurrency (int) -> Maximum number of KPI requests in flight at once
+        - cache_path (str | None) -> Path of the SQLite LLM cache
+        - client (OpenAI | None) -> OpenAI compatible client
+        - fused (bool | None) -> Evaluate all the KPIs in a single request, the stored option if not provided
+        - max_window_tokens (int | None) -> Evaluate transcripts longer than this in windows, the stored option if not provided
+        - prescreen_threshold (float | None) -> Recall threshold of the local KPI pre-screen, 0 disables it, the stored option if not provided
+
+    Returns:
+        - summary (Dict) -> Number of calls, scored calls, stale calls and pairs, stale pairs per reason and per KPI, and failed calls
+    """
+    from agents.kpi_rubrics import load_rubric_registry
+
+    rubrics = load_rubric_registry(rubrics_path) if rubrics_path else load_rubric_registry()
+    overrides = {"fused": fused, "max_window_tokens": max_window_tokens, "prescreen_threshold": prescreen_threshold}
+
+    # One pre-screen per threshold found in the records, built from the current rubrics
+    prescreens = {}
+
+    def get_prescreen(threshold: Optional[float]):
+        if not threshold:
+            return None
+        if threshold not in prescreens:
+            from agents.kpi_prescreen import KPIPrescreen
+            prescreens[threshold] = KPIPrescreen({rubric.name: rubric.script for rubric in rubrics}, recall_threshold=threshold)
+        return prescreens[threshold]
+
+    cache = None
+    if cache_path and not dry_run:
+        from agents.llm_cache import LLMCache
+        cache = LLMCache(cache_path)
+
+    summary = {
+        "calls": 0,
+        "scored_calls": 0,
+        "stale_calls": 0,
+        "stale_pairs": 0,
+        "total_pairs": 0,
+        "stale_by_reason": {reason: 0 for reason in STALE_REASONS},
+        "stale_by_kpi": {kpi_name: 0 for kpi_name in rubrics.names},
+        "failed": 0,
+    }
+
+    # The records are written in the format of the input
+    output_file = None
+    parquet_sink = None
+    temporary_path = (output_path or input_path).rstrip(os.sep) + ".tmp"
+    if not dry_run and is_parquet(input_path):
+        from pipeline.batch_runner import ParquetSink
+
+        shutil.rmtree(temporary_path, ignore_errors=True)
+        parquet_sink = ParquetSink(temporary_path)
+    elif not dry_run:
+        output_file = open(temporary_path, "w", encoding="utf-8")
+
+    try:
+        for record in iter_records(input_path):
+            summary["calls"] += 1
+
+            stale = {}
+            options = record_options(record, overrides)
+            prescreen = get_prescreen(options["prescreen_threshold"])
+            if record.get("corrected_transcript") is not None:
+                summary["scored_calls"] += 1
+                summary["total_pairs"] += len(rubrics)
+                stale = stale_kpis(record, rubrics, options, prescreen)
+
+            if stale:
+                summary["stale_calls"] += 1
+                summary["stale_pairs"] += len(stale)
+                for kpi_name, reason in stale.items():
+                    summary["stale_by_reason"][reason] += 1
+                    summary["stale_by_kpi"][kpi_name] += 1
+
+            if dry_run:
+                continue
+
+            if stale:
+                try:
+                    record = rescore_record(record, list(stale), rubrics, max_concurrency, cache, client, options, prescreen)
+                except Exception:
+                    summary["failed"] += 1
+                    print(f"Failed {record.get('audio_id')}:\n{traceback.format_exc()}", file=sys.stderr)
+
+            if parquet_sink is not None:
+                parquet_sink.write(record)
+            else:
+                output_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+    finally:
+        if output_file is not None:
+            output_file.close()
+        if parquet_sink is not None:
+            parquet_sink.close()
+        if cache is not None:
+            cache.close()
+
+    if not dry_run:
+        _replace(temporary_path, output_path or input_path)
+
+    return summary
+
+
+def _replace(source_path: str, destination_path: str) -> None:
+    """
+    This is a helper function that moves the rewritten records into place. A folder of Parquet part files is swapped with the old one, which is then removed.
+
+    Parameters:
+        - source_path (str) -> Temporary JSONL file or folder of the rewritten records
+        - destination_path (str) -> Output path
+    """
+    if not os.path.isdir(source_path) or not os.path.exists(destination_path):
+        os.replace(source_path, destination_path)
+        return
+
+    old_path = destination_path.rstrip(os.sep) + ".old"
+    shutil.rmtree(old_path, ignore_errors=True)
+    os.replace(destination_path, old_path)
+    os.replace(source_path, destination_path)
+    if os.path.isdir(old_path):
+        shutil.rmtree(old_path)
+    else:
+        os.remove(old_path)
+
+
+def rescore_record(record: Dict, kpi_names, rubrics, max_concurrency: int = 8, cache=None, client=None, options: Optional[Dict] = None, prescreen=None) -> Dict:
+    """
+    This function re-evaluates some KPIs of a call and returns the record with their new scores, stamps and options.
+
+    In fused mode the KPIs are re-evaluated together in a single request with only their reference scripts.
+
+    Parameters:
+        - record (Dict) -> Record of a scored call
+        - kpi_names (List[str]) -> KPIs to re-evaluate
+        - rubrics (RubricRegistry) -> Current rubric registry
+        - max_concurrency (int) -> Maximum number of KPI requests in flight at once
+        - cache (LLMCache | None) -> On-disk cache of the LLM completions
+        - client (OpenAI | None) -> OpenAI compatible client
+        - options (Dict | None) -> fused, max_window_tokens and prescreen_threshold, the options stored in the record if not provided
+        - prescreen (KPIPrescreen | None) -> Pre-screen of the prescreen_threshold option
+
+    Returns:
+        - record (Dict) -> Updated copy of the record
+    """
+    from agents.transcript_agents import TranscriptAgents
+
+    options = options or record_options(record)
+
+    agents = TranscriptAgents(record.get("segments", []), record.get("transcript", ""), client=client, cache=cache, prescreen=prescreen, rubrics=rubrics)
+    agents.cleaned_corrected_transcripts = record["corrected_transcript"]
+    if record.get("corrected_segments"):
+        agents.corrected_transcripts = record["corrected_segments"]
+
+    results = agents.evaluate_all(
+        max_concurrency=max_concurrency,
+        fused=options["fused"],
+        max_window_tokens=options["max_window_tokens"],
+        kpi_names=kpi_names
+    )
+
+    record = dict(record)
+    record["kpi_scores"] = dict(record.get("kpi_scores") or {}, **results)
+    record["kpi_versions"] = dict(record.get("kpi_versions") or {}, **agents.kpi_stamps(list(results)))
+    record["kpi_options"] = dict(agents.kpi_options, prescreen_threshold=options["prescreen_threshold"])
+
+    return record
+
+
+def main() -> None:
+    """This function is the command line entry point of the incremental re-scoring."""
+    parser = argparse.ArgumentParser(description="Re-evaluate only the KPI scores made stale by a rubric, evaluation mode, prompt or transcript change.")
+    parser.add_argument("input", help="JSONL file, or folder of Parquet part files (requires pyarrow), written by the batch runner")
+    parser.add_argument("--output", default=None, help="File to write, in the format of the input (a folder of Parquet part files for a Parquet input), the input is replaced if not provided")
+    parser.add_argument("--rubrics", default=None, help="Rubrics file, agents/kpi_rubrics.json if not provided")
+    parser.add_argument("--dry-run", action="store_true", help="Only count the stale (call, KPI) pairs")
+    parser.add_argument("--max-concurrency", type=int, default=8, help="Maximum number of KPI requests in flight at once")
+    parser.add_argument("--cache", default=None, help="Path of the SQLite LLM cache")
+    parser.add_argument("--fused", action=argparse.BooleanOptionalAction, default=None, help="Evaluate all the KPIs in a single request, the option stored with every call if not provided")
+    parser.add_argument("--max-window-tokens", type=int, default=None, help="Evaluate transcripts longer than this many tokens in windows, the option stored with every call if not provided")
+    parser.add_argument("--prescreen-threshold", type=float, default=None, help="Recall threshold of the local KPI pre-screen, 0 disables it, the option stored with every call if not provided")
+    args = parser.parse_args()
+
+    summary = rescore(
+        args.input,
+        output_path=args.output,
+        rubrics_path=args.rubrics,
+        dry_run=args.dry_run,
+        max_concurrency=args.max_concurrency,
+        cache_path=args.cache,
+        fused=args.fused,
+        max_window_tokens=args.max_window_tokens,
+        prescreen_threshold=args.prescreen_threshold
+    )
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
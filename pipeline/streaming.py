@@ -0,0 +1,347 @@
+import argparse
+import json
+import queue
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from pipeline.telemetry import TELEMETRY
+
+SAMPLING_RATE = 16000
+
+
+class StreamingCall:
+    """This class scores a call while it is still in progress: PCM chunks go through incremental VAD, every closed segment is transcribed right away, and the KPIs not satisfied yet are re-evaluated on the running transcript."""
+
+    def __init__(
+        self,
+        pipe,
+        vad_model,
+        call_id: str = "stream",
+        score: bool = True,
+        client=None,
+        cache=None,
+        prescreen=None,
+        reevaluate_seconds: float = 15.0,
+        max_concurrency: int = 8,
+        correction_mode: str = "local",
+        on_update: Optional[Callable[[Dict], None]] = None,
+        sampling_rate: int = SAMPLING_RATE
+    ) -> None:
+        """
+        This function initializes the stream of one call and starts its transcription thread.
+
+        Parameters:
+            - pipe (Pipeline) -> Whisper automatic speech recognition pipeline
+            - vad_model (silero-vad) -> Voice Activity Detection model, used by this stream only since it keeps a state
+            - call_id (str) -> Id of the call in the record and the telemetry
+            - score (bool) -> Correct the segments and evaluate the KPIs, otherwise only transcribe
+            - client (OpenAI | None) -> OpenAI compatible client, OpenAI() if not provided
+            - cache (LLMCache | None) -> On-disk cache of the LLM completions
+            - prescreen (KPIPrescreen | None) -> Local pre-screen that skips the KPIs the running transcript has no evidence for yet
+            - reevaluate_seconds (float) -> Seconds of audio between two evaluations of the unsatisfied KPIs
+            - max_concurrency (int) -> Maximum number of KPI requests in flight at once
+            - correction_mode (str) -> llm, local or hybrid keyword correction of every segment, local adds no request per segment
+            - on_update (Callable | None) -> Called with snapshot() after every evaluation, from the evaluation thread
+            - sampling_rate (int) -> Sampling rate of the chunks
+        """
+        from transcription.streaming_vad import StreamingSegmenter
+
+        self.pipe = pipe
+        self.call_id = call_id
+        self.score = score
+        self.reevaluate_seconds = reevaluate_seconds
+        self.max_concurrency = max_concurrency
+        self.correction_mode = correction_mode
+        self.on_update = on_update
+        self.segmenter = StreamingSegmenter(vad_model, sampling_rate=sampling_rate)
+
+        self.segments: List[Dict] = []
+        self.kpi_scores: Dict[str, Dict] = {}
+        self.kpi_satisfied_at: Dict[str, float] = {}
+        self.evaluations = 0
+
+        self.agents = None
+        if score:
+            from agents.transcript_agents import TranscriptAgents
+
+            if client is None:
+                from openai import OpenAI
+                client = OpenAI()
+            # One instance corrects the segments in the transcription thread, the other evaluates in the evaluation thread
+            self._correction_agents = TranscriptAgents([], "", client=client, cache=cache)
+            self.agents = TranscriptAgents([], "", client=client, cache=cache, prescreen=prescreen)
+
+        self._lock = threading.Lock()
+        self._evaluated_segments = 0
+        self._last_evaluated_at = 0.0
+        self._evaluation = None
+        self._evaluator = ThreadPoolExecutor(max_workers=1)
+
+        # Segments waiting for Whisper, transcribed in order by a single thread since the pipeline is not thread safe
+        self._segment_queue: "queue.Queue[Optional[Dict]]" = queue.Queue()
+        self._transcriber = threading.Thread(target=TELEMETRY.wrap(self._transcribe_segments), daemon=True)
+        self._transcriber.start()
+
+    def feed(self, chunk: np.ndarray) -> None:
+        """
+        This function adds a chunk of PCM to the call. Segments closed by a pause are queued for transcription, so it returns without waiting for Whisper.
+
+        Parameters:
+            - chunk (np.ndarray) -> Mono float32 samples in [-1, 1] of any length
+        """
+        for segment in self.segmenter.feed(chunk):
+            segment["closed_at"] = time.perf_counter()
+            self._segment_queue.put(segment)
+
+    def _transcribe_segments(self) -> None:
+        """This is a helper function that runs in the transcription thread: it transcribes and corrects the segments in order until it receives None."""
+        from transcription.audio_processing import GENERATE_KWARGS
+
+        while True:
+            segment = self._segment_queue.get()
+            if segment is None:
+                return
+
+            try:
+                with TELEMETRY.stage("asr", segments=1):
+                    text = self.pipe(segment["audio"], generate_kwargs=GENERATE_KWARGS)["text"].strip()
+                corrected_text = text
+                if self.score and text:
+                    corrected_text = self._correction_agents.transcript_correction_agent([text], mode=self.correction_mode)
+            except Exception:
+                # A failed segment must not stop the transcription of the rest of the call
+                print(f"Failed segment {segment['start']}-{segment['end']} of {self.call_id}:\n{traceback.format_exc()}", file=sys.stderr)
+                TELEMETRY.record_retry("stream_segment", "failed")
+                continue
+
+            with self._lock:
+                self.segments.append({
+                    "start": segment["start"],
+                    "end": segment["end"],
+                    "text": text,
+                    "corrected_text": corrected_text,
+                    "latency_seconds": round(time.perf_counter() - segment["closed_at"], 3),
+                })
+
+            if self.score and segment["end"] - self._last_evaluated_at >= self.reevaluate_seconds:
+                self._schedule_evaluation(segment["end"])
+
+    def _schedule_evaluation(self, audio_seconds: float) -> None:
+        """
+        This is a helper function that starts an evaluation in the evaluation thread, unless one is still running. A skipped evaluation is picked up after the next segment.
+
+        Parameters:
+            - audio_seconds (float) -> Position in the call the transcript has reached
+        """
+        if self._evaluation is not None and not self._evaluation.done():
+            return
+
+        self._last_evaluated_at = audio_seconds
+        self._evaluation = self._evaluator.submit(TELEMETRY.wrap(self._evaluate, queue="stream_evaluation"))
+
+    def _evaluate(self) -> None:
+        """
+        This is a helper function that evaluates the KPIs not satisfied yet on the running transcript.
+
+        A KPI that passed stays passed, since the transcript only grows. The others are evaluated again on every new evaluation.
+        """
+        with self._lock:
+            segment_count = len(self.segments)
+            if segment_count == self._evaluated_segments:
+                return
+            audio_seconds = self.segments[-1]["end"]
+            transcript = ' '.join([segment["corrected_text"] for segment in self.segments if segment["corrected_text"]])
+            unsatisfied = [kpi_name for kpi_name in self.agents.kpi_names if kpi_name not in self.kpi_satisfied_at]
+
+        if not unsatisfied or not transcript:
+            return
+
+        self.agents.cleaned_corrected_transcripts = transcript
+        results = self.agents.evaluate_all(max_concurrency=self.max_concurrency, kpi_names=unsatisfied)
+
+        with self._lock:
+            self._evaluated_segments = segment_count
+            self.evaluations += 1
+            for kpi_name, result in results.items():
+                self.kpi_scores[kpi_name] = result
+                if result["score"]:
+                    self.kpi_satisfied_at[kpi_name] = audio_seconds
+
+        if self.on_update is not None:
+            self.on_update(self.snapshot())
+
+    def snapshot(self) -> Dict:
+        """
+        This function returns the current state of the call, for a supervisor view.
+
+        Returns:
+            - snapshot (Dict) -> call_id, audio seconds transcribed, segments, evaluations, the KPIs satisfied so far with the second they were satisfied at, and the latest score of every KPI
+        """
+        with self._lock:
+            return {
+                "call_id": self.call_id,
+                "audio_seconds": self.segments[-1]["end"] if self.segments else 0.0,
+                "segments": len(self.segments),
+                "evaluations": self.evaluations,
+                "satisfied": dict(self.kpi_satisfied_at),
+                "kpi_scores": dict(self.kpi_scores),
+            }
+
+    def finish(self) -> Dict:
+        """
+        This function ends the call: the last segment is transcribed and the KPIs not satisfied yet are evaluated on the full transcript.
+
+        Returns:
+            - record (Dict) -> audio_id, segments, transcript, corrected transcript, KPI scores and versions like the batch runner, and the streaming stats
+        """
+        ended_at = time.perf_counter()
+        audio_seconds = self.segmenter.received_seconds
+
+        # 1. Transcribe the rest of the call
+        for segment in self.segmenter.flush():
+            segment["closed_at"] = ended_at
+            self._segment_queue.put(segment)
+        self._segment_queue.put(None)
+        self._transcriber.join()
+
+        record = {
+            "audio_id": self.call_id,
+            "segments": [segment["text"] for segment in self.segments],
+            "transcript": ' '.join([segment["text"] for segment in self.segments if segment["text"]]),
+            "kpi_scores": None,
+        }
+
+        # 2. Final evaluation, after the running one. The evaluation thread is stopped even if it fails
+        try:
+            if self.score:
+                if self._evaluation is not None:
+                    try:
+                        self._evaluation.result()
+                    except Exception:
+                        # The KPIs of a failed evaluation are still unsatisfied, so the final evaluation covers them
+                        print(f"Evaluation of {self.call_id} failed:\n{traceback.format_exc()}", file=sys.stderr)
+                self._evaluate()
+
+                record["corrected_transcript"] = ' '.join([segment["corrected_text"] for segment in self.segments if segment["corrected_text"]])
+                record["kpi_scores"] = {
+                    kpi_name: self.kpi_scores.get(kpi_name, {"score": False, "feedback": "The call has no transcript to evaluate."})
+                    for kpi_name in self.agents.kpi_names
+                }
+                # A KPI satisfied on a part of the call is satisfied on the whole call, so every score is stamped with the full transcript
+                self.agents.cleaned_corrected_transcripts = record["corrected_transcript"]
+                record["kpi_versions"] = self.agents.kpi_stamps()
+                record["kpi_options"] = self.agents.kpi_options
+        finally:
+            self._evaluator.shutdown()
+
+        segment_latencies = [segment["latency_seconds"] for segment in self.segments]
+        record["streaming"] = {
+            "audio_seconds": round(audio_seconds, 3),
+            "evaluations": self.evaluations,
+            "kpi_satisfied_at": dict(self.kpi_satisfied_at),
+            "segment_latency_mean_seconds": round(float(np.mean(segment_latencies)), 3) if segment_latencies else None,
+            "segment_latency_max_seconds": max(segment_latencies) if segment_latencies else None,
+            "seconds_after_end": round(time.perf_counter() - ended_at, 3),
+        }
+
+        return record
+
+
+def replay(file_path: str, call: StreamingCall, speed: float = 1.0, chunk_seconds: float = 0.5) -> Dict:
+    """
+    This function replays a recording into a streaming call in chunks, paced like a live call.
+
+    Parameters:
+        - file_path (str) -> Path of the recording
+        - call (StreamingCall) -> Stream to feed
+        - speed (float) -> Replay speed, 1 is real time, 10 is ten times faster, 0 feeds the chunks without waiting
+        - chunk_seconds (float) -> Duration of a chunk
+
+    Returns:
+        - record (Dict) -> Record returned by call.finish()
+    """
+    from transcription.audio_processing import load_waveform
+
+    waveform = load_waveform(file_path)
+    chunk_samples = max(1, int(chunk_seconds * SAMPLING_RATE))
+
+    start_time = time.perf_counter()
+    for offset in range(0, len(waveform), chunk_samples):
+        chunk = waveform[offset:offset + chunk_samples]
+        if speed > 0:
+            # A chunk is available once its last sample has been spoken
+            time.sleep(max(0.0, start_time + (offset + len(chunk)) / SAMPLING_RATE / speed - time.perf_counter()))
+        call.feed(chunk)
+
+    return call.finish()
+
+
+def main() -> None:
+    """This function is the command line entry point of the streaming mode: it replays a recording as a live call and prints every update."""
+    from pipeline.batch_runner import get_audio_id
+    from transcription.audio_processing import load_models
+
+    parser = argparse.ArgumentParser(description="Score a call while it is in progress, by replaying a recording as a live stream.")
+    parser.add_argument("audio_file", help="Recording to replay")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed, 1 is real time, 0 as fast as possible")
+    parser.add_argument("--chunk-seconds", type=float, default=0.5, help="Duration of a PCM chunk")
+    parser.add_argument("--reevaluate-seconds", type=float, default=15.0, help="Seconds of audio between two evaluations of the unsatisfied KPIs")
+    parser.add_argument("--no-score", action="store_true", help="Only transcribe")
+    parser.add_argument("--correction-mode", choices=["llm", "local", "hybrid"], default="local", help="Keyword correction of every segment")
+    parser.add_argument("--prescreen-threshold", type=float, default=None, help="Skip the KPIs with less than this fraction of their reference points mentioned so far")
+    parser.add_argument("--cache", default=None, help="Path of the SQLite LLM cache")
+    parser.add_argument("--output", default=None, help="JSON file to write the final record to")
+    args = parser.parse_args()
+
+    pipe, vad_model = load_models()
+
+    cache = None
+    if args.cache:
+        from agents.llm_cache import LLMCache
+        cache = LLMCache(args.cache)
+
+    prescreen = None
+    if args.prescreen_threshold is not None:
+        from agents.kpi_prescreen import KPIPrescreen
+        prescreen = KPIPrescreen(recall_threshold=args.prescreen_threshold)
+
+    def print_update(snapshot):
+        print(json.dumps({"audio_seconds": snapshot["audio_seconds"], "evaluations": snapshot["evaluations"], "satisfied": snapshot["satisfied"]}), flush=True)
+
+    audio_id = get_audio_id(args.audio_file)
+    call = StreamingCall(
+        pipe,
+        vad_model,
+        call_id=audio_id,
+        score=not args.no_score,
+        cache=cache,
+        prescreen=prescreen,
+        reevaluate_seconds=args.reevaluate_seconds,
+        correction_mode=args.correction_mode,
+        on_update=print_update
+    )
+
+    try:
+        with TELEMETRY.trace(audio_id):
+            record = replay(args.audio_file, call, speed=args.speed, chunk_seconds=args.chunk_seconds)
+    finally:
+        if cache is not None:
+            cache.close()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump(record, output_file, ensure_ascii=False, indent=2)
+
+    print(json.dumps(record["streaming"], indent=2))
+    for segment in call.segments:
+        print(f"[{segment['start']:.1f}-{segment['end']:.1f}] {segment['corrected_text']}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
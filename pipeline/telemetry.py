@@ -0,0 +1,459 @@
+import bisect
+import contextvars
+import functools
+import json
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+# Upper bounds in seconds of the latency histogram buckets, the last bucket is +Inf
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+# USD per 1M (input, output) tokens, used for cost estimates. Unknown models are counted with zero cost.
+MODEL_PRICES = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-3.5-turbo": (0.50, 1.50),
+}
+
+# Recordings whose spans recorded before their trace started are kept, the oldest are dropped beyond this
+MAX_PENDING_RECORDINGS = 10000
+
+# Trace of the recording the current thread is working on, copied into worker threads by Telemetry.wrap
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("telelyzer_trace", default=None)
+
+
+class Histogram:
+    """This class is a fixed-bucket latency histogram, cheap enough to update on every request."""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        """
+        This function initializes an empty histogram.
+
+        Parameters:
+            - buckets (Tuple[float, ...]) -> Upper bounds of the buckets in seconds, sorted
+        """
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        """This function adds a value to the histogram."""
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """
+        This function estimates a quantile by linear interpolation inside its bucket.
+
+        Parameters:
+            - q (float) -> Quantile between 0 and 1, e.g. 0.95
+
+        Returns:
+            - value (float) -> Estimated quantile in seconds, 0.0 for an empty histogram
+        """
+        if not self.count:
+            return 0.0
+
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else self.max
+                return min(self.max, lower + (upper - lower) * (rank - seen) / bucket_count)
+            seen += bucket_count
+
+        return self.max
+
+    def to_dict(self) -> Dict:
+        """This function returns the summary of the histogram."""
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "mean": round(self.sum / self.count, 6) if self.count else 0.0,
+            "p50": round(self.quantile(0.5), 6),
+            "p95": round(self.quantile(0.95), 6),
+            "max": round(self.max, 6),
+        }
+
+
+class Trace:
+    """This class collects the stage spans of one recording."""
+
+    def __init__(self, trace_id: str, spans: Optional[List[Dict]] = None, partial: bool = False) -> None:
+        """
+        This function starts a trace.
+
+        Parameters:
+            - trace_id (str) -> Id of the recording, e.g. its audio id
+            - spans (List[Dict] | None) -> Spans of the recording recorded before the trace started, e.g. its share of a batched transcription. The trace starts at the first of them
+            - partial (bool) -> Some stages of the recording ran where they could not be traced, e.g. in a worker process or on the model server
+        """
+        self.trace_id = trace_id
+        self.spans: List[Dict] = list(spans or [])
+        self.started_at = min([time.perf_counter()] + [span["start"] for span in self.spans])
+        self.ended_at: Optional[float] = None
+        self.partial = partial
+        self._lock = threading.Lock()
+
+    def add_span(self, stage: str, start: float, end: float, **labels) -> None:
+        """This function records a stage span, times are perf_counter values."""
+        with self._lock:
+            self.spans.append({"stage": stage, "start": start, "end": end, "thread": threading.current_thread().name, **labels})
+
+    def critical_path(self) -> List[Dict]:
+        """
+        This function returns the chain of spans that determined the duration of the recording.
+
+        Starting from the span that ended last, it repeatedly takes the span that ended last before the current one started. Concurrent spans (e.g. the KPI requests) are therefore reduced to the slowest one.
+
+        Returns:
+            - critical_path (List[Dict]) -> Spans of the critical path, in time order
+        """
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span["end"])
+
+        path = []
+        boundary = float("inf")
+        for span in reversed(spans):
+            if span["end"] <= boundary:
+                path.append(span)
+                boundary = span["start"]
+
+        return path[::-1]
+
+    def to_dict(self) -> Dict:
+        """This function returns the trace with times relative to its start, in seconds."""
+        def relative(span):
+            return dict(span, start=round(span["start"] - self.started_at, 6), end=round(span["end"] - self.started_at, 6), seconds=round(span["end"] - span["start"], 6))
+
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span["start"])
+
+        return {
+            "trace_id": self.trace_id,
+            "partial": self.partial,
+            "seconds": round((self.ended_at or time.perf_counter()) - self.started_at, 6),
+            "spans": [relative(span) for span in spans],
+            "critical_path": [relative(span) for span in self.critical_path()],
+        }
+
+
+class Telemetry:
+    """This class aggregates per-stage latencies, LLM token usage and cost, retries and queue waits, and keeps the traces of the last recordings."""
+
+    def __init__(self, max_traces: int = 100) -> None:
+        """
+        This function initializes empty metrics.
+
+        Parameters:
+            - max_traces (int) -> Number of recent recording traces to keep
+        """
+        self.latencies: Dict[str, Histogram] = {}
+        self.queue_waits: Dict[str, Histogram] = {}
+        self.counters: Dict[Tuple[str, ...], float] = {}
+        self.traces: deque = deque(maxlen=max_traces)
+        self.pending_spans: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _increment(self, key: Tuple[str, ...], value: float = 1) -> None:
+        """This is a helper function that adds to a counter, keys are (metric, label values...)."""
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, stage: str, seconds: float, start: Optional[float] = None, **labels) -> None:
+        """
+        This function records the duration of a stage, and adds it to the trace of the current recording.
+
+        Parameters:
+            - stage (str) -> Stage name, e.g. decode, vad, asr, correction, kpi
+            - seconds (float) -> Duration of the stage
+            - start (float | None) -> perf_counter value the stage started at, now - seconds if not provided
+            - labels -> Extra span attributes, e.g. model
+        """
+        with self._lock:
+            histogram = self.latencies.get(stage)
+            if histogram is None:
+                histogram = self.latencies[stage] = Histogram()
+            histogram.observe(seconds)
+
+        trace = _current_trace.get()
+        if trace is not None:
+            end = time.perf_counter() if start is None else start + seconds
+            trace.add_span(stage, end - seconds, end, **labels)
+
+    @contextmanager
+    def stage(self, stage: str, **labels):
+        """
+        This function times the block it wraps as a stage.
+
+        Parameters:
+            - stage (str) -> Stage name
+            - labels -> Extra span attributes
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start, start=start, **labels)
+
+    def timed(self, stage: str) -> Callable:
+        """
+        This function is a decorator that times every call of a function as a stage.
+
+        Parameters:
+            - stage (str) -> Stage name
+
+        Returns:
+            - decorator (Callable) -> Decorator of the function
+        """
+        def decorator(function):
+            @functools.wraps(function)
+            def timed_function(*args, **kwargs):
+                with self.stage(stage):
+                    return function(*args, **kwargs)
+            return timed_function
+
+        return decorator
+
+    def record_usage(self, stage: str, model: str, usage) -> None:
+        """
+        This function records the token usage of a completion and its estimated cost.
+
+        Parameters:
+            - stage (str) -> Stage that sent the request
+            - model (str) -> Model of the request
+            - usage (CompletionUsage | None) -> usage of the completion, ignored if missing
+        """
+        if usage is None:
+            return
+
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+        input_price, output_price = MODEL_PRICES.get(model, (0.0, 0.0))
+
+        self._increment(("llm_requests", stage, model))
+        self._increment(("llm_prompt_tokens", stage, model), prompt_tokens)
+        self._increment(("llm_completion_tokens", stage, model), completion_tokens)
+        self._increment(("llm_cost_usd", stage, model), (prompt_tokens * input_price + completion_tokens * output_price) / 1e6)
+
+    def record_cache_hit(self, stage: str, model: str) -> None:
+        """This function counts an LLM request answered by the cache."""
+        self._increment(("llm_cache_hits", stage, model))
+
+    def record_retry(self, stage: str, reason: str) -> None:
+        """This function counts a retried request of a stage."""
+        self._increment(("retries", stage, reason))
+
+    def record_queue_wait(self, queue: str, seconds: float) -> None:
+        """
+        This function records the time a unit of work waited in a queue before it was processed.
+
+        Parameters:
+            - queue (str) -> Queue name, e.g. rate_limiter, kpi_pool
+            - seconds (float) -> Time spent waiting
+        """
+        with self._lock:
+            histogram = self.queue_waits.get(queue)
+            if histogram is None:
+                histogram = self.queue_waits[queue] = Histogram()
+            histogram.observe(seconds)
+
+    def wrap(self, function: Callable, queue: Optional[str] = None) -> Callable:
+        """
+        This function prepares a callable for a worker thread: it runs in the context of the caller, so its stages land in the same trace, and the time until it starts is recorded as a queue wait.
+
+        Parameters:
+            - function (Callable) -> Function to run in the worker thread
+            - queue (str | None) -> Queue name of the wait, not recorded if not provided
+
+        Returns:
+            - wrapped (Callable) -> Function to submit to the executor
+        """
+        context = contextvars.copy_context()
+        submitted_at = time.perf_counter()
+
+        def wrapped(*args, **kwargs):
+            if queue is not None:
+                self.record_queue_wait(queue, time.perf_counter() - submitted_at)
+            return context.run(function, *args, **kwargs)
+
+        return wrapped
+
+    def add_pending_span(self, key: Hashable, stage: str, start: float, end: float, **labels) -> None:
+        """
+        This function keeps a span of a recording whose trace has not started yet, e.g. the ASR batches a recording was transcribed in with others.
+
+        Parameters:
+            - key (Hashable) -> Key of the recording, e.g. its file path
+            - stage (str) -> Stage name
+            - start (float) -> perf_counter value the span started at
+            - end (float) -> perf_counter value the span ended at
+            - labels -> Extra span attributes
+        """
+        span = {"stage": stage, "start": start, "end": end, "thread": threading.current_thread().name, **labels}
+        with self._lock:
+            self.pending_spans.setdefault(key, []).append(span)
+            self.pending_spans.move_to_end(key)
+            while len(self.pending_spans) > MAX_PENDING_RECORDINGS:
+                self.pending_spans.popitem(last=False)
+
+    def pop_pending_spans(self, key: Hashable) -> List[Dict]:
+        """
+        This function returns and forgets the pending spans of a recording, to start its trace with them.
+
+        Parameters:
+            - key (Hashable) -> Key of the recording
+
+        Returns:
+            - spans (List[Dict]) -> Pending spans of the recording, empty if there are none
+        """
+        with self._lock:
+            return self.pending_spans.pop(key, [])
+
+    @contextmanager
+    def pending(self, key: Hashable):
+        """
+        This function keeps the stages run inside the block as pending spans of a recording, for work done on a recording before its trace starts.
+
+        Parameters:
+            - key (Hashable) -> Key of the recording
+        """
+        trace = Trace(str(key))
+        token = _current_trace.set(trace)
+        try:
+            yield trace
+        finally:
+            _current_trace.reset(token)
+            for span in trace.spans:
+                self.add_pending_span(key, **span)
+
+    @contextmanager
+    def trace(self, trace_id: str, spans: Optional[List[Dict]] = None, partial: bool = False):
+        """
+        This function collects the stages run inside the block, also in worker threads started with wrap, into the trace of a recording.
+
+        Parameters:
+            - trace_id (str) -> Id of the recording
+            - spans (List[Dict] | None) -> Spans of the recording recorded before, see pop_pending_spans
+            - partial (bool) -> Some stages of the recording could not be traced
+        """
+        trace = Trace(trace_id, spans=spans, partial=partial)
+        token = _current_trace.set(trace)
+        try:
+            yield trace
+        finally:
+            _current_trace.reset(token)
+            trace.ended_at = time.perf_counter()
+            self.observe("recording", trace.ended_at - trace.started_at, start=trace.started_at)
+            with self._lock:
+                self.traces.append(trace)
+
+    def to_dict(self, include_traces: bool = True) -> Dict:
+        """
+        This function returns every metric as a JSON serializable dictionary.
+
+        Parameters:
+            - include_traces (bool) -> Include the traces of the recent recordings
+
+        Returns:
+            - metrics (Dict) -> Stage latencies, queue waits, LLM usage and cost per stage and model, retries and traces
+        """
+        with self._lock:
+            latencies = {stage: histogram.to_dict() for stage, histogram in self.latencies.items()}
+            queue_waits = {queue: histogram.to_dict() for queue, histogram in self.queue_waits.items()}
+            counters = dict(self.counters)
+            traces = list(self.traces)
+
+        llm = {}
+        retries = {}
+        for (metric, *labels), value in counters.items():
+            if metric == "retries":
+                retries.setdefault(labels[0], {})[labels[1]] = value
+                continue
+            stage, model = labels
+            llm.setdefault(stage, {}).setdefault(model, {})[metric.replace("llm_", "")] = round(value, 6) if metric == "llm_cost_usd" else int(value)
+
+        metrics = {
+            "stage_seconds": latencies,
+            "queue_wait_seconds": queue_waits,
+            "llm": llm,
+            "total_cost_usd": round(sum([value for (metric, *_), value in counters.items() if metric == "llm_cost_usd"]), 6),
+            "retries": retries,
+        }
+        if include_traces:
+            metrics["traces"] = [trace.to_dict() for trace in traces]
+
+        return metrics
+
+    def to_prometheus(self, prefix: str = "telelyzer") -> str:
+        """
+        This function returns every metric in the Prometheus text exposition format.
+
+        Parameters:
+            - prefix (str) -> Prefix of the metric names
+
+        Returns:
+            - text (str) -> Prometheus metrics
+        """
+        lines = []
+
+        def write_histograms(name, label, histograms, help_text):
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} histogram")
+            for label_value, histogram in sorted(histograms.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(list(histogram.buckets) + ["+Inf"], histogram.counts):
+                    cumulative += bucket_count
+                    lines.append(f'{prefix}_{name}_bucket{{{label}="{label_value}",le="{bound}"}} {cumulative}')
+                lines.append(f'{prefix}_{name}_sum{{{label}="{label_value}"}} {histogram.sum:.6f}')
+                lines.append(f'{prefix}_{name}_count{{{label}="{label_value}"}} {histogram.count}')
+
+        with self._lock:
+            write_histograms("stage_seconds", "stage", self.latencies, "Duration of the pipeline stages")
+            write_histograms("queue_wait_seconds", "queue", self.queue_waits, "Time spent waiting in a queue")
+            counters = dict(self.counters)
+
+        counter_labels = {
+            "llm_requests": ("stage", "model"),
+            "llm_cache_hits": ("stage", "model"),
+            "llm_prompt_tokens": ("stage", "model"),
+            "llm_completion_tokens": ("stage", "model"),
+            "llm_cost_usd": ("stage", "model"),
+            "retries": ("stage", "reason"),
+        }
+        for metric, label_names in counter_labels.items():
+            values = [(labels, value) for (name, *labels), value in counters.items() if name == metric]
+            if not values:
+                continue
+            lines.append(f"# TYPE {prefix}_{metric}_total counter")
+            for labels, value in sorted(values):
+                label_text = ','.join([f'{label_name}="{label_value}"' for label_name, label_value in zip(label_names, labels)])
+                lines.append(f"{prefix}_{metric}_total{{{label_text}}} {value:.10g}")
+
+        return '\n'.join(lines) + '\n'
+
+    def export(self, path: str) -> None:
+        """
+        This function writes the metrics to <path> as JSON and to <path without .json>.prom as Prometheus text.
+
+        Parameters:
+            - path (str) -> Path of the JSON file
+        """
+        with open(path, "w", encoding="utf-8") as metrics_file:
+            json.dump(self.to_dict(), metrics_file, indent=2)
+
+        prometheus_path = (path[:-5] if path.endswith(".json") else path) + ".prom"
+        with open(prometheus_path, "w", encoding="utf-8") as prometheus_file:
+            prometheus_file.write(self.to_prometheus())
+
+
+# Process-wide telemetry used by the pipeline stages
+TELEMETRY = Telemetry()
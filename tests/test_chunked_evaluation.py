@@ -0,0 +1,40 @@
+"""
+Tests of the reduction of the window findings into one KPI result.
+"""
+import pytest
+
+from agents.chunked_evaluation import reduce_window_findings
+
+
+def finding(point, status):
+    return {"point": point, "status": status, "agent_said": "said", "suggested_correction": "correction"}
+
+
+def test_a_point_is_covered_if_any_window_covered_it():
+    window_results = [
+        {"points": [finding("1", "fully covered"), finding("2", "missed")]},
+        {"points": [finding("2.", "fully covered")]},
+    ]
+
+    assert reduce_window_findings(["1", "2"], window_results)["score"] is True
+
+
+def test_invented_points_cannot_pass_a_kpi():
+    window_results = [{"points": [finding("1", "fully covered"), finding("7", "fully covered")]}]
+
+    result = reduce_window_findings(["1", "2"], window_results)
+
+    assert result["score"] is False
+    assert "Point 2: Missed" in result["feedback"]
+    assert "Point 7" not in result["feedback"]
+
+
+def test_invented_points_cannot_fail_a_kpi():
+    window_results = [{"points": [finding("1", "fully covered"), finding("2", "fully covered"), finding("3", "missed")]}]
+
+    assert reduce_window_findings(["1", "2"], window_results) == {"score": True, "feedback": "The agent has covered all points as per the script."}
+
+
+def test_a_script_without_points_is_rejected():
+    with pytest.raises(ValueError):
+        reduce_window_findings([], [{"points": [finding("1", "fully covered")]}])
@@ -0,0 +1,74 @@
+"""
+Tests of the size accounting and eviction of the SQLite LLM cache.
+"""
+import random
+import sqlite3
+
+from agents.llm_cache import LLMCache
+
+
+def stored_size(cache: LLMCache) -> int:
+    return cache._connection.execute("SELECT COALESCE(SUM(size), 0) FROM completions").fetchone()[0]
+
+
+def test_total_size_follows_inserts_replacements_and_evictions(tmp_path):
+    generator = random.Random(0)
+    cache = LLMCache(str(tmp_path / "cache.sqlite3"), max_size_bytes=5000)
+
+    for _ in range(500):
+        key = f"key-{generator.randrange(60)}"
+        if generator.random() < 0.3:
+            cache.get(key)
+        else:
+            cache.set(key, "x" * generator.randint(1, 400))
+
+        assert cache.stats()["size_bytes"] == stored_size(cache) <= 5000
+
+    cache.close()
+
+
+def test_least_recently_used_entries_are_evicted_first(tmp_path):
+    cache = LLMCache(str(tmp_path / "cache.sqlite3"), max_size_bytes=300)
+
+    cache.set("a", "a" * 100)
+    cache.set("b", "b" * 100)
+    cache.set("c", "c" * 100)
+    cache.get("a")
+    cache.set("d", "d" * 100)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "a" * 100
+    assert cache.stats()["size_bytes"] == stored_size(cache) == 300
+
+    cache.close()
+
+
+def test_expired_entries_leave_the_total_size(tmp_path):
+    cache = LLMCache(str(tmp_path / "cache.sqlite3"), max_size_bytes=1000, max_age_seconds=60)
+
+    cache.set("old", "o" * 200)
+    cache._connection.execute("UPDATE completions SET created_at = created_at - 120 WHERE key = 'old'")
+    cache._connection.commit()
+    cache.set("new", "n" * 100)
+
+    assert cache.stats()["size_bytes"] == stored_size(cache) == 100
+
+    cache.close()
+
+
+def test_total_size_of_a_cache_created_before_it_was_tracked(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE completions (key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, created_at REAL NOT NULL, last_accessed REAL NOT NULL)")
+    connection.executemany("INSERT INTO completions VALUES (?, ?, ?, 0, 0)", [("a", "a" * 10, 10), ("b", "b" * 20, 20)])
+    connection.commit()
+    connection.close()
+
+    cache = LLMCache(path)
+    assert cache.stats()["size_bytes"] == 30
+    cache.set("c", "c" * 5)
+    cache.close()
+
+    reopened = LLMCache(path)
+    assert reopened.stats() == {"hits": 0, "misses": 0, "hit_rate": 0.0, "entries": 3, "size_bytes": 35}
+    reopened.close()
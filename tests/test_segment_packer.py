@@ -0,0 +1,79 @@
+"""
+Randomized tests of pack_regions and pack_segments against the previous recursive split_timestamps.
+"""
+import random
+from typing import Dict, List
+
+import pytest
+
+from experiments.benchmark_segment_packer import legacy_pack_segments
+from transcription.segment_packer import MAX_WINDOW_SECONDS, pack_regions, pack_segments
+
+SEEDS = range(300)
+
+
+def random_timestamps(seed: int) -> List[Dict]:
+    """
+    This function generates VAD-like speech regions with the edge cases of real output: touching and overlapping regions, equal gaps and regions longer than a window.
+
+    Parameters:
+        - seed (int) -> Random seed
+
+    Returns:
+        - speech_timestamps (List[Dict]) -> Speech regions in seconds, in order of their start
+    """
+    generator = random.Random(seed)
+
+    timestamps = []
+    position = generator.uniform(0.0, 5.0)
+    for _ in range(generator.randint(0, 400)):
+        start = position + generator.choice([-0.2, 0.0, 0.0, 0.1, 0.5, 0.5, 1.0, 2.5, generator.uniform(0.0, 10.0)])
+        start = max(start, timestamps[-1]["start"] if timestamps else 0.0)
+        end = start + generator.choice([generator.uniform(0.05, 12.0), generator.uniform(0.05, 3.0), generator.uniform(25.0, 60.0)])
+        timestamps.append({"start": round(start, 3), "end": round(end, 3)})
+        position = end
+
+    return timestamps
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_every_region_is_in_exactly_one_window_in_order(seed):
+    timestamps = random_timestamps(seed)
+    max_window = random.Random(seed).choice([MAX_WINDOW_SECONDS, 5.0, 15.0, 60.0])
+
+    window_bounds = pack_regions(timestamps, max_window)
+
+    covered = [index for low, high in window_bounds for index in range(low, high + 1)]
+    assert covered == list(range(len(timestamps)))
+    assert all(low <= high for low, high in window_bounds)
+    assert all(previous[1] < window[0] for previous, window in zip(window_bounds, window_bounds[1:]))
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_windows_fit_unless_they_cannot_be_split(seed):
+    timestamps = random_timestamps(seed)
+    max_window = random.Random(seed).choice([MAX_WINDOW_SECONDS, 5.0, 15.0, 60.0])
+
+    for low, high in pack_regions(timestamps, max_window):
+        if timestamps[high]["end"] - timestamps[low]["start"] <= max_window:
+            continue
+        gaps = [timestamps[index + 1]["start"] - timestamps[index]["end"] for index in range(low, high)]
+        assert all(gap <= 0 for gap in gaps), f"window {low}-{high} is too long but has a gap of {max(gaps)}"
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_same_windows_as_the_recursive_splitter(seed):
+    timestamps = random_timestamps(seed)
+    max_window = random.Random(seed).choice([MAX_WINDOW_SECONDS, 5.0, 15.0, 60.0])
+
+    try:
+        legacy_windows = legacy_pack_segments(timestamps, max_window)
+    except RecursionError:
+        pytest.skip("the recursive splitter hit the recursion limit")
+
+    assert pack_segments(timestamps, max_window) == legacy_windows
+
+
+def test_empty_input():
+    assert pack_regions([]) == []
+    assert pack_segments([]) == []
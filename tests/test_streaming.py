@@ -0,0 +1,147 @@
+"""
+Tests of the streaming replay with a fake Whisper pipeline, an energy-based stand-in for the silero VADIterator and a fake KPI client.
+"""
+import json
+import sys
+import time
+import types
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from agents.kpi_rubrics import load_rubric_registry
+
+SAMPLING_RATE = 16000
+
+# KPI said in each burst of speech of the replayed call, the other KPIs are never mentioned
+SPOKEN_KPIS = load_rubric_registry().names[:4]
+
+
+class EnergyVADIterator:
+    """This class has the interface of silero_vad.VADIterator, but detects speech by the energy of a frame."""
+
+    def __init__(self, model, threshold=0.5, sampling_rate=16000, min_silence_duration_ms=100, speech_pad_ms=30):
+        self.min_silence_samples = sampling_rate * min_silence_duration_ms / 1000
+        self.pad_samples = int(sampling_rate * speech_pad_ms / 1000)
+        self.reset_states()
+
+    def reset_states(self):
+        self.triggered = False
+        self.silence_start = 0
+        self.current_sample = 0
+
+    def __call__(self, frame):
+        frame_start = self.current_sample
+        self.current_sample += len(frame)
+        speech = float(np.sqrt(np.mean(np.square(frame)))) > 0.01
+
+        if speech:
+            self.silence_start = 0
+            if not self.triggered:
+                self.triggered = True
+                return {"start": max(0, frame_start - self.pad_samples)}
+        elif self.triggered:
+            self.silence_start = self.silence_start or frame_start
+            if self.current_sample - self.silence_start >= self.min_silence_samples:
+                self.triggered = False
+                end, self.silence_start = self.silence_start + self.pad_samples, 0
+                return {"end": end}
+
+        return None
+
+
+def fake_pipe(audio, generate_kwargs=None):
+    """This function stands in for the Whisper pipeline: the amplitude of a burst tells which KPI was said in it."""
+    return {"text": SPOKEN_KPIS[int(round(float(np.max(np.abs(audio))) / 0.1)) - 1]}
+
+
+def call_waveform():
+    """This function builds a call of silence and one burst of speech per spoken KPI, each burst louder than the previous one."""
+    parts = [np.zeros(int(0.5 * SAMPLING_RATE), dtype=np.float32)]
+    for index in range(len(SPOKEN_KPIS)):
+        tone = 0.1 * (index + 1) * np.sin(np.arange(int(0.4 * SAMPLING_RATE)) * 2 * np.pi * 220 / SAMPLING_RATE)
+        parts += [tone.astype(np.float32), np.zeros(int(0.8 * SAMPLING_RATE), dtype=np.float32)]
+
+    return np.concatenate(parts)
+
+
+class FakeKPIClient:
+    """This class mimics client.beta.chat.completions.parse for the KPI requests: a KPI passes once its name is in the transcript."""
+
+    def __init__(self):
+        self.kpi_by_suffix = {suffix: kpi_name for kpi_name, suffix in load_rubric_registry().prompt_suffixes.items()}
+        self.beta = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(parse=self.parse)))
+
+    def parse(self, model, temperature, messages, response_format=None):
+        time.sleep(0.02)
+        kpi_name = self.kpi_by_suffix[messages[2]["content"]]
+        covered = kpi_name in messages[1]["content"].split()
+        content = {"score": covered, "feedback": "covered" if covered else "missing"}
+
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=json.dumps(content)))], usage=None)
+
+
+@pytest.fixture
+def streaming(monkeypatch, tmp_path):
+    """This fixture imports the streaming modules with stub torch and silero_vad modules, and removes them again after the test."""
+    torch = types.ModuleType("torch")
+    torch.from_numpy = lambda array: array
+    silero_vad = types.ModuleType("silero_vad")
+    silero_vad.VADIterator = EnergyVADIterator
+    silero_vad.load_silero_vad = lambda: None
+    silero_vad.get_speech_timestamps = None
+
+    modules_before = set(sys.modules)
+    monkeypatch.setitem(sys.modules, "torch", torch)
+    monkeypatch.setitem(sys.modules, "silero_vad", silero_vad)
+
+    import agents.transcript_agents
+    import pipeline.streaming
+    import transcription.audio_processing
+
+    keywords_path = tmp_path / "keywords.txt"
+    keywords_path.write_text("Choice Finx\n", encoding="utf-8")
+    monkeypatch.setattr(agents.transcript_agents, "DEFAULT_KEYWORDS_PATH", str(keywords_path))
+    monkeypatch.setattr(transcription.audio_processing, "load_waveform", lambda file_path: call_waveform())
+
+    yield pipeline.streaming
+
+    for name in set(sys.modules) - modules_before:
+        if name.startswith("transcription.") or name in ("torch", "silero_vad"):
+            sys.modules.pop(name, None)
+
+
+def replay_call(streaming, speed):
+    call = streaming.StreamingCall(fake_pipe, None, call_id="call.mp3", client=FakeKPIClient(), reevaluate_seconds=0.5)
+    record = streaming.replay("call.mp3", call, speed=speed, chunk_seconds=0.25)
+
+    return call, record
+
+
+def test_replay_gives_the_same_record_at_any_speed(streaming):
+    _, real_time_record = replay_call(streaming, speed=1.0)
+    _, fast_record = replay_call(streaming, speed=10.0)
+
+    assert real_time_record["segments"] == fast_record["segments"] == SPOKEN_KPIS
+    assert real_time_record["kpi_scores"] == fast_record["kpi_scores"]
+    assert real_time_record["kpi_versions"] == fast_record["kpi_versions"]
+    assert real_time_record["kpi_scores"] == {
+        kpi_name: {"score": kpi_name in SPOKEN_KPIS, "feedback": "covered" if kpi_name in SPOKEN_KPIS else "missing"}
+        for kpi_name in load_rubric_registry().names
+    }
+    assert real_time_record["streaming"]["audio_seconds"] == fast_record["streaming"]["audio_seconds"] == round(len(call_waveform()) / SAMPLING_RATE, 3)
+
+    # In real time the KPIs are evaluated while the call is in progress, each one satisfied after the segment it was said in
+    satisfied_at = real_time_record["streaming"]["kpi_satisfied_at"]
+    assert real_time_record["streaming"]["evaluations"] > 1
+    assert set(satisfied_at) == set(SPOKEN_KPIS)
+    assert [satisfied_at[kpi_name] for kpi_name in SPOKEN_KPIS] == sorted(satisfied_at.values())
+
+
+def test_finish_stops_the_transcription_thread_and_the_evaluator(streaming):
+    call, _ = replay_call(streaming, speed=10.0)
+
+    assert not call._transcriber.is_alive()
+    with pytest.raises(RuntimeError):
+        call._evaluator.submit(lambda: None)
@@ -0,0 +1,118 @@
+"""
+Tests of the concurrent and fused KPI evaluation of TranscriptAgents with a fake client that injects latency.
+"""
+import json
+import random
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from agents.transcript_agents import TranscriptAgents, text_hash
+
+TRANSCRIPT = "Namaste sir, Choice Finx app se aap MTF aur mutual funds mein invest kar sakte hain, brokerage zero hai."
+
+
+class FakeClient:
+    """This class mimics client.beta.chat.completions.parse, sleeping for a random latency and counting the requests in flight."""
+
+    def __init__(self, seed: int = 0, max_latency: float = 0.03) -> None:
+        self.generator = random.Random(seed)
+        self.max_latency = max_latency
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.requests = []
+        self.beta = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(parse=self.parse)))
+
+    def parse(self, model, temperature, messages, response_format=None):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            self.requests.append({"model": model, "messages": messages, "response_format": response_format})
+            latency = self.generator.uniform(0.0, self.max_latency)
+
+        try:
+            time.sleep(latency)
+            # The answer only depends on the request, so every evaluation order gets the same results
+            digest = text_hash(json.dumps(messages))
+            fields = list(response_format.model_fields)
+            if fields == ["score", "feedback"]:
+                content = {"score": int(digest, 16) % 2 == 0, "feedback": digest}
+            else:
+                content = {field: {"score": int(digest, 16) % 2 == 0, "feedback": f"{field} {digest}"} for field in fields}
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=json.dumps(content)))], usage=None)
+
+
+def make_agents(client: FakeClient) -> TranscriptAgents:
+    agents = TranscriptAgents([TRANSCRIPT], TRANSCRIPT, client=client, keywords=[])
+    agents.cleaned_corrected_transcripts = TRANSCRIPT
+
+    return agents
+
+
+@pytest.mark.parametrize("max_concurrency", [1, 2, 3, 8])
+def test_evaluate_all_matches_sequential_evaluate(max_concurrency):
+    sequential_agents = make_agents(FakeClient())
+    expected = {kpi_name: sequential_agents.evaluate(kpi_name) for kpi_name in sequential_agents.kpi_names}
+
+    client = FakeClient(seed=max_concurrency)
+    agents = make_agents(client)
+    results = agents.evaluate_all(max_concurrency=max_concurrency)
+
+    assert results == expected
+    assert list(results) == agents.kpi_names
+    assert len(client.requests) == len(agents.kpi_names)
+    assert client.max_in_flight <= max_concurrency
+    assert {kpi_name: getattr(agents, kpi_name) for kpi_name in agents.kpi_names} == expected
+
+
+def test_evaluate_all_runs_requests_concurrently():
+    client = FakeClient(max_latency=0.05)
+    agents = make_agents(client)
+
+    agents.evaluate_all(max_concurrency=4)
+
+    assert 1 < client.max_in_flight <= 4
+
+
+def test_evaluate_all_only_evaluates_the_requested_kpis():
+    client = FakeClient()
+    agents = make_agents(client)
+    kpi_names = agents.kpi_names[2:5]
+
+    results = agents.evaluate_all(kpi_names=kpi_names)
+
+    assert list(results) == kpi_names
+    assert len(client.requests) == len(kpi_names)
+    assert set(agents.kpi_modes) == set(kpi_names)
+
+
+def test_fused_evaluation_only_checks_the_requested_kpis():
+    client = FakeClient()
+    agents = make_agents(client)
+    kpi_names = agents.kpi_names[1:4]
+
+    results = agents.evaluate_all(fused=True, kpi_names=kpi_names)
+
+    assert list(results) == kpi_names
+    assert len(client.requests) == 1
+    assert list(client.requests[0]["response_format"].model_fields) == kpi_names
+    assert all(f"Reference Script: {kpi_name} ---" in client.requests[0]["messages"][0]["content"] for kpi_name in kpi_names)
+    assert f"Reference Script: {agents.kpi_names[0]} ---" not in client.requests[0]["messages"][0]["content"]
+    assert agents.kpi_modes == {kpi_name: "fused" for kpi_name in kpi_names}
+
+
+def test_fused_evaluation_checks_every_kpi_by_default():
+    client = FakeClient()
+    agents = make_agents(client)
+
+    results = agents.evaluate_all(fused=True)
+
+    assert list(results) == agents.kpi_names
+    assert list(client.requests[0]["response_format"].model_fields) == agents.kpi_names
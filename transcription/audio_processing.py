@@ -0,0 +1,205 @@
+import subprocess
+import threading
+from typing import List, Union
+
+import numpy as np
+from silero_vad import load_silero_vad, get_speech_timestamps
+
+from pipeline.telemetry import TELEMETRY
+from transcription.pcm_cache import get_pcm_cache
+from transcription.segment_packer import MAX_WINDOW_SECONDS, pack_segments
+
+WHISPER_MODEL_ID = "openai/whisper-large-v3"
+
+# Whisper and silero VAD both work on 16 kHz mono audio, so every recording is decoded once at this rate.
+SAMPLING_RATE = 16000
+
+# Generation settings used for every Whisper segment: translate from Hindi with temperature fallback.
+GENERATE_KWARGS = {
+    # "max_new_tokens": 445,
+    "language": "hindi", 
+    "task": "translate",
+    "num_beams": 1,
+    "condition_on_prev_tokens": True,
+    "compression_ratio_threshold": 1.35,  # zlib compression ratio threshold (in token space)
+    "temperature": (0.0, 0.2, 0.4, 0.6, 0.8, 1.0),
+    "logprob_threshold": -1.0,
+    "no_speech_threshold": 0.6,
+    "return_timestamps": True,
+}
+
+
+def load_models(model_id: str = WHISPER_MODEL_ID):
+    """
+    This function loads the Whisper ASR pipeline and the Silero VAD model.
+
+    Parameters:
+        - model_id (str) -> Whisper model to load
+
+    Returns:
+        - pipe (Pipeline) -> Hugging Face automatic speech recognition pipeline
+        - vad_model (silero-vad) -> Voice Activity Detection model
+    """
+    import torch
+    from transformers import AutoModelForSpeechSeq2Seq, AutoProcessor, pipeline
+
+    # Set up device and data types
+    device = "cuda:0" if torch.cuda.is_available() else "cpu"
+    torch_dtype = torch.float16 if torch.cuda.is_available() else torch.float32
+
+    # Load model and processor
+    model = AutoModelForSpeechSeq2Seq.from_pretrained(
+        model_id, torch_dtype=torch_dtype, low_cpu_mem_usage=True, use_safetensors=True
+    )
+    model.to(device)
+    processor = AutoProcessor.from_pretrained(model_id)
+
+    # Create ASR pipeline
+    pipe = pipeline(
+        "automatic-speech-recognition",
+        model=model,
+        tokenizer=processor.tokenizer,
+        feature_extractor=processor.feature_extractor,
+        torch_dtype=torch_dtype,
+        device=0 if torch.cuda.is_available() else -1,
+    )
+
+    vad_model = load_silero_vad()
+
+    return pipe, vad_model
+
+
+@TELEMETRY.timed("decode")
+def decode_audio(audio_file: Union[str, bytes], sampling_rate: int = SAMPLING_RATE) -> np.ndarray:
+    """
+    This function decodes an audio file once with ffmpeg into a mono float32 waveform, which is shared by VAD and Whisper.
+
+    Parameters:
+        - audio_file (str | bytes) -> Path of the audio file, or its encoded bytes
+        - sampling_rate (int) -> Sampling rate to resample to
+
+    Returns:
+        - waveform (np.ndarray) -> Mono float32 samples in [-1, 1]
+    """
+    from_bytes = isinstance(audio_file, (bytes, bytearray))
+    command = [
+        "ffmpeg", "-v", "error",
+        "-i", "pipe:0" if from_bytes else str(audio_file),
+        "-f", "f32le", "-acodec", "pcm_f32le", "-ac", "1", "-ar", str(sampling_rate),
+        "pipe:1"
+    ]
+
+    process = subprocess.Popen(
+        command, 
+        stdin=subprocess.PIPE if from_bytes else subprocess.DEVNULL, 
+        stdout=subprocess.PIPE, 
+        stderr=subprocess.PIPE
+    )
+    if from_bytes:
+        def write_input():
+            process.stdin.write(audio_file)
+            process.stdin.close()
+
+        # Feed the input from a thread so a full stdout pipe cannot block the write.
+        writer = threading.Thread(target=write_input)
+        writer.start()
+
+    # Read into a single growing buffer so the samples are writable without an extra copy.
+    pcm = bytearray()
+    while True:
+        chunk = process.stdout.read(1 << 20)
+        if not chunk:
+            break
+        pcm += chunk
+
+    if from_bytes:
+        writer.join()
+    stderr = process.stderr.read()
+    if process.wait() != 0:
+        raise RuntimeError(f"ffmpeg failed to decode the audio: {stderr.decode(errors='ignore').strip()}")
+
+    return np.frombuffer(pcm, dtype=np.float32, count=len(pcm) // 4)
+
+
+def load_waveform(file_path: str) -> np.ndarray:
+    """
+    This function returns the decoded waveform of a recording, from the PCM cache if one is configured with $TELELYZER_PCM_CACHE.
+
+    Parameters:
+        - file_path (str) -> Path of the recording
+
+    Returns:
+        - waveform (np.ndarray) -> Mono float32 samples in [-1, 1] at SAMPLING_RATE
+    """
+    pcm_cache = get_pcm_cache()
+    if pcm_cache is None:
+        return decode_audio(file_path)
+
+    with TELEMETRY.stage("load_pcm"):
+        return pcm_cache.load(file_path)
+
+
+@TELEMETRY.timed("vad")
+def _split_audio(waveform: np.ndarray, vad_model, sampling_rate: int = SAMPLING_RATE, max_window: float = MAX_WINDOW_SECONDS) -> List[np.ndarray]:
+    """
+    This is a helper function that takes a decoded waveform and splits it into segments based on VAD
+
+    Parameters:
+        - waveform (np.ndarray) -> Mono float32 waveform returned by decode_audio or load_waveform
+        - vad_model (silero-vad) -> Voice Activity Detection model to analyze the audio.
+        - sampling_rate (int) -> Sampling rate of the waveform
+        - max_window (float) -> Maximum duration of a segment in seconds
+
+    Returns:
+        - audio_segments (List[np.ndarray]) -> List of audio segments, as views of the waveform (no copy). 
+
+    TODO: 
+    1. You can try to ceil or floor the timestamps to nearest integer but there could be a problem in recognizing audio if it merges with some random sound or previous syllable. 
+    2. Change from mono to stereo if stereo sound is provided
+    """
+    import torch
+
+    # 1. Get speech timestamps from the vad model 
+    speech_timestamps = get_speech_timestamps(
+        torch.from_numpy(waveform), 
+        vad_model, 
+        sampling_rate=sampling_rate, 
+        return_seconds=True
+    )
+
+    # 2. Pack the speech timestamps into windows
+    windows = pack_segments(speech_timestamps, max_window)
+
+    # 3. Slice the windows out of the waveform
+    return [
+        waveform[window['start'] * sampling_rate:window['end'] * sampling_rate]
+        for window in windows
+    ]
+
+
+def single_file_testing(file_path: str, pipe, vad_model) -> List:
+    """
+    This function splits a recording into segments with VAD and transcribes every segment with Whisper.
+
+    Parameters:
+        - file_path (str) -> Path of the recording
+        - pipe (Pipeline) -> Whisper automatic speech recognition pipeline
+        - vad_model (silero-vad) -> Voice Activity Detection model
+
+    Returns:
+        - raw_transcripts (List) -> Transcript of every segment, in order
+    """
+    # 1. Decode the audio once at 16 kHz, or read it from the PCM cache
+    waveform = load_waveform(file_path)
+
+    # 2. Apply Voice Activity Detection (VAD) and split the waveform into segments
+    audio_segments = _split_audio(waveform, vad_model)
+
+    # 3. Transcribe each audio segment
+    raw_transcripts = []
+    with TELEMETRY.stage("asr", segments=len(audio_segments)):
+        for segment in audio_segments:
+            result = pipe(segment, generate_kwargs=GENERATE_KWARGS)
+            raw_transcripts.append(result["text"])
+
+    return raw_transcripts
@@ -0,0 +1,143 @@
+import time
+from typing import Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+from pipeline.telemetry import TELEMETRY
+from transcription.audio_processing import GENERATE_KWARGS, SAMPLING_RATE, _split_audio, load_waveform
+
+
+class BatchedTranscriber:
+    """This class collects segments from many recordings, groups them into length buckets and transcribes them in batches with the Whisper pipeline."""
+
+    def __init__(
+        self,
+        pipe,
+        batch_size: int = 8,
+        bucket_seconds: float = 5.0,
+        sampling_rate: int = SAMPLING_RATE,
+        generate_kwargs: Optional[Dict] = None
+    ) -> None:
+        """
+        This function initializes the batched transcriber.
+
+        Parameters:
+            - pipe (Pipeline) -> Whisper automatic speech recognition pipeline
+            - batch_size (int) -> Number of segments per forward pass
+            - bucket_seconds (float) -> Width of a length bucket, segments in a batch differ by less than this
+            - sampling_rate (int) -> Sampling rate of the segments
+            - generate_kwargs (Dict | None) -> Whisper generation settings, GENERATE_KWARGS if not provided
+        """
+        self.pipe = pipe
+        self.batch_size = batch_size
+        self.bucket_seconds = bucket_seconds
+        self.sampling_rate = sampling_rate
+        self.generate_kwargs = GENERATE_KWARGS if generate_kwargs is None else generate_kwargs
+
+        self.segments: List[Tuple[Hashable, int, np.ndarray]] = []
+        self.stats = {"segments": 0, "batches": 0, "audio_seconds": 0.0, "wall_seconds": 0.0, "audio_seconds_per_wall_second": 0.0}
+
+    def add(self, audio_id: Hashable, audio_segments: List[np.ndarray]) -> None:
+        """
+        This function queues the segments of a recording for transcription.
+
+        Parameters:
+            - audio_id (Hashable) -> Audio id of the recording
+            - audio_segments (List[np.ndarray]) -> Segments of the recording, in order
+        """
+        for segment_index, segment in enumerate(audio_segments):
+            self.segments.append((audio_id, segment_index, segment))
+
+    def _batches(self) -> List[List[Tuple[Hashable, int, np.ndarray]]]:
+        """
+        This is a helper function that sorts the queued segments by length and cuts them into batches that never span two length buckets.
+
+        Returns:
+            - batches (List[List[Tuple]]) -> (audio_id, segment_index, segment) of every batch
+        """
+        bucket_samples = max(1, int(self.bucket_seconds * self.sampling_rate))
+        ordered_segments = sorted(self.segments, key=lambda item: len(item[2]))
+
+        batches = []
+        current_bucket = None
+        for item in ordered_segments:
+            bucket = len(item[2]) // bucket_samples
+            if bucket != current_bucket or len(batches[-1]) >= self.batch_size:
+                batches.append([])
+                current_bucket = bucket
+            batches[-1].append(item)
+
+        return batches
+
+    def run(self) -> Dict[Hashable, List[str]]:
+        """
+        This function transcribes every queued segment and maps the transcripts back to their recording and segment index.
+
+        Returns:
+            - raw_transcripts (Dict[Hashable, List[str]]) -> Audio id to the transcript of every segment, in order
+        """
+        transcripts: Dict[Hashable, Dict[int, str]] = {}
+        for audio_id, _, _ in self.segments:
+            transcripts.setdefault(audio_id, {})
+
+        start_time = time.perf_counter()
+        batches = self._batches()
+        for batch in batches:
+            batch_start = time.perf_counter()
+            with TELEMETRY.stage("asr", segments=len(batch)):
+                results = self.pipe(
+                    [segment for _, _, segment in batch],
+                    batch_size=len(batch),
+                    generate_kwargs=self.generate_kwargs
+                )
+            batch_end = time.perf_counter()
+            for (audio_id, segment_index, _), result in zip(batch, results):
+                transcripts[audio_id][segment_index] = result["text"]
+
+            # The batch is a span of every recording in it, picked up when the trace of the recording starts
+            batch_audio_ids = [audio_id for audio_id, _, _ in batch]
+            for audio_id in dict.fromkeys(batch_audio_ids):
+                TELEMETRY.add_pending_span(audio_id, "asr", batch_start, batch_end, segments=batch_audio_ids.count(audio_id), batch_segments=len(batch))
+        wall_seconds = time.perf_counter() - start_time
+
+        audio_seconds = sum([len(segment) for _, _, segment in self.segments]) / self.sampling_rate
+        self.stats = {
+            "segments": len(self.segments),
+            "batches": len(batches),
+            "audio_seconds": round(audio_seconds, 2),
+            "wall_seconds": round(wall_seconds, 3),
+            "audio_seconds_per_wall_second": round(audio_seconds / wall_seconds, 2) if wall_seconds else 0.0,
+        }
+        self.segments = []
+
+        return {
+            audio_id: [segment_transcripts[index] for index in range(len(segment_transcripts))]
+            for audio_id, segment_transcripts in transcripts.items()
+        }
+
+
+def transcribe_recordings(file_paths: List[str], pipe, vad_model, batch_size: int = 8, bucket_seconds: float = 5.0) -> Tuple[Dict[str, List[str]], Dict]:
+    """
+    This function decodes and segments a group of recordings, then transcribes all their segments together in length-bucketed batches.
+
+    Parameters:
+        - file_paths (List[str]) -> Paths of the recordings
+        - pipe (Pipeline) -> Whisper automatic speech recognition pipeline
+        - vad_model (silero-vad) -> Voice Activity Detection model
+        - batch_size (int) -> Number of segments per forward pass
+        - bucket_seconds (float) -> Width of a length bucket in seconds
+
+    Returns:
+        - raw_transcripts (Dict[str, List[str]]) -> File path to the transcript of every segment, in order
+        - stats (Dict) -> Segments, batches and throughput in audio-seconds per wall-second
+    """
+    transcriber = BatchedTranscriber(pipe, batch_size=batch_size, bucket_seconds=bucket_seconds)
+
+    for file_path in file_paths:
+        with TELEMETRY.pending(file_path):
+            transcriber.add(file_path, _split_audio(load_waveform(file_path), vad_model))
+
+    raw_transcripts = transcriber.run()
+
+    # Recordings without speech have no segments
+    return {file_path: raw_transcripts.get(file_path, []) for file_path in file_paths}, transcriber.stats
@@ -0,0 +1,333 @@
+import argparse
+import ipaddress
+import os
+import secrets
+import stat
+import queue
+import threading
+import time
+import traceback
+from concurrent.futures import Future
+from multiprocessing.connection import Client, Listener
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_ADDRESS = ("127.0.0.1", 6001)
+
+# Requests are unpickled, so the key is what keeps other users and hosts from running code in the server. There is no built-in key:
+# it comes from the environment, or from a file only the owner can read, generated by the first server started.
+AUTHKEY_ENV = "TELELYZER_MODEL_SERVER_KEY"
+DEFAULT_AUTHKEY_PATH = os.path.join(os.path.expanduser("~"), ".telelyzer", "model_server.key")
+
+
+def load_authkey(authkey_path: str = DEFAULT_AUTHKEY_PATH, create: bool = False) -> bytes:
+    """
+    This function returns the shared key of the model server: $TELELYZER_MODEL_SERVER_KEY if set, otherwise the content of the key file.
+
+    Parameters:
+        - authkey_path (str) -> Key file, readable by its owner only
+        - create (bool) -> Generate a random key file if there is neither a variable nor a file (server side)
+
+    Returns:
+        - authkey (bytes) -> Shared key
+    """
+    if os.environ.get(AUTHKEY_ENV):
+        return os.environ[AUTHKEY_ENV].encode("utf-8")
+
+    if not os.path.exists(authkey_path):
+        if not create:
+            raise RuntimeError(f"No model server key: set ${AUTHKEY_ENV} or start the server once to create {authkey_path}")
+
+        os.makedirs(os.path.dirname(authkey_path), mode=0o700, exist_ok=True)
+        # O_EXCL so two servers started together cannot overwrite each other's key
+        descriptor = os.open(authkey_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(descriptor, "w", encoding="utf-8") as authkey_file:
+            authkey_file.write(secrets.token_hex(32))
+        print(f"Generated a model server key in {authkey_path}")
+
+    if os.stat(authkey_path).st_mode & (stat.S_IRWXG | stat.S_IRWXO):
+        raise PermissionError(f"{authkey_path} is readable by other users, run chmod 600 {authkey_path}")
+
+    with open(authkey_path, "r", encoding="utf-8") as authkey_file:
+        authkey = authkey_file.read().strip().encode("utf-8")
+    if not authkey:
+        raise RuntimeError(f"The model server key file {authkey_path} is empty")
+
+    return authkey
+
+
+def is_loopback(host: str) -> bool:
+    """
+    This function tells if a host only accepts connections from this machine.
+
+    Parameters:
+        - host (str) -> Host name or IP address
+
+    Returns:
+        - loopback (bool) -> True for localhost and loopback addresses
+    """
+    if host == "localhost":
+        return True
+
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+class ModelServer:
+    """This class is a long-lived local worker that keeps Whisper and silero VAD loaded and serves transcription jobs over a local socket."""
+
+    def __init__(self, address: Tuple[str, int] = DEFAULT_ADDRESS, authkey: Optional[bytes] = None, batch_size: int = 8) -> None:
+        """
+        This function initializes the server. The models are loaded by serve_forever.
+
+        Parameters:
+            - address (Tuple[str, int]) -> Host and port to listen on
+            - authkey (bytes | None) -> Shared key clients have to authenticate with, load_authkey(create=True) if not provided
+            - batch_size (int) -> Segments per Whisper forward pass for multi-recording jobs
+        """
+        self.address = address
+        self.authkey = authkey if authkey is not None else load_authkey(create=True)
+        if not self.authkey:
+            raise ValueError("The model server refuses to start without a key")
+        self.batch_size = batch_size
+
+        self.pipe = None
+        self.vad_model = None
+        self.ready = False
+        self.started_at = time.time()
+        self.processed_recordings = 0
+
+        # (file_paths, future) of every job waiting for the models, served one at a time
+        self._jobs: "queue.Queue[Tuple[List[str], Future]]" = queue.Queue()
+        self._pending_recordings = 0
+        self._lock = threading.Lock()
+
+    def status(self) -> Dict:
+        """
+        This function returns the readiness and load of the server.
+
+        Returns:
+            - status (Dict) -> ready flag, jobs and recordings waiting, recordings processed and uptime
+        """
+        with self._lock:
+            pending_recordings = self._pending_recordings
+
+        return {
+            "ready": self.ready,
+            "queue_depth": self._jobs.qsize(),
+            "pending_recordings": pending_recordings,
+            "processed_recordings": self.processed_recordings,
+            "uptime_seconds": round(time.time() - self.started_at, 1),
+        }
+
+    def _transcribe(self, file_paths: List[str]) -> Dict[str, List[str]]:
+        """
+        This is a helper function that transcribes a job with the resident models.
+
+        Parameters:
+            - file_paths (List[str]) -> Paths of the recordings
+
+        Returns:
+            - raw_transcripts (Dict[str, List[str]]) -> File path to the transcript of every segment, in order
+        """
+        from pipeline.telemetry import TELEMETRY
+        from transcription.batched_transcription import transcribe_recordings
+
+        # A single recording is batched too, its segments share the forward passes
+        raw_transcripts, _ = transcribe_recordings(file_paths, self.pipe, self.vad_model, batch_size=self.batch_size)
+        # The calls are traced by the client, the spans kept for their traces are not needed here
+        for file_path in file_paths:
+            TELEMETRY.pop_pending_spans(file_path)
+
+        return raw_transcripts
+
+    def _run_jobs(self) -> None:
+        """This is a helper function that runs the queued jobs one after another, since the models are shared."""
+        while True:
+            file_paths, future = self._jobs.get()
+            try:
+                future.set_result(self._transcribe(file_paths))
+            except Exception:
+                future.set_exception(RuntimeError(traceback.format_exc()))
+            finally:
+                with self._lock:
+                    self._pending_recordings -= len(file_paths)
+                    self.processed_recordings += len(file_paths)
+
+    def _handle_connection(self, connection) -> None:
+        """
+        This is a helper function that answers the requests of one client connection.
+
+        Parameters:
+            - connection (Connection) -> Authenticated client connection
+        """
+        with connection:
+            try:
+                request = connection.recv()
+            except EOFError:
+                return
+
+            if request.get("op") == "status":
+                connection.send({"result": self.status()})
+                return
+
+            if request.get("op") != "transcribe":
+                connection.send({"error": f"Unknown operation: {request.get('op')}"})
+                return
+
+            file_paths = [os.path.abspath(file_path) for file_path in request["paths"]]
+            future = Future()
+            with self._lock:
+                self._pending_recordings += len(file_paths)
+            self._jobs.put((file_paths, future))
+
+            try:
+                raw_transcripts = future.result()
+                connection.send({"result": [raw_transcripts[file_path] for file_path in file_paths]})
+            except Exception as error:
+                connection.send({"error": str(error)})
+
+    def serve_forever(self) -> None:
+        """
+        This function starts listening, loads the models and serves requests until the process is stopped.
+
+        The socket accepts status requests while the models are loading, so clients can wait for readiness.
+        """
+        listener = Listener(self.address, authkey=self.authkey)
+
+        def accept_connections():
+            while True:
+                try:
+                    connection = listener.accept()
+                except Exception:
+                    # Failed authentication or a client that disconnected during the handshake
+                    continue
+                threading.Thread(target=self._handle_connection, args=(connection,), daemon=True).start()
+
+        threading.Thread(target=accept_connections, daemon=True).start()
+        print(f"Model server listening on {self.address[0]}:{self.address[1]}, loading models...")
+
+        from transcription.audio_processing import load_models
+        self.pipe, self.vad_model = load_models()
+        self.ready = True
+        print(f"Models loaded in {time.time() - self.started_at:.1f}s")
+
+        self._run_jobs()
+
+
+class ModelServerClient:
+    """This class is the client of the ModelServer. Every call opens a short-lived connection to the server."""
+
+    def __init__(self, address: Tuple[str, int] = DEFAULT_ADDRESS, authkey: Optional[bytes] = None) -> None:
+        """
+        This function initializes the client.
+
+        Parameters:
+            - address (Tuple[str, int]) -> Host and port of the server
+            - authkey (bytes | None) -> Shared key of the server, load_authkey() if not provided
+        """
+        self.address = address
+        self.authkey = authkey if authkey is not None else load_authkey()
+
+    def _request(self, request: Dict):
+        """
+        This is a helper function that sends a request and waits for its response.
+
+        Parameters:
+            - request (Dict) -> Request with an op key
+
+        Returns:
+            - result -> Result of the request
+        """
+        with Client(self.address, authkey=self.authkey) as connection:
+            connection.send(request)
+            response = connection.recv()
+
+        if "error" in response:
+            raise RuntimeError(f"Model server error: {response['error']}")
+
+        return response["result"]
+
+    def status(self) -> Dict:
+        """
+        This function returns the readiness and queue depth of the server.
+
+        Returns:
+            - status (Dict) -> ready flag, jobs and recordings waiting, recordings processed and uptime
+        """
+        return self._request({"op": "status"})
+
+    def wait_until_ready(self, timeout: Optional[float] = None, poll_seconds: float = 1.0) -> Dict:
+        """
+        This function waits until the server is reachable and its models are loaded.
+
+        Parameters:
+            - timeout (float | None) -> Maximum seconds to wait, None to wait forever
+            - poll_seconds (float) -> Seconds between two status requests
+
+        Returns:
+            - status (Dict) -> Status of the ready server
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            try:
+                status = self.status()
+                if status["ready"]:
+                    return status
+            except ConnectionError:
+                pass
+
+            if deadline is not None and time.monotonic() > deadline:
+                raise TimeoutError(f"Model server at {self.address[0]}:{self.address[1]} is not ready after {timeout}s")
+            time.sleep(poll_seconds)
+
+    def transcribe(self, path: str) -> List[str]:
+        """
+        This function transcribes one recording on the server.
+
+        Parameters:
+            - path (str) -> Path of the recording, readable by the server
+
+        Returns:
+            - raw_transcripts (List[str]) -> Transcript of every segment, in order
+        """
+        return self.transcribe_many([path])[0]
+
+    def transcribe_many(self, paths: List[str]) -> List[List[str]]:
+        """
+        This function transcribes several recordings on the server in one job, so their segments are batched together.
+
+        Parameters:
+            - paths (List[str]) -> Paths of the recordings, readable by the server
+
+        Returns:
+            - raw_transcripts (List[List[str]]) -> Segment transcripts of every recording, in the order of paths
+        """
+        return self._request({"op": "transcribe", "paths": [os.path.abspath(path) for path in paths]})
+
+
+def main() -> None:
+    """This function is the command line entry point of the model server."""
+    parser = argparse.ArgumentParser(description="Keep Whisper and silero VAD loaded and serve transcription jobs.")
+    parser.add_argument("--host", default=DEFAULT_ADDRESS[0], help="Host to listen on")
+    parser.add_argument("--allow-remote", action="store_true", help="Allow a --host other than the loopback interface. Anyone who has the key and can reach the port can run code on this machine")
+    parser.add_argument("--port", type=int, default=DEFAULT_ADDRESS[1], help="Port to listen on")
+    parser.add_argument("--batch-size", type=int, default=8, help="Segments per Whisper forward pass")
+    parser.add_argument("--pcm-cache", default=None, help="Folder of the decoded PCM cache, reused across runs ($TELELYZER_PCM_CACHE)")
+    args = parser.parse_args()
+
+    if not is_loopback(args.host):
+        if not args.allow_remote:
+            parser.error(f"--host {args.host} is reachable from other machines, pass --allow-remote to listen on it anyway")
+        print(f"Warning: listening on {args.host}, every host that can reach port {args.port} can connect. Requests are unpickled, keep the key secret.")
+
+    if args.pcm_cache:
+        from transcription.pcm_cache import PCM_CACHE_ENV
+        os.environ[PCM_CACHE_ENV] = args.pcm_cache
+
+    ModelServer((args.host, args.port), authkey=load_authkey(create=True), batch_size=args.batch_size).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
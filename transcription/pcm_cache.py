@@ -0,0 +1,164 @@
+import hashlib
+import os
+import threading
+from functools import lru_cache
+from typing import Dict, Optional, Union
+
+import numpy as np
+
+# Folder of the decoded PCM cache. It is read from the environment so the preprocessing workers and the model server pick it up too.
+PCM_CACHE_ENV = "TELELYZER_PCM_CACHE"
+
+HASH_CHUNK_BYTES = 1 << 20
+
+
+def content_hash(audio_file: Union[str, bytes]) -> str:
+    """
+    This function returns the hash of the bytes of an audio file, so renamed or copied recordings get the same key.
+
+    Parameters:
+        - audio_file (str | bytes) -> Path of the audio file, or its encoded bytes
+
+    Returns:
+        - digest (str) -> Hex digest of the content
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    if isinstance(audio_file, (bytes, bytearray)):
+        digest.update(audio_file)
+        return digest.hexdigest()
+
+    with open(audio_file, "rb") as audio:
+        for chunk in iter(lambda: audio.read(HASH_CHUNK_BYTES), b""):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+class PCMCache:
+    """This class keeps the decoded 16 kHz mono float32 PCM of every recording as a .npy file keyed by its content hash, and serves it memory-mapped."""
+
+    def __init__(self, cache_dir: str, sampling_rate: int = 16000) -> None:
+        """
+        This function initializes the cache, creating its folder if needed.
+
+        Parameters:
+            - cache_dir (str) -> Folder of the .npy files
+            - sampling_rate (int) -> Sampling rate the recordings are decoded at, part of the key
+        """
+        self.cache_dir = cache_dir
+        self.sampling_rate = sampling_rate
+        os.makedirs(cache_dir, exist_ok=True)
+
+        self.stats = {"hits": 0, "misses": 0}
+        self._lock = threading.Lock()
+
+    def path(self, digest: str) -> str:
+        """
+        This function returns the path of the cached PCM of a content hash, sharded on its first two characters.
+
+        Parameters:
+            - digest (str) -> Content hash of the recording
+
+        Returns:
+            - path (str) -> Path of the .npy file
+        """
+        return os.path.join(self.cache_dir, digest[:2], f"{digest}-{self.sampling_rate}.npy")
+
+    def load(self, file_path: str) -> np.ndarray:
+        """
+        This function returns the decoded waveform of a recording, decoding it with ffmpeg and storing it only on a miss.
+
+        The waveform is memory-mapped copy-on-write: pages are read from disk when they are touched, shared between the processes reading the same recording, and writable without changing the cache.
+
+        Parameters:
+            - file_path (str) -> Path of the recording
+
+        Returns:
+            - waveform (np.ndarray) -> Mono float32 samples in [-1, 1]
+        """
+        from transcription.audio_processing import decode_audio
+
+        # The file is read once, for the hash and for ffmpeg on a miss
+        with open(file_path, "rb") as audio_file:
+            audio_bytes = audio_file.read()
+        cache_path = self.path(content_hash(audio_bytes))
+
+        if os.path.exists(cache_path):
+            try:
+                waveform = np.load(cache_path, mmap_mode="c")
+                # Refresh the modification time, prune() evicts the least recently used files first
+                os.utime(cache_path)
+                with self._lock:
+                    self.stats["hits"] += 1
+                return waveform
+            except (OSError, ValueError):
+                # Truncated or corrupted file, decode the recording again
+                os.remove(cache_path)
+
+        waveform = decode_audio(audio_bytes, sampling_rate=self.sampling_rate)
+        with self._lock:
+            self.stats["misses"] += 1
+
+        # An empty waveform cannot be memory-mapped, it is cheap to decode again
+        if waveform.size == 0:
+            return waveform
+
+        # Written to a temporary file and renamed, so a reader never sees a partial file
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        temporary_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary_path, "wb") as cache_file:
+            np.save(cache_file, waveform)
+        os.replace(temporary_path, cache_path)
+
+        return waveform
+
+    def size_bytes(self) -> int:
+        """This function returns the size of the cached PCM files on disk."""
+        return sum([os.path.getsize(os.path.join(root, file)) for root, _, files in os.walk(self.cache_dir) for file in files if file.endswith(".npy")])
+
+    def prune(self, max_bytes: int) -> Dict:
+        """
+        This function deletes the least recently used PCM files until the cache holds at most max_bytes.
+
+        Parameters:
+            - max_bytes (int) -> Size budget of the cache
+
+        Returns:
+            - pruned (Dict) -> Number of files and bytes deleted
+        """
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for file in files:
+                if file.endswith(".npy"):
+                    stat = os.stat(os.path.join(root, file))
+                    entries.append((stat.st_mtime, stat.st_size, os.path.join(root, file)))
+
+        total_bytes = sum([size for _, size, _ in entries])
+        pruned = {"files": 0, "bytes": 0}
+        for _, size, path in sorted(entries):
+            if total_bytes <= max_bytes:
+                break
+            os.remove(path)
+            total_bytes -= size
+            pruned["files"] += 1
+            pruned["bytes"] += size
+
+        return pruned
+
+
+@lru_cache(maxsize=None)
+def _open_pcm_cache(cache_dir: str) -> PCMCache:
+    """This is a helper function that opens a cache folder once per process."""
+    return PCMCache(cache_dir)
+
+
+def get_pcm_cache() -> Optional[PCMCache]:
+    """
+    This function returns the PCM cache configured with $TELELYZER_PCM_CACHE in this process.
+
+    Returns:
+        - pcm_cache (PCMCache | None) -> Cache of the configured folder, None if the cache is disabled
+    """
+    cache_dir = os.environ.get(PCM_CACHE_ENV)
+
+    return _open_pcm_cache(os.path.abspath(cache_dir)) if cache_dir else None
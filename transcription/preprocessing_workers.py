@@ -0,0 +1,206 @@
+import multiprocessing
+import queue
+import threading
+import time
+import traceback
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from pipeline.telemetry import TELEMETRY
+
+# Loaded once in every worker process by _init_worker
+_vad_model = None
+
+
+def _init_worker(torch_threads: int) -> None:
+    """
+    This is a helper function that runs once in every worker process and loads the VAD model.
+
+    Parameters:
+        - torch_threads (int) -> Torch intra-op threads per worker, kept low so the workers do not oversubscribe the cores
+    """
+    global _vad_model
+
+    import torch
+    from silero_vad import load_silero_vad
+
+    torch.set_num_threads(torch_threads)
+    _vad_model = load_silero_vad()
+
+
+def _preprocess_worker(path_queue, segment_queue, torch_threads: int) -> None:
+    """
+    This function is the loop of a worker process: it decodes, runs VAD on and segments recordings until it receives None.
+
+    Parameters:
+        - path_queue (multiprocessing.Queue) -> Paths of the recordings to preprocess
+        - segment_queue (multiprocessing.Queue) -> Bounded queue the (file_path, segments, error) results are put on
+        - torch_threads (int) -> Torch intra-op threads of the worker
+    """
+    from transcription.audio_processing import _split_audio, load_waveform
+
+    _init_worker(torch_threads)
+
+    while True:
+        file_path = path_queue.get()
+        if file_path is None:
+            segment_queue.put(None)
+            return
+
+        try:
+            segments = [np.ascontiguousarray(segment) for segment in _split_audio(load_waveform(file_path), _vad_model)]
+            segment_queue.put((file_path, segments, None))
+        except Exception:
+            segment_queue.put((file_path, None, traceback.format_exc()))
+
+
+class PreprocessingPool:
+    """This class runs decoding, VAD and segmenting in worker processes that feed a bounded queue, so preprocessing of the next calls overlaps with ASR of the current one."""
+
+    def __init__(self, num_workers: Optional[int] = None, max_pending: int = 4, torch_threads: int = 1) -> None:
+        """
+        This function initializes the pool. The workers are started by start() or when entering the context manager.
+
+        Parameters:
+            - num_workers (int | None) -> Number of worker processes, one per core minus the ASR process if not provided
+            - max_pending (int) -> Maximum number of segmented recordings waiting for ASR before the workers block (backpressure)
+            - torch_threads (int) -> Torch intra-op threads per worker
+        """
+        self.num_workers = num_workers or max(1, multiprocessing.cpu_count() - 1)
+        self.max_pending = max_pending
+        self.torch_threads = torch_threads
+
+        # spawn avoids forking a process that already holds torch threads and the Whisper model
+        self._context = multiprocessing.get_context("spawn")
+        self._path_queue = None
+        self._segment_queue = None
+        self._workers: List = []
+
+    def start(self) -> "PreprocessingPool":
+        """This function starts the worker processes."""
+        self._path_queue = self._context.Queue()
+        self._segment_queue = self._context.Queue(maxsize=self.max_pending)
+        self._workers = [
+            self._context.Process(
+                target=_preprocess_worker,
+                args=(self._path_queue, self._segment_queue, self.torch_threads),
+                daemon=True
+            )
+            for _ in range(self.num_workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+        return self
+
+    def close(self) -> None:
+        """This function stops the worker processes."""
+        for worker in self._workers:
+            if worker.is_alive():
+                worker.terminate()
+            worker.join()
+        self._workers = []
+
+    def __enter__(self) -> "PreprocessingPool":
+        """This function starts the worker processes when entering the context manager."""
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        """This function stops the worker processes when leaving the context manager."""
+        self.close()
+
+    def imap(self, file_paths: Iterable[str]) -> Iterator[Tuple[str, Optional[List[np.ndarray]], Optional[str]]]:
+        """
+        This function preprocesses recordings in the workers and yields them in completion order.
+
+        The paths are fed from a background thread, so file_paths can be a lazy iterator of any length.
+
+        Parameters:
+            - file_paths (Iterable[str]) -> Paths of the recordings
+
+        Returns:
+            - results (Iterator[Tuple]) -> (file_path, segments, error) per recording, error is the traceback if it failed
+        """
+        def feed_paths():
+            for file_path in file_paths:
+                self._path_queue.put(file_path)
+            for _ in self._workers:
+                self._path_queue.put(None)
+
+        feeder = threading.Thread(target=feed_paths, daemon=True)
+        feeder.start()
+
+        finished_workers = 0
+        while finished_workers < len(self._workers):
+            wait_start = time.perf_counter()
+            try:
+                result = self._segment_queue.get(timeout=5)
+                # Time the ASR process waited for preprocessed recordings
+                TELEMETRY.record_queue_wait("preprocessed_recordings", time.perf_counter() - wait_start)
+            except queue.Empty:
+                # A worker that crashed (e.g. killed by the OOM killer) never sends its sentinel
+                crashed_workers = [worker for worker in self._workers if worker.exitcode not in (None, 0)]
+                if crashed_workers:
+                    raise RuntimeError(f"{len(crashed_workers)} preprocessing worker(s) exited with code {crashed_workers[0].exitcode}")
+                continue
+
+            if result is None:
+                finished_workers += 1
+                continue
+            yield result
+
+        feeder.join()
+
+
+def iter_transcribed(
+    file_paths: Iterable[str],
+    pipe,
+    num_workers: Optional[int] = None,
+    max_pending: int = 4,
+    recordings_per_batch: int = 1,
+    asr_batch_size: int = 8
+) -> Iterator[Tuple[str, Optional[List[str]], Optional[str]]]:
+    """
+    This function preprocesses recordings in a PreprocessingPool and transcribes them with Whisper in this process as they arrive.
+
+    Parameters:
+        - file_paths (Iterable[str]) -> Paths of the recordings
+        - pipe (Pipeline) -> Whisper automatic speech recognition pipeline
+        - num_workers (int | None) -> Number of preprocessing worker processes
+        - max_pending (int) -> Maximum number of segmented recordings waiting for ASR
+        - recordings_per_batch (int) -> Recordings whose segments are transcribed together in length-bucketed batches
+        - asr_batch_size (int) -> Segments per Whisper forward pass
+
+    Returns:
+        - results (Iterator[Tuple]) -> (file_path, raw_transcripts, error) per recording, in completion order
+    """
+    from transcription.batched_transcription import BatchedTranscriber
+
+    transcriber = BatchedTranscriber(pipe, batch_size=asr_batch_size)
+
+    def flush(group_paths):
+        try:
+            raw_transcripts = transcriber.run()
+        except Exception:
+            error = traceback.format_exc()
+            transcriber.segments = []
+            return [(file_path, None, error) for file_path in group_paths]
+        return [(file_path, raw_transcripts.get(file_path, []), None) for file_path in group_paths]
+
+    with PreprocessingPool(num_workers, max_pending=max_pending) as pool:
+        group_paths = []
+        for file_path, segments, error in pool.imap(file_paths):
+            if error is not None:
+                yield file_path, None, error
+                continue
+
+            transcriber.add(file_path, segments)
+            group_paths.append(file_path)
+
+            if len(group_paths) >= recordings_per_batch:
+                yield from flush(group_paths)
+                group_paths = []
+
+        if group_paths:
+            yield from flush(group_paths)
@@ -0,0 +1,116 @@
+import math
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+# Whisper works on 30 second windows, a second of margin is kept for the rounding of the window edges.
+MAX_WINDOW_SECONDS = 29.0
+
+
+def _build_argmax_table(gaps: np.ndarray) -> List[np.ndarray]:
+    """
+    This is a helper function that builds a sparse table answering "index of the largest gap in a range" in O(1).
+
+    table[k][i] is the index of the leftmost largest gap in gaps[i:i + 2**k].
+
+    Parameters:
+        - gaps (np.ndarray) -> Silence between consecutive speech regions
+
+    Returns:
+        - table (List[np.ndarray]) -> One array of indexes per power of two
+    """
+    table = [np.arange(len(gaps), dtype=np.int32)]
+
+    width = 1
+    while 2 * width <= len(gaps):
+        previous = table[-1]
+        left = previous[:len(previous) - width]
+        right = previous[width:]
+        # Ties keep the left index, like the original strict '>' scan.
+        table.append(np.where(gaps[right] > gaps[left], right, left))
+        width *= 2
+
+    return table
+
+
+def _largest_gap(gaps: np.ndarray, table: List[np.ndarray], low: int, high: int) -> int:
+    """
+    This is a helper function that returns the index of the leftmost largest gap in gaps[low:high + 1].
+
+    Parameters:
+        - gaps (np.ndarray) -> Silence between consecutive speech regions
+        - table (List[np.ndarray]) -> Sparse table built by _build_argmax_table
+        - low (int) -> First gap index of the range
+        - high (int) -> Last gap index of the range (inclusive)
+
+    Returns:
+        - index (int) -> Index of the largest gap
+    """
+    level = (high - low + 1).bit_length() - 1
+    left = table[level][low]
+    right = table[level][high - (1 << level) + 1]
+
+    return int(right) if gaps[right] > gaps[left] else int(left)
+
+
+def pack_regions(speech_timestamps: List[Dict], max_window: float = MAX_WINDOW_SECONDS) -> List[Tuple[int, int]]:
+    """
+    This function groups consecutive VAD speech regions into windows of at most max_window seconds, splitting oversized groups at their largest silence.
+
+    The largest gap of any range is looked up in a sparse table instead of rescanning the group at every level, so grouping takes O(n log n) time for n regions. A group that has no positive gap to split at is kept as is, even if it is longer than max_window.
+
+    Parameters:
+        - speech_timestamps (List[Dict]) -> Speech regions in seconds with start and end keys, in order
+        - max_window (float) -> Maximum duration of a window in seconds
+
+    Returns:
+        - window_bounds (List[Tuple[int, int]]) -> Index of the first and last region (inclusive) of every window, in order
+    """
+    if not speech_timestamps:
+        return []
+
+    starts = np.fromiter((float(timestamp['start']) for timestamp in speech_timestamps), dtype=np.float64, count=len(speech_timestamps))
+    ends = np.fromiter((float(timestamp['end']) for timestamp in speech_timestamps), dtype=np.float64, count=len(speech_timestamps))
+
+    # gaps[i] is the silence before region i + 1
+    gaps = starts[1:] - ends[:-1]
+    table = _build_argmax_table(gaps) if len(gaps) else []
+
+    # Ranges of regions (inclusive) still to be packed. The right half is pushed first so windows come out in order.
+    window_bounds = []
+    pending = [(0, len(speech_timestamps) - 1)]
+    while pending:
+        low, high = pending.pop()
+
+        if low == high or ends[high] - starts[low] <= max_window:
+            window_bounds.append((low, high))
+            continue
+
+        split_index = _largest_gap(gaps, table, low, high - 1)
+        if gaps[split_index] <= 0:
+            window_bounds.append((low, high))
+            continue
+
+        pending.append((split_index + 1, high))
+        pending.append((low, split_index))
+
+    return window_bounds
+
+
+def pack_segments(speech_timestamps: List[Dict], max_window: float = MAX_WINDOW_SECONDS) -> List[Dict]:
+    """
+    This function packs VAD speech regions into windows of at most max_window seconds with pack_regions, and rounds the windows to whole seconds.
+
+    It produces the same windows as the previous recursive split_timestamps followed by the floor/ceil rounding, without its recursion.
+
+    Parameters:
+        - speech_timestamps (List[Dict]) -> Speech regions in seconds with start and end keys, in order
+        - max_window (float) -> Maximum duration of a window in seconds
+
+    Returns:
+        - windows (List[Dict]) -> start (floored) and end (ceiled) of every window in whole seconds, in order
+    """
+    return [
+        {"start": math.floor(float(speech_timestamps[low]["start"])), "end": math.ceil(float(speech_timestamps[high]["end"]))}
+        for low, high in pack_regions(speech_timestamps, max_window)
+    ]
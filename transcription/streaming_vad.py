@@ -0,0 +1,144 @@
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from transcription.segment_packer import MAX_WINDOW_SECONDS
+
+# silero VAD scores 512 sample frames at 16 kHz
+VAD_FRAME_SAMPLES = 512
+
+
+class StreamingSegmenter:
+    """This class runs silero VAD incrementally on PCM chunks as they arrive and emits a segment as soon as a pause closes it."""
+
+    def __init__(
+        self,
+        vad_model,
+        sampling_rate: int = 16000,
+        threshold: float = 0.5,
+        min_silence_ms: int = 700,
+        speech_pad_ms: int = 100,
+        min_speech_ms: int = 250,
+        max_segment_seconds: float = MAX_WINDOW_SECONDS
+    ) -> None:
+        """
+        This function initializes the segmenter of one stream.
+
+        The VAD model keeps a state across frames, so every concurrent stream needs its own model (load_silero_vad is cheap).
+
+        Parameters:
+            - vad_model (silero-vad) -> Voice Activity Detection model, used by this stream only
+            - sampling_rate (int) -> Sampling rate of the chunks
+            - threshold (float) -> Speech probability above which a frame is speech
+            - min_silence_ms (int) -> Pause that closes a segment, shorter pauses stay inside it
+            - speech_pad_ms (int) -> Audio kept before and after the speech of a segment
+            - min_speech_ms (int) -> Segments shorter than this are dropped as clicks or noise
+            - max_segment_seconds (float) -> Speech without a pause is cut at this length, so it fits a Whisper window
+        """
+        from silero_vad import VADIterator
+
+        self.sampling_rate = sampling_rate
+        self.min_speech_samples = int(min_speech_ms * sampling_rate / 1000)
+        self.max_segment_samples = int(max_segment_seconds * sampling_rate)
+        self.pad_samples = int(speech_pad_ms * sampling_rate / 1000)
+
+        self._vad = VADIterator(
+            vad_model,
+            threshold=threshold,
+            sampling_rate=sampling_rate,
+            min_silence_duration_ms=min_silence_ms,
+            speech_pad_ms=speech_pad_ms
+        )
+
+        # Samples since the start of the stream that are still needed, starting at sample _buffer_start
+        self._buffer = np.zeros(0, dtype=np.float32)
+        self._buffer_start = 0
+        # Samples already scored by VAD, the rest of the buffer is shorter than a frame
+        self._processed = 0
+        self._speech_start: Optional[int] = None
+
+    @property
+    def received_seconds(self) -> float:
+        """The duration of the audio received so far."""
+        return (self._buffer_start + len(self._buffer)) / self.sampling_rate
+
+    def _segment(self, start: int, end: int) -> Optional[Dict]:
+        """
+        This is a helper function that cuts a segment out of the buffer.
+
+        Parameters:
+            - start (int) -> First sample of the segment since the start of the stream
+            - end (int) -> Sample after the segment
+
+        Returns:
+            - segment (Dict | None) -> start and end in seconds and the audio samples, None if the segment is too short
+        """
+        start = max(start, self._buffer_start)
+        end = min(end, self._buffer_start + len(self._buffer))
+        if end - start < self.min_speech_samples:
+            return None
+
+        return {
+            "start": round(start / self.sampling_rate, 3),
+            "end": round(end / self.sampling_rate, 3),
+            "audio": self._buffer[start - self._buffer_start:end - self._buffer_start].copy(),
+        }
+
+    def feed(self, chunk: np.ndarray) -> List[Dict]:
+        """
+        This function adds a chunk of PCM to the stream and returns the segments closed by it.
+
+        Parameters:
+            - chunk (np.ndarray) -> Mono float32 samples in [-1, 1] of any length
+
+        Returns:
+            - segments (List[Dict]) -> start and end in seconds and audio samples of every closed segment, in order
+        """
+        import torch
+
+        self._buffer = np.concatenate([self._buffer, np.asarray(chunk, dtype=np.float32)])
+
+        segments = []
+        while self._buffer_start + len(self._buffer) - self._processed >= VAD_FRAME_SAMPLES:
+            # 1. Score the next frame
+            offset = self._processed - self._buffer_start
+            event = self._vad(torch.from_numpy(self._buffer[offset:offset + VAD_FRAME_SAMPLES]))
+            self._processed += VAD_FRAME_SAMPLES
+
+            if event and "start" in event:
+                self._speech_start = event["start"]
+            elif event and "end" in event and self._speech_start is not None:
+                segments.append(self._segment(self._speech_start, event["end"]))
+                self._speech_start = None
+
+            # 2. Cut speech without a pause at the maximum length, the speech goes on in the next segment
+            if self._speech_start is not None and self._processed - self._speech_start >= self.max_segment_samples:
+                segments.append(self._segment(self._speech_start, self._processed))
+                self._speech_start = self._processed
+
+        # 3. Drop the samples no segment can start before
+        keep_from = self._speech_start if self._speech_start is not None else self._processed - self.pad_samples
+        if keep_from > self._buffer_start:
+            self._buffer = self._buffer[keep_from - self._buffer_start:]
+            self._buffer_start = keep_from
+
+        return [segment for segment in segments if segment is not None]
+
+    def flush(self) -> List[Dict]:
+        """
+        This function closes the stream: speech still open at the end becomes the last segment, and the VAD state is reset for a new stream.
+
+        Returns:
+            - segments (List[Dict]) -> The last segment, if the stream ended during speech
+        """
+        segments = []
+        if self._speech_start is not None:
+            segments.append(self._segment(self._speech_start, self._buffer_start + len(self._buffer)))
+
+        self._vad.reset_states()
+        self._buffer = np.zeros(0, dtype=np.float32)
+        self._buffer_start = 0
+        self._processed = 0
+        self._speech_start = None
+
+        return [segment for segment in segments if segment is not None]